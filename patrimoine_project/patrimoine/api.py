@@ -0,0 +1,197 @@
+"""
+API JSON en lecture seule : /api/bureaux/, /api/salles/, /api/materiels/.
+
+- ``?fields=nom,etat`` : seules ces colonnes sont lues (``values()``, sans
+  instancier de modèles) ; l'id est toujours renvoyé ;
+- ``?include=materiels`` (salles, bureaux) : le matériel de toute la page
+  est chargé en une requête ``IN`` et rattaché en Python, soit deux
+  requêtes quel que soit le nombre de lignes ; ``?fields[materiels]=``
+  restreint ses colonnes ;
+- pagination par curseur sur l'id (``?after=``, ``?page_size=``) ;
+- mêmes critères que les listes HTML (``?etat=hs``, ``?type_salle=``...) ;
+- sérialisation orjson si disponible, json sinon ;
+- ETag / Last-Modified comme les pages (voir conditional.py).
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse
+
+from . import conditional
+from .conditional import conditional_view
+from .filters import apply_filters
+from .models import Bureau, Salle, Materiel
+from .pagination import paginate_keyset
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_MAX_PAGE_SIZE = 5000
+
+API_ORDERING = ('id',)
+
+# Colonnes exposées par ressource (les clés étrangères renvoient l'id)
+FIELDS = {
+    Bureau: ('id', 'nom', 'type_bureau', 'niveau', 'surface', 'capacite',
+             'date_creation', 'date_modification'),
+    Salle: ('id', 'nom', 'type_salle', 'niveau', 'capacite', 'surface', 'equipements',
+            'disponible', 'picture', 'date_creation', 'date_modification'),
+    Materiel: ('id', 'nom', 'description', 'quantite', 'etat', 'numero_serie',
+               'date_acquisition', 'prix_unitaire', 'salle', 'bureau',
+               'date_creation', 'date_modification'),
+}
+
+RESOURCES = {
+    'bureaux': Bureau,
+    'salles': Salle,
+    'materiels': Materiel,
+}
+
+# Ressource -> relation vers le matériel pour ?include=materiels
+INCLUDES = {
+    Bureau: 'bureau_id',
+    Salle: 'salle_id',
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _default(value):
+    # Decimal (prix) et autres types non gérés nativement
+    return str(value)
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), content_type='application/json', status=status)
+
+
+def get_api_page_size(request):
+    default = getattr(settings, 'PATRIMOINE_API_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    maximum = getattr(settings, 'PATRIMOINE_API_MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+def parse_fields(model, value):
+    """?fields=nom,etat -> ('id', 'nom', 'etat') ; toutes les colonnes si vide"""
+    if not value:
+        return FIELDS[model]
+    requested = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in FIELDS[model]]
+    if unknown:
+        raise ApiError(f"Champ(s) inconnu(s) : {', '.join(unknown)}")
+    return ('id',) + tuple(name for name in requested if name != 'id')
+
+
+def parse_include(model, value):
+    includes = [name.strip() for name in (value or '').split(',') if name.strip()]
+    for name in includes:
+        if name != 'materiels' or model not in INCLUDES:
+            raise ApiError(f"Inclusion impossible : {name}")
+    return 'materiels' in includes
+
+
+def _serialize(rows):
+    """Remplace le nom du fichier de la photo par son URL"""
+    for row in rows:
+        if 'picture' in row:
+            row['picture'] = Salle.picture.field.storage.url(row['picture']) if row['picture'] else None
+    return rows
+
+
+def attach_materiels(model, rows, fields):
+    """Charge le matériel de toutes les lignes en une requête"""
+    relation = INCLUDES[model]
+    by_owner = {row['id']: [] for row in rows}
+    for row in rows:
+        row['materiels'] = by_owner[row['id']]
+    if not by_owner:
+        return
+    materiels = (
+        Materiel.objects.filter(**{f'{relation}__in': list(by_owner)})
+        .order_by(*API_ORDERING)
+        .values(relation, *fields)
+    )
+    for materiel in materiels:
+        owner = materiel.pop(relation)
+        by_owner[owner].append(materiel)
+
+
+def _resource_model(resource):
+    if resource not in RESOURCES:
+        raise Http404
+    return RESOURCES[resource]
+
+
+def resource_state(request, resource, pk=None):
+    """État pour l'ETag : la table, et celle du matériel s'il est inclus"""
+    model = RESOURCES.get(resource)
+    if model is None:
+        return None
+    if request.GET.get('include') and model in INCLUDES:
+        return conditional.tables_state(model, Materiel)
+    return conditional.tables_state(model)
+
+
+def parse_query(request, model):
+    """Retourne (champs, inclure le matériel, champs du matériel)"""
+    fields = parse_fields(model, request.GET.get('fields'))
+    include = parse_include(model, request.GET.get('include'))
+    materiel_fields = parse_fields(Materiel, request.GET.get('fields[materiels]')) if include else ()
+    return fields, include, materiel_fields
+
+
+@conditional_view(resource_state)
+def api_list(request, resource):
+    """Liste paginée : {"results": [...], "next": "?after=...", "previous": ...}"""
+    model = _resource_model(resource)
+    try:
+        fields, include, materiel_fields = parse_query(request, model)
+    except ApiError as exc:
+        return json_response({'error': str(exc)}, status=exc.status)
+
+    queryset, _form = apply_filters(model.objects.all(), request.GET)
+    page = paginate_keyset(request, queryset.values(*fields), API_ORDERING, get_api_page_size(request))
+    rows = _serialize(page.object_list)
+    if include:
+        attach_materiels(model, rows, materiel_fields)
+    return json_response({
+        'results': rows,
+        'next': f'?{page.next_query}' if page.has_next else None,
+        'previous': f'?{page.previous_query}' if page.has_previous else None,
+    })
+
+
+@conditional_view(resource_state)
+def api_detail(request, resource, pk):
+    """Un objet : {"nom": ..., "materiels": [...] avec ?include=materiels}"""
+    model = _resource_model(resource)
+    try:
+        fields, include, materiel_fields = parse_query(request, model)
+    except ApiError as exc:
+        return json_response({'error': str(exc)}, status=exc.status)
+
+    row = model.objects.filter(pk=pk).values(*fields).first()
+    if row is None:
+        return json_response({'error': 'Objet introuvable.'}, status=404)
+    rows = _serialize([row])
+    if include:
+        attach_materiels(model, rows, materiel_fields)
+    return json_response(rows[0])
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class PatrimoineConfig(AppConfig):
     name = 'patrimoine'
+
+    def ready(self):
+        from .db import connect_database_signals
+        from .signals import connect_signals
+        connect_database_signals()
+        connect_signals()
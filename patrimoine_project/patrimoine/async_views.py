@@ -0,0 +1,99 @@
+"""
+Vues asynchrones des pages en lecture, servies sous ASGI (voir asgi.py).
+
+Mêmes gabarits, mêmes URL et mêmes décorateurs (conditional_view,
+cached_view) que les vues de views.py ; urls.py les choisit quand
+PATRIMOINE_ASYNC_VIEWS est actif. Les lectures passent par l'ORM
+asynchrone (``aget``, ``afirst``, ``async for``) et les lectures
+indépendantes d'une page sont lancées ensemble (``asyncio.gather``).
+Tout est lu avant le rendu : un gabarit ne doit pas déclencher de
+requête (SynchronousOnlyOperation).
+
+Django exécute les requêtes SQL d'une même requête HTTP dans un seul fil :
+``gather`` recouvre les attentes mais les requêtes d'une page restent
+successives. Le gain vient surtout du nombre de clients servis à la
+fois par un processus (manage.py bench_asgi).
+"""
+import asyncio
+
+from django.http import Http404
+from django.shortcuts import render
+
+from . import conditional
+from .cache import cached_view
+from .conditional import conditional_view
+from .models import Bureau, Salle, Materiel
+from .pagination import apaginate_keyset
+from .rows import render_list
+from .stats import aget_snapshot_stats
+from .views import list_query
+
+
+async def _aget_or_404(model, pk):
+    """get_object_or_404 avec l'ORM asynchrone"""
+    try:
+        return await model.objects.aget(pk=pk)
+    except model.DoesNotExist:
+        raise Http404(f"Aucun objet {model._meta.verbose_name} ne correspond.")
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def _location_detail(request, model, pk, relation, template_name, name):
+    """Fiche d'une salle ou d'un bureau : l'objet et ses matériels, lus ensemble"""
+    obj, materiels = await asyncio.gather(
+        _aget_or_404(model, pk),
+        _alist(Materiel.objects.filter(**{relation: pk})),
+    )
+    return render(request, template_name, {name: obj, 'materiels': materiels})
+
+
+async def _filtered_list(request, model, template_name, name, criteres):
+    queryset, ordering, context = list_query(request, model.objects.all(), rows=model, **criteres)
+    context['page'] = context[name] = await apaginate_keyset(request, queryset, ordering)
+    return render_list(request, template_name, context, model, asynchronous=True)
+
+
+@conditional_view(conditional.dashboard_state)
+@cached_view('dashboard')
+async def dashboard(request):
+    """Tableau de bord : lecture de l'instantané PatrimoineStats (une ligne)"""
+    context = {'stats': await aget_snapshot_stats()}
+    return render(request, 'dashboard.html', context)
+
+
+@conditional_view(conditional.bureau_list_state)
+@cached_view('list:bureau')
+async def bureau_list(request, **criteres):
+    return await _filtered_list(request, Bureau, 'bureaux/bureau_list.html', 'bureaux', criteres)
+
+
+@conditional_view(conditional.bureau_detail_state)
+async def bureau_detail(request, pk):
+    return await _location_detail(request, Bureau, pk, 'bureau_id', 'bureaux/bureau_detail.html', 'bureau')
+
+
+@conditional_view(conditional.salle_list_state)
+@cached_view('list:salle')
+async def salle_list(request, **criteres):
+    return await _filtered_list(request, Salle, 'salles/salle_list.html', 'salles', criteres)
+
+
+@conditional_view(conditional.salle_detail_state)
+async def salle_detail(request, pk):
+    return await _location_detail(request, Salle, pk, 'salle_id', 'salles/salle_detail.html', 'salle')
+
+
+@conditional_view(conditional.materiel_list_state)
+@cached_view('list:materiel')
+async def materiel_list(request, **criteres):
+    return await _filtered_list(request, Materiel, 'materiels/materiel_list.html', 'materiels', criteres)
+
+
+@conditional_view(conditional.materiel_detail_state)
+@cached_view('detail:materiel:{pk}')
+async def materiel_detail(request, pk):
+    materiel = await _aget_or_404(Materiel, pk)
+    return render(request, 'materiels/materiel_detail.html', {'materiel': materiel})
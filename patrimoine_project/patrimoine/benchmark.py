@@ -0,0 +1,391 @@
+"""
+Banc d'essai des pages : jeu de données reproductible et mesures par route.
+
+- ``generate_inventory`` crée des bureaux, salles et matériels répartis
+  comme un inventaire réel (pondération des ``*_CHOICES``, matériel surtout
+  en salle, quelques objets non localisés...), graine fixe : deux
+  générations avec la même graine donnent les mêmes données ;
+- ``measure_routes`` appelle chaque route nommée de patrimoine/urls.py et
+  relève latence p50 / p95, nombre de requêtes SQL et taille de la réponse ;
+- ``compare`` signale les régressions par rapport à un résultat précédent ;
+- ``measure_throughput`` envoie les requêtes de plusieurs clients
+  simultanés, par le gestionnaire WSGI (un fil par client, vues
+  synchrones) ou ASGI (une boucle d'événements, vues asynchrones).
+
+Voir les commandes generate_inventory, benchmark et bench_asgi.
+"""
+import asyncio
+import importlib
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import AsyncClient, Client, override_settings
+from django.urls import URLPattern, clear_url_caches, reverse
+
+from . import cache as page_cache
+from .models import Bureau, Salle, Materiel
+from .search import rebuild_index
+from .stats import rebuild_snapshot
+
+# Nombre de matériels par échelle ; salles et bureaux en proportion
+SCALES = {
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+MATERIELS_PER_SALLE = 40
+MATERIELS_PER_BUREAU = 25
+
+BUREAU_TYPES = {'box': 30, 'cloisonne': 35, 'open': 25, 'entier': 10}
+SALLE_TYPES = {'reunion': 50, 'conference': 20, 'pleniere': 5, 'formation': 25}
+ETATS = {'bon': 55, 'moyen': 25, 'mauvais': 10, 'hs': 7, 'autre': 3}
+NIVEAUX = ['Sous-sol', 'RDC', '1er étage', '2e étage', '3e étage', '4e étage']
+
+# Surface (m²) et capacité par type de salle
+SALLE_SIZES = {
+    'reunion': ((15, 40), (4, 16)),
+    'conference': ((40, 120), (20, 80)),
+    'pleniere': ((150, 500), (100, 400)),
+    'formation': ((30, 80), (10, 30)),
+}
+
+# Nom, prix unitaire (GNF), quantité maximale
+CATALOGUE = [
+    ('Chaise', (150_000, 600_000), 30),
+    ('Table', (400_000, 2_500_000), 10),
+    ('Armoire', (900_000, 3_000_000), 3),
+    ('Ordinateur portable', (4_000_000, 12_000_000), 1),
+    ('Ordinateur de bureau', (3_000_000, 9_000_000), 1),
+    ('Écran', (1_000_000, 3_500_000), 2),
+    ('Imprimante', (1_500_000, 8_000_000), 1),
+    ('Vidéoprojecteur', (3_000_000, 10_000_000), 1),
+    ('Climatiseur', (3_500_000, 9_000_000), 2),
+    ('Téléphone IP', (400_000, 1_500_000), 1),
+    ('Tableau blanc', (300_000, 1_200_000), 1),
+]
+EQUIPEMENTS = ['Vidéoprojecteur', 'Écran', 'Tableau blanc', 'Visioconférence', 'Climatisation', 'Sonorisation']
+
+
+def scale_counts(materiels):
+    """(bureaux, salles, matériels) pour un nombre de matériels donné"""
+    return (
+        max(1, materiels // MATERIELS_PER_BUREAU),
+        max(1, materiels // MATERIELS_PER_SALLE),
+        materiels,
+    )
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _bureau(rng, number):
+    type_bureau = _weighted(rng, BUREAU_TYPES)
+    capacite = {'box': 1, 'cloisonne': rng.randint(1, 4), 'open': rng.randint(8, 40),
+                'entier': rng.randint(20, 80)}[type_bureau]
+    return Bureau(
+        type_bureau=type_bureau,
+        nom=f'Bureau {number:06d}',
+        niveau=rng.choice(NIVEAUX),
+        surface=round(capacite * rng.uniform(6, 12), 1),
+        capacite=capacite,
+    )
+
+
+def _salle(rng, number):
+    type_salle = _weighted(rng, SALLE_TYPES)
+    (min_surface, max_surface), (min_capacite, max_capacite) = SALLE_SIZES[type_salle]
+    return Salle(
+        type_salle=type_salle,
+        nom=f'Salle {number:06d}',
+        niveau=rng.choice(NIVEAUX),
+        surface=round(rng.uniform(min_surface, max_surface), 1),
+        capacite=rng.randint(min_capacite, max_capacite),
+        equipements=', '.join(rng.sample(EQUIPEMENTS, rng.randint(0, 3))),
+        disponible=rng.random() < 0.85,
+    )
+
+
+def _materiel(rng, number, salle_ids, bureau_ids, today):
+    nom, (min_prix, max_prix), max_quantite = rng.choice(CATALOGUE)
+    location = rng.random()
+    salle_id = rng.choice(salle_ids) if location < 0.6 and salle_ids else None
+    bureau_id = rng.choice(bureau_ids) if 0.6 <= location < 0.95 and bureau_ids else None
+    return Materiel(
+        nom=f'{nom} {number:07d}',
+        quantite=rng.randint(1, max_quantite),
+        etat=_weighted(rng, ETATS),
+        numero_serie=f'SN-{rng.getrandbits(40):010X}' if rng.random() < 0.8 else '',
+        date_acquisition=today - timedelta(days=rng.randint(0, 3650)) if rng.random() < 0.9 else None,
+        prix_unitaire=Decimal(rng.randrange(min_prix, max_prix, 5_000)) if rng.random() < 0.9 else None,
+        salle_id=salle_id,
+        bureau_id=bureau_id,
+    )
+
+
+def _bulk_create(model, objects, batch_size):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def generate_inventory(bureaux, salles, materiels, seed=0, batch_size=5000, progress=None):
+    """
+    Ajoute les objets par bulk_create puis reconstruit l'instantané des
+    statistiques et l'index de recherche (plus rapide qu'un signal par lot
+    à cette échelle)
+    """
+    rng = random.Random(seed)
+    today = date(2025, 1, 1)
+    with transaction.atomic():
+        _bulk_create(Bureau, (_bureau(rng, i) for i in range(bureaux)), batch_size)
+        _bulk_create(Salle, (_salle(rng, i) for i in range(salles)), batch_size)
+        bureau_ids = list(Bureau.objects.order_by('id').values_list('id', flat=True))
+        salle_ids = list(Salle.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, materiels, batch_size):
+            count = min(batch_size, materiels - start)
+            Materiel.objects.bulk_create(
+                [_materiel(rng, start + i, salle_ids, bureau_ids, today) for i in range(count)]
+            )
+            if progress:
+                progress(start + count)
+        rebuild_snapshot()
+    rebuild_index()
+    page_cache.invalidate('dashboard', 'home', 'list:bureau', 'list:salle', 'list:materiel')
+
+
+# ---------------------------------------------------------------- Mesures
+
+# Valeurs des paramètres d'URL ; 'pk' : premier objet du modèle de la route
+ROUTE_KWARGS = {
+    'home_items': {'kind': 'materiels'},
+    'api_list': {'resource': 'materiels'},
+    'api_detail': {'resource': 'materiels', 'pk': Materiel},
+    'export': {'kind': 'materiels', 'fmt': 'csv'},
+}
+
+# Routes qui n'acceptent pas GET
+SKIPPED_ROUTES = {'materiel_bulk_api', 'export_job', 'rebuild_stats_job'}
+
+
+def _route_model(name):
+    for model in (Materiel, Salle, Bureau):
+        if model._meta.model_name in name:
+            return model
+    return None
+
+
+def route_urls(names=None):
+    """[(nom, url)] des routes nommées de l'application ; None si un objet manque"""
+    from . import urls
+
+    routes = []
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name or pattern.name in SKIPPED_ROUTES:
+            continue
+        if names and pattern.name not in names:
+            continue
+        kwargs = dict(ROUTE_KWARGS.get(pattern.name, {}))
+        if 'pk' in pattern.pattern.converters and 'pk' not in kwargs:
+            kwargs['pk'] = _route_model(pattern.name)
+        if isinstance(kwargs.get('pk'), type):
+            kwargs['pk'] = kwargs['pk'].objects.order_by('id').values_list('id', flat=True).first()
+        missing = 'pk' in kwargs and kwargs['pk'] is None
+        routes.append((pattern.name, None if missing else reverse(pattern.name, kwargs=kwargs)))
+    return routes
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _fetch(client, url):
+    response = client.get(url)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return response, size
+
+
+class QueryCounter:
+    """Compte les requêtes SQL (connection.execute_wrapper), même sans DEBUG"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(client, url, repeat):
+    """Une requête de chauffe (comptage SQL) puis ``repeat`` requêtes chronométrées"""
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        response, size = _fetch(client, url)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _fetch(client, url)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'url': url,
+        'status': response.status_code,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(_percentile(timings, 0.95), 3),
+        'queries': queries.count,
+        'bytes': size,
+    }
+
+
+def measure_routes(repeat=20, names=None, client=None, query=''):
+    """
+    {route: mesures} ; les routes sans objet à afficher sont ignorées.
+    ``query`` est ajouté à chaque URL (ex : 'page_size=500')
+    """
+    client = client or Client(SERVER_NAME='localhost', raise_request_exception=False)
+    return {
+        name: measure(client, f'{url}?{query}' if query else url, repeat)
+        for name, url in route_urls(names)
+        if url is not None
+    }
+
+
+def compare(results, baseline, threshold=0.2, min_ms=1.0):
+    """
+    Régressions par rapport à ``baseline`` (même structure :
+    {échelle: {route: mesures}}) : [(échelle, route, mesure, avant, après)].
+    Une latence ne compte que si elle dépasse le seuil relatif et ``min_ms``
+    (bruit de mesure) ; toute requête SQL supplémentaire compte
+    """
+    regressions = []
+    for scale, routes in results.items():
+        for route, current in routes.items():
+            previous = baseline.get(scale, {}).get(route)
+            if not previous:
+                continue
+            for metric in ('p50_ms', 'p95_ms'):
+                before, after = previous[metric], current[metric]
+                if after > before * (1 + threshold) and after - before > min_ms:
+                    regressions.append((scale, route, metric, before, after))
+            if current['queries'] > previous['queries']:
+                regressions.append((scale, route, 'queries', previous['queries'], current['queries']))
+            if current['bytes'] > previous['bytes'] * (1 + threshold):
+                regressions.append((scale, route, 'bytes', previous['bytes'], current['bytes']))
+    return regressions
+
+
+# ------------------------------------------------------ Clients simultanés
+
+def _reload_urls():
+    from . import urls
+
+    importlib.reload(urls)
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+@contextmanager
+def use_async_views(enabled):
+    """Routes servies par les vues asynchrones (ou synchrones) le temps du bloc"""
+    with override_settings(PATRIMOINE_ASYNC_VIEWS=enabled):
+        _reload_urls()
+        try:
+            yield
+        finally:
+            clear_url_caches()
+    _reload_urls()
+
+
+def _throughput(latencies, elapsed, statuses):
+    latencies = sorted(latency for client in latencies for latency in client)
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(statistics.median(latencies), 3) if latencies else 0.0,
+        'p95_ms': round(_percentile(latencies, 0.95), 3) if latencies else 0.0,
+        'errors': sum(1 for status in statuses if status >= 400),
+    }
+
+
+def _measure_wsgi(urls, clients, requests):
+    statuses = []
+
+    def run(index):
+        client = Client(raise_request_exception=False)
+        latencies = []
+        try:
+            for number in range(requests):
+                start = time.perf_counter()
+                response, _size = _fetch(client, urls[(index + number) % len(urls)])
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses.append(response.status_code)
+        finally:
+            connection.close()
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(run, range(clients)))
+    return _throughput(latencies, time.perf_counter() - start, statuses)
+
+
+async def _afetch(client, url):
+    # Un fil par requête pour le code synchrone, comme ASGIHandler
+    async with ThreadSensitiveContext():
+        response = await client.get(url)
+        if response.streaming:
+            if response.is_async:
+                async for _chunk in response.streaming_content:
+                    pass
+            else:
+                for _chunk in response.streaming_content:
+                    pass
+    return response
+
+
+async def _measure_asgi(urls, clients, requests):
+    statuses = []
+
+    async def run(index):
+        client = AsyncClient(raise_request_exception=False)
+        latencies = []
+        for number in range(requests):
+            start = time.perf_counter()
+            response = await _afetch(client, urls[(index + number) % len(urls)])
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses.append(response.status_code)
+        return latencies
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(run(index) for index in range(clients)))
+    return _throughput(latencies, time.perf_counter() - start, statuses)
+
+
+def measure_throughput(urls, clients, requests, asgi=False):
+    """
+    ``clients`` clients simultanés envoient chacun ``requests`` requêtes
+    (``urls`` à tour de rôle) : débit, latences p50 / p95 et erreurs.
+    Sous ASGI, les routes de urls.py doivent pointer vers les vues
+    asynchrones (voir async_views)
+    """
+    if asgi:
+        return asyncio.run(_measure_asgi(urls, clients, requests))
+    return _measure_wsgi(urls, clients, requests)
@@ -0,0 +1,78 @@
+"""
+Modifications en masse du matériel : changement d'état et déplacement.
+
+Chaque opération est un seul ``QuerySet.update()`` (date_modification
+comprise, que update() ne renseigne pas d'elle-même) sur la sélection,
+bornée à son plus grand id lu au départ. Les anciennes valeurs sont lues
+avant, par lots de PATRIMOINE_BULK_UPDATE_BATCH_SIZE matériels suivis par
+id, et cumulées dans un résumé (signals.BulkUpdate) : un seul signal
+``bulk_updated`` met ensuite à jour l'instantané, l'index de recherche, le
+cache et l'historique pour l'ensemble des lignes (voir signals.py). La
+mémoire reste bornée par lot pour la lecture, et l'UPDATE n'a pas un
+paramètre par id.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Materiel
+from .signals import TRACKED_FIELDS, BulkUpdate, bulk_updated
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_batch_size():
+    return getattr(settings, 'PATRIMOINE_BULK_UPDATE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def materiel_changes(etat=None, salle=None, bureau=None):
+    """
+    Traduit l'action demandée en valeurs de colonnes, en gardant la règle
+    de Materiel.clean() : un déplacement vers une salle retire le bureau
+    et inversement
+    """
+    if salle is not None and bureau is not None:
+        raise ValidationError(
+            "Le matériel ne peut pas être associé à la fois à une salle et à un bureau."
+        )
+    changes = {}
+    if etat:
+        if etat not in dict(Materiel.ETAT_CHOICES):
+            raise ValidationError(f"État inconnu : {etat}")
+        changes['etat'] = etat
+    if salle is not None:
+        changes.update(salle_id=getattr(salle, 'pk', salle), bureau_id=None)
+    elif bureau is not None:
+        changes.update(bureau_id=getattr(bureau, 'pk', bureau), salle_id=None)
+    if not changes:
+        raise ValidationError("Aucune modification demandée.")
+    return changes
+
+
+def update_materiels(queryset, etat=None, salle=None, bureau=None, batch_size=None):
+    """
+    Applique un changement d'état et / ou un déplacement à tout le
+    queryset ; retourne le nombre de matériels modifiés
+    """
+    changes = materiel_changes(etat=etat, salle=salle, bureau=bureau)
+    batch_size = batch_size or get_batch_size()
+    with transaction.atomic():
+        max_id = queryset.order_by().aggregate(max_id=Max('id'))['max_id']
+        if max_id is None:
+            return 0
+        selection = queryset.filter(id__lte=max_id)
+        rows = selection.select_for_update().order_by('id').values('id', *TRACKED_FIELDS[Materiel])
+        update = BulkUpdate(Materiel, changes)
+        last_id = None
+        while True:
+            batch = rows if last_id is None else rows.filter(id__gt=last_id)
+            old_values = list(batch[:batch_size])
+            update.add(old_values)
+            if len(old_values) < batch_size:
+                break
+            last_id = old_values[-1]['id']
+        selection.update(date_modification=update.date, **changes)
+        bulk_updated.send(sender=Materiel, update=update)
+    return len(update)
@@ -0,0 +1,128 @@
+"""
+Cache des pages et fragments avec clés versionnées.
+
+Chaque page ou fragment dépend d'une ou plusieurs « portées » (ex :
+``dashboard``, ``list:materiel``, ``detail:salle:12``). Une portée a un
+numéro de version stocké dans le cache ; la clé d'une page contient les
+versions de ses portées. Invalider revient à incrémenter une version
+(voir signals.py) : les anciennes entrées ne sont plus jamais lues et
+expirent d'elles-mêmes.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+KEY_PREFIX = 'patrimoine'
+DEFAULT_TIMEOUT = 300
+
+
+def get_timeout():
+    return getattr(settings, 'PATRIMOINE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _version_key(scope):
+    return f'{KEY_PREFIX}:version:{scope}'
+
+
+def _initial_version():
+    # Une version perdue (éviction) repart d'une valeur jamais utilisée
+    return time.time_ns() // 1000
+
+
+def get_versions(*scopes):
+    """Retourne la version courante de chaque portée (une lecture du cache)"""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key, _initial_version())
+        versions.append(found[key])
+    return versions
+
+
+def bump(*scopes):
+    """Invalide les portées données"""
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), timeout=None)
+
+
+def invalidate(*scopes):
+    """
+    Invalide tout de suite puis après validation de la transaction, pour
+    qu'une page recalculée entre-temps avec les anciennes données ne reste
+    pas en cache
+    """
+    bump(*scopes)
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def fragment_key(*scopes):
+    """Suffixe à passer à {% cache %} pour versionner un fragment"""
+    return '-'.join(str(version) for version in get_versions(*scopes))
+
+
+def cached_view(*scopes):
+    """
+    Met en cache la réponse GET d'une vue, par URL complète (paramètres
+    compris). Les portées peuvent utiliser les arguments de la vue,
+    ex : 'detail:salle:{pk}'. Accepte aussi les vues asynchrones.
+    """
+    def decorator(view):
+        def page_key(request, kwargs):
+            timeout = get_timeout()
+            if request.method not in ('GET', 'HEAD') or not timeout:
+                return None, timeout
+            resolved = [scope.format(**kwargs) for scope in scopes]
+            versions = '-'.join(str(version) for version in get_versions(*resolved))
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            return f'{KEY_PREFIX}:page:{view.__name__}:{path}:{versions}', timeout
+
+        def cached_response(key):
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            return None
+
+        def store(key, response, timeout):
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+
+        if iscoroutinefunction(view):
+            # Cache local (mémoire ou fichiers) : lu directement, sans passer par un fil
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key, timeout = page_key(request, kwargs)
+                if key is None:
+                    return await view(request, *args, **kwargs)
+                response = cached_response(key)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    store(key, response, timeout)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key, timeout = page_key(request, kwargs)
+            if key is None:
+                return view(request, *args, **kwargs)
+            response = cached_response(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                store(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,186 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) à partir de
+``date_modification``.
+
+Avant d'exécuter une vue, on lit l'« état » de ce qu'elle affiche avec une
+seule requête couverte par les index (date_modification, id) :
+date de dernière modification et, pour les listes, dernière ligne de la
+table Suppression (une suppression ne fait pas avancer le Max ; id et
+date sont lus sur leurs index, sans compter les tables). Les fiches de
+salle / bureau n'ont pas de date pour le retrait d'un matériel : elles
+n'envoient pas de Last-Modified et se fient à l'ETag. Si le client envoie
+If-None-Match / If-Modified-Since et que rien n'a changé, on répond 304
+sans rendre le gabarit.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import DateTimeField, F, Func, IntegerField, OuterRef, Subquery
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import Bureau, Salle, Materiel, PatrimoineStats, Suppression
+from .stats import SNAPSHOT_PK
+
+
+def _max_date():
+    # Func et non Max : pas de GROUP BY, une seule ligne même sur une table vide
+    return Func(F('date_modification'), function='MAX', output_field=DateTimeField())
+
+
+def _count():
+    return Func(F('id'), function='COUNT', output_field=IntegerField())
+
+
+def _max_id():
+    return Func(F('id'), function='MAX', output_field=IntegerField())
+
+
+def _max_deletion_date():
+    return Func(F('date_suppression'), function='MAX', output_field=DateTimeField())
+
+
+def _scalar(queryset, expression):
+    return Subquery(queryset.order_by().values(value=expression), output_field=expression.output_field)
+
+
+def _latest(*dates):
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+def tables_state(*models, snapshot=False):
+    """
+    Dernière modification de chaque table, dernière suppression (id et
+    date, toutes tables confondues) et date de l'instantané
+    PatrimoineStats si ``snapshot``, en une seule requête.
+    Retourne (date la plus récente, clé de version).
+    """
+    base, others = models[0], models[1:]
+    values = {
+        'last': _max_date(),
+        'deleted': _scalar(Suppression.objects.all(), _max_id()),
+        'deleted_last': _scalar(Suppression.objects.all(), _max_deletion_date()),
+    }
+    for model in others:
+        values[f'{model._meta.model_name}_last'] = _scalar(model.objects.all(), _max_date())
+    if snapshot:
+        values['snapshot'] = Subquery(
+            PatrimoineStats.objects.filter(pk=SNAPSHOT_PK).values('date_modification')
+        )
+    state = base.objects.order_by().values(**values).get()
+    dates = [value for name, value in state.items() if name == 'last' or name.endswith('_last')]
+    return _latest(*dates, state.get('snapshot')), tuple(sorted(state.items()))
+
+
+def bureau_list_state(request, **criteres):
+    return tables_state(Bureau)
+
+
+def salle_list_state(request, **criteres):
+    return tables_state(Salle)
+
+
+def materiel_list_state(request, **criteres):
+    # Les listes affichent le nom de la salle / du bureau
+    return tables_state(Materiel, Salle, Bureau)
+
+
+def home_state(request, *args, **kwargs):
+    return tables_state(Materiel, Salle, Bureau, snapshot=True)
+
+
+def dashboard_state(request):
+    last = (
+        PatrimoineStats.objects.filter(pk=SNAPSHOT_PK)
+        .values_list('date_modification', flat=True).first()
+    )
+    return last, last
+
+
+def _location_state(model, pk, relation):
+    """
+    Objet et matériels qu'il contient (le nombre capte retraits et
+    suppressions). Pas de date : un matériel retiré ou supprimé ne laisse
+    aucune date propre à la salle / au bureau, seul l'ETag le voit
+    """
+    materiels = Materiel.objects.filter(**{relation: OuterRef('pk')})
+    state = model.objects.filter(pk=pk).values_list(
+        'date_modification',
+        _scalar(materiels, _max_date()),
+        _scalar(materiels, _count()),
+    ).first()
+    if state is None:
+        return None
+    return None, state
+
+
+def bureau_detail_state(request, pk):
+    return _location_state(Bureau, pk, 'bureau_id')
+
+
+def salle_detail_state(request, pk):
+    return _location_state(Salle, pk, 'salle_id')
+
+
+def materiel_detail_state(request, pk):
+    # La fiche affiche la salle ou le bureau du matériel
+    dates = (
+        Materiel.objects.filter(pk=pk)
+        .values_list('date_modification', 'salle__date_modification', 'bureau__date_modification')
+        .first()
+    )
+    if dates is None:
+        return None
+    return _latest(*dates), dates
+
+
+def make_etag(key):
+    return 'W/"%s"' % hashlib.md5(repr(key).encode()).hexdigest()
+
+
+def conditional_view(state_func):
+    """
+    ETag et Last-Modified calculés par ``state_func(request, *args, **kwargs)``,
+    qui retourne (date de dernière modification, clé de version) ou None
+    (objet introuvable : la vue s'exécute normalement). Une seule lecture
+    de l'état par requête ; les réponses portent Cache-Control: no-cache
+    pour que le navigateur revalide à chaque visite. Accepte aussi les
+    vues asynchrones.
+    """
+    def decorator(view):
+        def get_state(request, *args, **kwargs):
+            if not hasattr(request, '_patrimoine_state'):
+                request._patrimoine_state = state_func(request, *args, **kwargs)
+            return request._patrimoine_state
+
+        def etag(request, *args, **kwargs):
+            state = get_state(request, *args, **kwargs)
+            return make_etag((request.get_full_path(), state[1])) if state else None
+
+        def last_modified(request, *args, **kwargs):
+            state = get_state(request, *args, **kwargs)
+            return state[0] if state else None
+
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        def no_cache(request, response):
+            if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+                patch_cache_control(response, no_cache=True)
+            return response
+
+        if iscoroutinefunction(view):
+            # Vue asynchrone : l'état est lu d'avance (ORM synchrone dans un
+            # fil), condition() le retrouve ensuite sur la requête
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                request._patrimoine_state = await sync_to_async(state_func)(request, *args, **kwargs)
+                return no_cache(request, await conditional(request, *args, **kwargs))
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return no_cache(request, conditional(request, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,25 @@
+"""
+Réglage des connexions SQLite à leur ouverture (signal connection_created).
+
+Les PRAGMA de PATRIMOINE_SQLITE_PRAGMAS (voir patrimoine_project/database.py)
+sont exécutés sur chaque nouvelle connexion : ils ne sont pas tous
+persistants dans le fichier (synchronous, busy_timeout, cache_size...).
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+def get_pragmas():
+    return getattr(settings, 'PATRIMOINE_SQLITE_PRAGMAS', {})
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in get_pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def connect_database_signals():
+    connection_created.connect(configure_sqlite, dispatch_uid='patrimoine_sqlite_pragmas')
@@ -0,0 +1,281 @@
+"""
+Export de l'inventaire en CSV ou XLSX, en flux.
+
+Les lignes sont lues par ``values_list(...).iterator(chunk_size=...)`` :
+aucun objet modèle n'est créé et la mémoire reste constante quel que soit
+le nombre de lignes. Les deux formats sont produits au fil de l'eau :
+
+- CSV (UTF-8 avec BOM pour Excel) ligne par ligne ;
+- XLSX écrit directement (zip + SpreadsheetML, sans dépendance) : la
+  feuille est compressée morceau par morceau pendant l'itération.
+"""
+import csv
+import re
+import zipfile
+from dataclasses import dataclass
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import F, Func, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .filters import apply_filters
+from .models import Bureau, Salle, Materiel
+from .search import search_queryset
+
+DEFAULT_CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def get_chunk_size():
+    return getattr(settings, 'PATRIMOINE_EXPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+@dataclass
+class Export:
+    """Champs lus (values_list), en-têtes des colonnes et mise en forme d'une ligne"""
+    title: str
+    model: type
+    fields: tuple
+    headers: tuple
+    annotations: object = None
+    row: object = None
+
+    def queryset(self, params=None):
+        """Mêmes lignes que la liste : critères du formulaire puis recherche (voir views.list_query)"""
+        queryset = self.model.objects.all()
+        if params is not None:
+            queryset, form = apply_filters(queryset, params)
+            search_query = params.get('search', '') or form.cleaned_data.get('recherche', '')
+            queryset, _ordering = search_queryset(queryset, search_query)
+        if self.annotations:
+            queryset = queryset.annotate(**self.annotations())
+        return queryset.order_by('id').values_list(*self.fields)
+
+    def rows(self, params=None, chunk_size=None):
+        for values in self.queryset(params).iterator(chunk_size=chunk_size or get_chunk_size()):
+            yield self.row(values) if self.row else values
+
+
+def _choices(choices):
+    return dict(choices).get
+
+
+def _materiel_counts(relation):
+    """Nombre de matériels et quantité totale par salle / bureau (sous-requêtes sur l'index)"""
+    materiels = Materiel.objects.filter(**{relation: OuterRef('pk')}).order_by()
+    count = Func(F('id'), function='COUNT', output_field=IntegerField())
+    total = Func(F('quantite'), function='SUM', output_field=IntegerField())
+    return {
+        'nombre_materiels': Subquery(materiels.values(value=count), output_field=IntegerField()),
+        'quantite_materiels': Coalesce(
+            Subquery(materiels.values(value=total), output_field=IntegerField()), 0
+        ),
+    }
+
+
+_etat_label = _choices(Materiel.ETAT_CHOICES)
+_type_salle_label = _choices(Salle.TYPE_SALLE_CHOICES)
+_type_bureau_label = _choices(Bureau.TYPE_BUREAU_CHOICES)
+
+
+def _materiel_row(values):
+    (pk, nom, etat, quantite, prix_unitaire, numero_serie, date_acquisition,
+     salle, bureau) = values
+    # Mêmes règles que Materiel.get_valeur_totale et get_localisation
+    valeur_totale = prix_unitaire * quantite if prix_unitaire and quantite else None
+    localisation = f"Salle: {salle}" if salle is not None else (
+        f"Bureau: {bureau}" if bureau is not None else "Non localisé"
+    )
+    return (pk, nom, _etat_label(etat, etat), quantite, prix_unitaire, valeur_totale,
+            numero_serie, date_acquisition, localisation)
+
+
+def _salle_row(values):
+    pk, nom, type_salle, *rest = values
+    return (pk, nom, _type_salle_label(type_salle, type_salle), *rest)
+
+
+def _bureau_row(values):
+    pk, nom, type_bureau, *rest = values
+    return (pk, nom, _type_bureau_label(type_bureau, type_bureau), *rest)
+
+
+EXPORTS = {
+    'materiels': Export(
+        title='Matériels',
+        model=Materiel,
+        fields=('id', 'nom', 'etat', 'quantite', 'prix_unitaire', 'numero_serie',
+                'date_acquisition', 'salle__nom', 'bureau__nom'),
+        headers=('ID', 'Nom', 'État', 'Quantité', 'Prix unitaire', 'Valeur totale',
+                 'Numéro de série', "Date d'acquisition", 'Localisation'),
+        row=_materiel_row,
+    ),
+    'salles': Export(
+        title='Salles',
+        model=Salle,
+        fields=('id', 'nom', 'type_salle', 'niveau', 'surface', 'capacite', 'disponible',
+                'nombre_materiels', 'quantite_materiels'),
+        headers=('ID', 'Nom', 'Type', 'Niveau', 'Surface (m²)', 'Capacité', 'Disponible',
+                 'Nombre de matériels', 'Quantité de matériels'),
+        annotations=lambda: _materiel_counts('salle_id'),
+        row=_salle_row,
+    ),
+    'bureaux': Export(
+        title='Bureaux',
+        model=Bureau,
+        fields=('id', 'nom', 'type_bureau', 'niveau', 'surface', 'capacite',
+                'nombre_materiels', 'quantite_materiels'),
+        headers=('ID', 'Nom', 'Type', 'Niveau', 'Surface (m²)', 'Capacité',
+                 'Nombre de matériels', 'Quantité de matériels'),
+        annotations=lambda: _materiel_counts('bureau_id'),
+        row=_bureau_row,
+    ),
+}
+
+
+# ---------------------------------------------------------------- CSV
+
+class Echo:
+    """Pseudo-fichier : write() retourne la ligne au lieu de la stocker"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'oui' if value else 'non'
+    return value
+
+
+def csv_stream(export, rows):
+    """Produit le CSV ligne par ligne (octets UTF-8, BOM en tête pour Excel)"""
+    writer = csv.writer(Echo())
+    yield '\ufeff'.encode() + writer.writerow(export.headers).encode()
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row]).encode()
+
+
+# ---------------------------------------------------------------- XLSX
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+# Caractères de contrôle interdits en XML : un seul rend le classeur illisible
+XML_ILLEGAL_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _Buffer:
+    """Sortie du zip vidée après chaque morceau (non « seekable »)"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _xlsx_cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, bool):
+        value = 'oui' if value else 'non'
+    elif isinstance(value, (int, float)) or hasattr(value, 'as_tuple'):
+        return f'<c><v>{value}</v></c>'
+    elif hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    text = escape(XML_ILLEGAL_RE.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t>{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def xlsx_stream(export, rows, batch_size=500):
+    """Produit un classeur XLSX (une feuille) par morceaux compressés"""
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(title=escape(export.title)))
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            lines = [XLSX_SHEET_START, _xlsx_row(export.headers)]
+            for row in rows:
+                lines.append(_xlsx_row(row))
+                if len(lines) >= batch_size:
+                    sheet.write(''.join(lines).encode())
+                    lines = []
+                    yield buffer.drain()
+            lines.append(XLSX_SHEET_END)
+            sheet.write(''.join(lines).encode())
+        yield buffer.drain()
+    yield buffer.drain()
+
+
+WRITERS = {
+    'csv': csv_stream,
+    'xlsx': xlsx_stream,
+}
+
+
+def stream_export(kind, fmt, params=None, chunk_size=None):
+    """Itérateur d'octets de l'export ``kind`` au format ``fmt``"""
+    export = EXPORTS[kind]
+    return WRITERS[fmt](export, export.rows(params, chunk_size))
@@ -0,0 +1,72 @@
+"""
+Filtrage multicritère des listes à partir des formulaires de recherche
+(BureauSearchForm, SalleSearchForm, MaterielSearchForm).
+
+Chaque critère est traduit en condition exploitable par un index
+(égalité, borne inférieure, IS NOT NULL) ; les index composites
+correspondants sont déclarés dans Meta.indexes des modèles.
+Le champ texte ``recherche`` est traité par la recherche plein texte.
+"""
+from .forms import BureauSearchForm, SalleSearchForm, MaterielSearchForm
+from .models import Bureau, Salle, Materiel
+
+# Borne haute des entiers (IntegerField) : « capacite >= n » devient un
+# intervalle fermé, que SQLite juge assez sélectif pour chercher dans
+# l'index (capacite) plutôt que de parcourir l'index de tri (nom, id)
+INTEGER_MAX = 2 ** 31 - 1
+
+
+def filter_bureaux(queryset, data):
+    """Type de bureau et niveau (index (type_bureau, niveau) et (niveau))"""
+    if data.get('type_bureau'):
+        queryset = queryset.filter(type_bureau=data['type_bureau'])
+    if data.get('niveau'):
+        queryset = queryset.filter(niveau=data['niveau'])
+    return queryset
+
+
+def filter_salles(queryset, data):
+    """Type, disponibilité, capacité minimum (index (type_salle, disponible, capacite))"""
+    if data.get('type_salle'):
+        queryset = queryset.filter(type_salle=data['type_salle'])
+    if data.get('disponible') in ('true', 'false'):
+        # IN plutôt que l'égalité : SQLite compile « disponible = true » en
+        # « WHERE disponible », que son planificateur ne sait pas chercher dans un index
+        queryset = queryset.filter(disponible__in=[data['disponible'] == 'true'])
+    if data.get('capacite_min') is not None:
+        queryset = queryset.filter(capacite__range=(data['capacite_min'], INTEGER_MAX))
+    return queryset
+
+
+def filter_materiels(queryset, data):
+    """État et localisation (index (etat, salle), (etat, bureau) et index partiels)"""
+    if data.get('etat'):
+        queryset = queryset.filter(etat=data['etat'])
+    if data.get('localisation') == 'salle':
+        queryset = queryset.filter(salle__isnull=False)
+    elif data.get('localisation') == 'bureau':
+        queryset = queryset.filter(bureau__isnull=False)
+    return queryset
+
+
+FILTERS = {
+    Bureau: (BureauSearchForm, filter_bureaux),
+    Salle: (SalleSearchForm, filter_salles),
+    Materiel: (MaterielSearchForm, filter_materiels),
+}
+
+
+def apply_filters(queryset, params, **fixed):
+    """
+    Valide ``params`` (request.GET) avec le formulaire de recherche du modèle
+    et applique les critères au queryset. ``fixed`` impose des critères
+    (ex : type_salle='reunion' pour les anciennes URL par type).
+    Les champs invalides sont ignorés. Retourne (queryset, formulaire).
+    """
+    form_class, filter_function = FILTERS[queryset.model]
+    data = params.copy()
+    for name, value in fixed.items():
+        data[name] = value
+    form = form_class(data)
+    form.is_valid()
+    return filter_function(queryset, form.cleaned_data), form
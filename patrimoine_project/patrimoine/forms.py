@@ -1,6 +1,9 @@
 from django import forms
 from django.core.exceptions import ValidationError
 from .models import Bureau, Salle, Materiel
+from .imports import ImportFileError, detect_format
+from .bulk import materiel_changes
+from .locations import LocationAutocomplete
 
 
 class BureauForm(forms.ModelForm):
@@ -247,13 +250,14 @@ class MaterielForm(forms.ModelForm):
             'prix_unitaire',
         ]
         widgets = {
-            'salle': forms.Select(attrs={
+            # Recherche au fil de la saisie plutôt qu'une liste de toutes les salles / bureaux
+            'salle': LocationAutocomplete(Salle, attrs={
                 'class': 'form-control',
-                'placeholder': 'Sélectionnez une salle'
+                'placeholder': 'Rechercher une salle'
             }),
-            'bureau': forms.Select(attrs={
+            'bureau': LocationAutocomplete(Bureau, attrs={
                 'class': 'form-control',
-                'placeholder': 'Sélectionnez un bureau'
+                'placeholder': 'Rechercher un bureau'
             }),
             'nom': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -319,10 +323,6 @@ class MaterielForm(forms.ModelForm):
         self.fields['salle'].required = False
         self.fields['bureau'].required = False
 
-        # Ajouter des options vides pour les select
-        self.fields['salle'].empty_label = "-- Sélectionner une salle --"
-        self.fields['bureau'].empty_label = "-- Sélectionner un bureau --"
-
     def clean_quantite(self):
         """Validation personnalisée pour la quantité"""
         quantite = self.cleaned_data.get('quantite')
@@ -361,6 +361,125 @@ class MaterielForm(forms.ModelForm):
         return cleaned_data
 
 
+class InventoryImportForm(forms.Form):
+    """Import en masse du matériel (voir imports.py)"""
+
+    fichier = forms.FileField(
+        label='Fichier CSV ou XLSX',
+        widget=forms.FileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.xlsx'
+        }),
+        help_text='Colonnes : nom, salle ou bureau (ou localisation), quantite, etat, '
+                  'prix_unitaire, numero_serie, date_acquisition, description'
+    )
+    partiel = forms.BooleanField(
+        required=False,
+        label='Importer les lignes valides même si d\'autres sont en erreur'
+    )
+    simulation = forms.BooleanField(
+        required=False,
+        label='Vérifier seulement (aucune écriture)'
+    )
+    arriere_plan = forms.BooleanField(
+        required=False,
+        label='Importer en tâche de fond (gros fichiers)'
+    )
+
+    def clean_fichier(self):
+        fichier = self.cleaned_data.get('fichier')
+        if fichier:
+            try:
+                detect_format(fichier.name)
+            except ImportFileError as exc:
+                raise ValidationError(str(exc))
+        return fichier
+
+
+class MaterielBulkForm(forms.Form):
+    """
+    Modification en masse du matériel (voir bulk.py) : sélection par
+    identifiants ou par localisation d'origine, puis nouvel état et / ou
+    nouvelle salle ou nouveau bureau
+    """
+
+    ids = forms.ModelMultipleChoiceField(
+        queryset=Materiel.objects.all(),
+        required=False,
+        widget=forms.MultipleHiddenInput
+    )
+    depuis_salle = forms.ModelChoiceField(
+        queryset=Salle.objects.all(),
+        required=False,
+        label='Tout le matériel de la salle',
+        widget=LocationAutocomplete(Salle, attrs={
+            'class': 'form-control',
+            'placeholder': 'Rechercher une salle'
+        })
+    )
+    depuis_bureau = forms.ModelChoiceField(
+        queryset=Bureau.objects.all(),
+        required=False,
+        label='Tout le matériel du bureau',
+        widget=LocationAutocomplete(Bureau, attrs={
+            'class': 'form-control',
+            'placeholder': 'Rechercher un bureau'
+        })
+    )
+    etat = forms.ChoiceField(
+        required=False,
+        label='Nouvel état',
+        choices=[('', '-- Inchangé --')] + Materiel.ETAT_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    salle = forms.ModelChoiceField(
+        queryset=Salle.objects.all(),
+        required=False,
+        label='Déplacer vers la salle',
+        widget=LocationAutocomplete(Salle, attrs={
+            'class': 'form-control',
+            'placeholder': 'Inchangée (rechercher une salle)'
+        })
+    )
+    bureau = forms.ModelChoiceField(
+        queryset=Bureau.objects.all(),
+        required=False,
+        label='Déplacer vers le bureau',
+        widget=LocationAutocomplete(Bureau, attrs={
+            'class': 'form-control',
+            'placeholder': 'Inchangé (rechercher un bureau)'
+        })
+    )
+
+    def clean(self):
+        """Validation globale du formulaire"""
+        cleaned_data = super().clean()
+        ids = cleaned_data.get('ids')
+        depuis_salle = cleaned_data.get('depuis_salle')
+        depuis_bureau = cleaned_data.get('depuis_bureau')
+
+        if not ids and not depuis_salle and not depuis_bureau:
+            raise ValidationError('Sélectionnez du matériel, une salle ou un bureau d\'origine.')
+        if depuis_salle and depuis_bureau:
+            raise ValidationError('Choisissez une salle ou un bureau d\'origine, pas les deux.')
+
+        materiel_changes(
+            etat=cleaned_data.get('etat'),
+            salle=cleaned_data.get('salle'),
+            bureau=cleaned_data.get('bureau'),
+        )
+        return cleaned_data
+
+    def selection(self):
+        """Matériel visé par la modification"""
+        data = self.cleaned_data
+        if data.get('ids'):
+            return data['ids']
+        if data.get('depuis_salle'):
+            return Materiel.objects.filter(salle=data['depuis_salle'])
+        return Materiel.objects.filter(bureau=data['depuis_bureau'])
+
+
 # ========== FORMULAIRES DE RECHERCHE / FILTRAGE ==========
 
 class BureauSearchForm(forms.Form):
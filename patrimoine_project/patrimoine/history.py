@@ -0,0 +1,235 @@
+"""
+Historique du matériel : état, quantité, prix et localisation dans le temps.
+
+Écriture (voir signals.py) : chaque enregistrement, suppression (cascades
+comprises) et écriture en masse produit une ligne HistoriqueMateriel par
+matériel, avec les seuls champs modifiés, encodés sur des clés courtes
+(``{"e": "hs"}`` plutôt qu'un état complet). Les lignes sont accumulées
+pendant la transaction et insérées par un seul bulk_create à sa
+validation : une salle supprimée avec mille matériels donne un INSERT, et
+une transaction annulée ne laisse aucune ligne. Les lignes sont datées de
+leur insertion : une transaction commencée le 31 et validée le 1er compte
+dans le nouveau mois, dont l'ouverture est déjà calculée. Entre la
+validation et l'insertion (quelques millisecondes), un arrêt brutal du
+processus peut perdre les lignes de la dernière transaction.
+
+Lecture :
+
+- ``materiel_state(pk, at)`` : état d'un matériel à une date, à partir de
+  ses seules lignes (index materiel_id, date) ;
+- ``inventory_value(at)`` : valeur de l'inventaire à une date = valeur en
+  début de mois (HistoriqueMois, calculée une fois par mois clos) + lignes
+  du mois jusqu'à la date (index mois, date), sans relire tout le journal.
+"""
+import threading
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import stats
+from .models import Materiel, HistoriqueMateriel, HistoriqueMois
+
+# Champ suivi -> clé dans HistoriqueMateriel.changements
+FIELDS = {
+    'etat': 'e',
+    'quantite': 'q',
+    'prix_unitaire': 'p',
+    'salle_id': 's',
+    'bureau_id': 'b',
+}
+KEYS = {key: name for name, key in FIELDS.items()}
+
+BATCH_SIZE = 1000
+
+# Délai après le début d'un mois avant d'enregistrer son ouverture : les
+# lignes datées juste avant minuit mais insérées juste après y comptent
+OPENING_GRACE = timedelta(minutes=5)
+
+_local = threading.local()
+
+
+def month_key(date):
+    date = date.astimezone(dt_timezone.utc)
+    return date.year * 100 + date.month
+
+
+def next_month(mois):
+    year, month = divmod(mois, 100)
+    return (year + 1) * 100 + 1 if month == 12 else mois + 1
+
+
+def _value(values):
+    return stats.contribution(Materiel, values).get('materiel_valeur', 0) if values else 0
+
+
+def encode(values):
+    """{'etat': 'hs', 'prix_unitaire': Decimal('10.00')} -> {'e': 'hs', 'p': '10.00'}"""
+    return {
+        FIELDS[name]: str(value) if isinstance(value, Decimal) else value
+        for name, value in values.items() if name in FIELDS
+    }
+
+
+def decode(changes):
+    values = {KEYS[key]: value for key, value in changes.items()}
+    if values.get('prix_unitaire') is not None:
+        values['prix_unitaire'] = Decimal(str(values['prix_unitaire']))
+    return values
+
+
+def make_entry(pk, old_values, new_values, date=None):
+    """
+    Ligne du journal pour un matériel : création si old_values est None,
+    suppression si new_values est None, sinon modification (None si rien
+    de suivi n'a changé). La date est provisoire : flush() la remplace
+    """
+    date = date or timezone.now()
+    if old_values is None:
+        action, changes = 'c', {name: new_values[name] for name in FIELDS}
+    elif new_values is None:
+        action, changes = 's', {}
+    else:
+        changes = {name: new_values[name] for name in FIELDS if new_values[name] != old_values[name]}
+        if not changes:
+            return None
+        action = 'm'
+    return HistoriqueMateriel(
+        materiel_id=pk,
+        date=date,
+        mois=month_key(date),
+        action=action,
+        changements=encode(changes),
+        delta_valeur=_value(new_values) - _value(old_values),
+    )
+
+
+# ---------------------------------------------------------------- Écriture par lots
+
+def _state():
+    if not hasattr(_local, 'committed'):
+        _local.committed = []
+    return _local
+
+
+def _confirm(entries):
+    _state().committed.extend(entries)
+
+
+def flush():
+    """Insère les lignes des transactions validées, datées de maintenant"""
+    state = _state()
+    entries, state.committed = state.committed, []
+    if entries:
+        date = timezone.now()
+        for entry in entries:
+            entry.date = date
+            entry.mois = month_key(date)
+        HistoriqueMateriel.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def _schedule_flush(connection):
+    """
+    Un seul vidage par transaction, placé après toutes ses confirmations.
+    Le vidage déjà prévu est remis en fin de file, rattaché aux seuls
+    points de sauvegarde encore ouverts communs aux deux enregistrements :
+    l'annulation d'un point de sauvegarde emporte ses lignes mais jamais
+    le vidage des lignes qui restent
+    """
+    sids = set(connection.savepoint_ids)
+    pending = []
+    for saved, func, robust in connection.run_on_commit:
+        if func is flush:
+            sids &= saved
+        else:
+            pending.append((saved, func, robust))
+    pending.append((sids, flush, False))
+    connection.run_on_commit = pending
+
+
+def record(entries):
+    """
+    Ajoute des lignes au journal à la validation de la transaction courante
+    (tout de suite hors transaction) ; rien n'est écrit si elle est annulée
+    """
+    entries = [entry for entry in entries if entry is not None]
+    if not entries:
+        return
+    transaction.on_commit(partial(_confirm, entries))
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        _schedule_flush(connection)
+    else:
+        flush()
+
+
+# ---------------------------------------------------------------- Lecture
+
+def materiel_history(pk, at=None):
+    """Lignes du journal d'un matériel (jusqu'à ``at``), dans l'ordre"""
+    entries = HistoriqueMateriel.objects.filter(materiel_id=pk)
+    if at is not None:
+        entries = entries.filter(date__lte=at)
+    return entries.order_by('date', 'id')
+
+
+def materiel_state(pk, at):
+    """
+    État suivi d'un matériel à la date ``at`` ({'etat': ..., 'quantite': ...}),
+    ou None s'il n'existait pas (ou plus)
+    """
+    state = None
+    for action, changes in materiel_history(pk, at).values_list('action', 'changements'):
+        if action == 's':
+            state = None
+        elif action == 'c' or state is None:
+            state = decode(changes)
+        else:
+            state.update(decode(changes))
+    return state
+
+
+def _month_total(mois, at=None):
+    entries = HistoriqueMateriel.objects.filter(mois=mois)
+    if at is not None:
+        entries = entries.filter(date__lte=at)
+    return entries.aggregate(total=Sum('delta_valeur'))['total'] or Decimal('0')
+
+
+def month_opening(mois):
+    """
+    Valeur de l'inventaire au début du mois. Les ouvertures des mois
+    commencés depuis plus de OPENING_GRACE ne changent plus (le journal ne
+    reçoit que des lignes datées de leur insertion) : elles sont calculées
+    une fois, mois par mois depuis la dernière connue, puis enregistrées
+    """
+    known = HistoriqueMois.objects.filter(mois__lte=mois).order_by('-mois').first()
+    if known is not None and known.mois == mois:
+        return known.valeur_ouverture
+    if known is not None:
+        current, value = known.mois, known.valeur_ouverture
+    else:
+        first = HistoriqueMateriel.objects.order_by('mois').values_list('mois', flat=True).first()
+        if first is None or first >= mois:
+            return Decimal('0')
+        current, value = first, Decimal('0')
+
+    closed_month = month_key(timezone.now() - OPENING_GRACE)
+    openings = []
+    while current < mois:
+        value += _month_total(current)
+        current = next_month(current)
+        if current <= closed_month:
+            openings.append(HistoriqueMois(mois=current, valeur_ouverture=value))
+    HistoriqueMois.objects.bulk_create(openings, ignore_conflicts=True)
+    return value
+
+
+def inventory_value(at):
+    """Valeur totale de l'inventaire (prix unitaire x quantité) à la date ``at``"""
+    mois = month_key(at)
+    return month_opening(mois) + _month_total(mois, at)
+
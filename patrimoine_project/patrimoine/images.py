@@ -0,0 +1,113 @@
+"""
+Déclinaisons des photos de salle (Salle.picture).
+
+À l'enregistrement d'une nouvelle photo (voir signals.py), l'image est
+redimensionnée en plusieurs largeurs fixes, en WebP et en JPEG, sans ses
+métadonnées (EXIF, GPS, profils). Les fichiers sont nommés d'après le
+hachage du contenu d'origine : deux envois identiques partagent les mêmes
+fichiers, et un nom ne change jamais de contenu (cache navigateur illimité).
+
+Le résultat est stocké dans Salle.picture_renditions :
+``{'thumb': {'width': 320, 'height': 213, 'webp': <nom>, 'jpeg': <nom>}, ...}``
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'salles/renditions'
+
+# Largeur maximale de chaque déclinaison (jamais agrandie)
+RENDITIONS = {
+    'thumb': 320,
+    'detail': 800,
+    'full': 1600,
+}
+
+# Format Pillow, extension et options d'encodage
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def content_hash(file):
+    """SHA-256 du fichier, lu par morceaux"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def rendition_name(digest, rendition, extension):
+    return f'{RENDITIONS_DIR}/{digest[:2]}/{digest}-{rendition}.{extension}'
+
+
+def _prepare(image):
+    """Applique l'orientation EXIF puis passe en RGB (sans métadonnées)"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, fmt):
+    pil_format, _extension, options = FORMATS[fmt]
+    buffer = BytesIO()
+    # Aucune métadonnée n'est transmise (exif, icc_profile...) : elles sont perdues
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_renditions(file, storage=None):
+    """
+    Génère les déclinaisons d'une image et retourne leur description,
+    ou {} si le fichier n'est pas une image lisible
+    """
+    storage = storage or default_storage
+    file.open('rb')
+    try:
+        digest = content_hash(file)
+        try:
+            source = _prepare(Image.open(file))
+        except (UnidentifiedImageError, OSError) as exc:
+            logger.warning("Photo illisible %s : %s", getattr(file, 'name', file), exc)
+            return {}
+
+        renditions = {}
+        for rendition, max_width in RENDITIONS.items():
+            image = source
+            if image.width > max_width:
+                height = round(image.height * max_width / image.width)
+                image = image.resize((max_width, height), Image.LANCZOS)
+            data = {'width': image.width, 'height': image.height}
+            for fmt, (_pil_format, extension, _options) in FORMATS.items():
+                name = rendition_name(digest, rendition, extension)
+                if not storage.exists(name):
+                    name = storage.save(name, ContentFile(_encode(image, fmt)))
+                data[fmt] = name
+            renditions[rendition] = data
+        return renditions
+    finally:
+        file.close()
+
+
+def srcset(renditions, fmt, storage=None):
+    """Attribut srcset (« url 320w, url 800w ») pour un format"""
+    storage = storage or default_storage
+    # Une petite image donne plusieurs déclinaisons de même largeur : une seule suffit
+    urls = {}
+    for data in sorted(renditions.values(), key=lambda data: data['width']):
+        if fmt in data:
+            urls.setdefault(data['width'], storage.url(data[fmt]))
+    return ', '.join(f'{url} {width}w' for width, url in urls.items())
@@ -0,0 +1,387 @@
+"""
+Import en masse du matériel depuis un fichier CSV ou XLSX.
+
+Étapes :
+
+1. lecture du fichier (CSV : ',' ou ';' ; XLSX : lu directement, sans
+   dépendance) et rangement des valeurs par colonne ;
+2. validation colonne par colonne sur toutes les lignes à la fois, avec
+   les règles de MaterielForm (quantité, prix, salle OU bureau) ; les noms
+   de salle / bureau sont résolus par un dictionnaire chargé en une requête ;
+3. écriture par ``bulk_create`` en lots de PATRIMOINE_IMPORT_BATCH_SIZE,
+   dans une transaction, puis un seul signal ``bulk_created``.
+
+Les en-têtes acceptés sont les noms des champs ou les libellés de l'export
+(voir exports.py), ce qui permet de réimporter un export. Le résultat est un
+ImportReport avec une erreur par ligne et par colonne fautive.
+"""
+import csv
+import io
+import re
+import unicodedata
+import zipfile
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from xml.etree.ElementTree import iterparse
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Bureau, Salle, Materiel
+from .signals import bulk_created
+
+DEFAULT_BATCH_SIZE = 1000
+
+# En-tête normalisé (voir normalize_header) -> champ
+COLUMN_ALIASES = {
+    'nom': 'nom',
+    'description': 'description',
+    'quantite': 'quantite',
+    'etat': 'etat',
+    'numero_serie': 'numero_serie',
+    'numero_de_serie': 'numero_serie',
+    'date_acquisition': 'date_acquisition',
+    'date_d_acquisition': 'date_acquisition',
+    'prix_unitaire': 'prix_unitaire',
+    'salle': 'salle',
+    'bureau': 'bureau',
+    'localisation': 'localisation',
+}
+
+LOCATION_RE = re.compile(r'^\s*(salle|bureau)\s*:\s*(.+?)\s*$', re.IGNORECASE)
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+EXCEL_EPOCH = date(1899, 12, 30)
+
+
+def get_batch_size():
+    return getattr(settings, 'PATRIMOINE_IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+@dataclass
+class RowError:
+    line: int
+    column: str
+    message: str
+
+
+@dataclass
+class ImportReport:
+    total: int = 0
+    created: int = 0
+    dry_run: bool = False
+    errors: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def invalid_lines(self):
+        return sorted({error.line for error in self.errors})
+
+    def add(self, line, column, message):
+        self.errors.append(RowError(line, column, message))
+
+
+class ImportFileError(ValueError):
+    """Fichier illisible ou colonnes manquantes"""
+
+
+# ---------------------------------------------------------------- Lecture
+
+def normalize_header(header):
+    """'Numéro de série' -> 'numero_de_serie'"""
+    text = unicodedata.normalize('NFKD', str(header or '')).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')
+
+
+def read_csv(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(text, dialect)
+    except UnicodeDecodeError as exc:
+        raise ImportFileError("Le fichier CSV doit être encodé en UTF-8.") from exc
+    finally:
+        # Ne pas fermer le fichier de l'appelant avec l'enveloppe texte
+        text.detach()
+
+
+def _column_index(reference):
+    """'C12' -> 2"""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def read_xlsx(file):
+    """Lignes de la première feuille, valeurs en texte"""
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile as exc:
+        raise ImportFileError("Fichier XLSX illisible.") from exc
+
+    names = archive.namelist()
+    shared = []
+    if 'xl/sharedStrings.xml' in names:
+        with archive.open('xl/sharedStrings.xml') as stream:
+            for _event, element in iterparse(stream):
+                if _local(element.tag) == 'si':
+                    shared.append(''.join(
+                        node.text or '' for node in element.iter() if _local(node.tag) == 't'
+                    ))
+                    element.clear()
+
+    sheets = sorted(name for name in names if re.match(r'xl/worksheets/sheet\d+\.xml$', name))
+    if not sheets:
+        raise ImportFileError("Le classeur ne contient aucune feuille.")
+
+    with archive.open(sheets[0]) as stream:
+        for _event, element in iterparse(stream):
+            if _local(element.tag) != 'row':
+                continue
+            row = []
+            for cell in element:
+                if _local(cell.tag) != 'c':
+                    continue
+                position = _column_index(cell.get('r', '')) if cell.get('r') else len(row)
+                cell_type = cell.get('t')
+                if cell_type == 'inlineStr':
+                    value = ''.join(node.text or '' for node in cell.iter() if _local(node.tag) == 't')
+                else:
+                    value = next((node.text or '' for node in cell if _local(node.tag) == 'v'), '')
+                    if cell_type == 's' and value:
+                        value = shared[int(value)]
+                row.extend([''] * (position - len(row)))
+                row.append(value)
+            element.clear()
+            yield row
+
+
+READERS = {
+    'csv': read_csv,
+    'xlsx': read_xlsx,
+}
+
+
+def detect_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in READERS:
+        raise ImportFileError("Format non pris en charge (CSV ou XLSX attendu).")
+    return extension
+
+
+def read_columns(file, fmt):
+    """
+    Lit le fichier et retourne (numéros de ligne, {champ: [valeurs]}) ;
+    les lignes vides sont ignorées, les colonnes inconnues aussi
+    """
+    rows = READERS[fmt](file)
+    headers = next(rows, None)
+    if not headers:
+        raise ImportFileError("Le fichier est vide.")
+
+    positions = {}
+    for position, header in enumerate(headers):
+        name = COLUMN_ALIASES.get(normalize_header(header))
+        if name and name not in positions:
+            positions[name] = position
+    if not {'salle', 'bureau', 'localisation'} & set(positions):
+        raise ImportFileError("Colonne « salle », « bureau » ou « localisation » manquante.")
+
+    lines = []
+    columns = {name: [] for name in positions}
+    for line, row in enumerate(rows, start=2):
+        if not any(str(value).strip() for value in row):
+            continue
+        lines.append(line)
+        for name, position in positions.items():
+            value = row[position] if position < len(row) else ''
+            columns[name].append(str(value).strip())
+    return lines, columns
+
+
+# ---------------------------------------------------------------- Validation
+
+def _parse_int(value):
+    number = Decimal(value)
+    if number != number.to_integral_value():
+        raise ValueError
+    return int(number)
+
+
+def _parse_decimal(value):
+    number = Decimal(value.replace(' ', '').replace(',', '.'))
+    if not number.is_finite():
+        raise ValueError
+    return number
+
+
+def _parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    # Date Excel : nombre de jours depuis le 30/12/1899
+    return EXCEL_EPOCH + timedelta(days=_parse_int(value))
+
+
+def _convert(report, lines, values, column, parser, message, default=None):
+    """Convertit une colonne entière ; les valeurs vides prennent ``default``"""
+    result = []
+    for line, value in zip(lines, values):
+        if value == '':
+            result.append(default)
+            continue
+        try:
+            result.append(parser(value))
+        except (KeyError, ValueError, ArithmeticError):
+            report.add(line, column, message)
+            result.append(None)
+    return result
+
+
+def _check(report, lines, values, column, predicate, message):
+    for line, value in zip(lines, values):
+        if value is not None and not predicate(value):
+            report.add(line, column, message)
+
+
+def _name_lookup(model):
+    """{nom en minuscules: id}, None pour les noms portés par plusieurs objets"""
+    lookup = {}
+    for name, pk in model.objects.order_by().values_list('nom', 'id'):
+        key = name.strip().casefold()
+        lookup[key] = None if key in lookup else pk
+    return lookup
+
+
+def _resolve(report, lines, names, column, lookup, label):
+    ids = []
+    for line, name in zip(lines, names):
+        if not name:
+            ids.append(None)
+            continue
+        pk = lookup.get(name.casefold(), 0)
+        if pk == 0:
+            report.add(line, column, f"{label} « {name} » introuvable.")
+        elif pk is None:
+            report.add(line, column, f"Plusieurs objets portent le nom « {name} ».")
+        ids.append(pk or None)
+    return ids
+
+
+def validate_columns(report, lines, columns):
+    """
+    Valide toutes les lignes colonne par colonne ; retourne les valeurs
+    converties {champ: [valeurs]} (les erreurs sont ajoutées au rapport)
+    """
+    count = len(lines)
+    empty = [''] * count
+    data = {}
+
+    data['nom'] = columns.get('nom', empty)
+    data['description'] = columns.get('description', empty)
+    data['numero_serie'] = columns.get('numero_serie', empty)
+    for name in ('nom', 'numero_serie'):
+        max_length = Materiel._meta.get_field(name).max_length
+        _check(report, lines, data[name], name, lambda value: len(value) <= max_length,
+               f"{max_length} caractères au maximum.")
+
+    # Mêmes bornes que MaterielForm.clean_quantite / clean_prix_unitaire
+    data['quantite'] = _convert(report, lines, columns.get('quantite', empty), 'quantite',
+                                _parse_int, "Quantité invalide.", default=1)
+    _check(report, lines, data['quantite'], 'quantite', lambda value: value >= 0,
+           "La quantité ne peut pas être négative.")
+    _check(report, lines, data['quantite'], 'quantite', lambda value: value <= 10000,
+           "La quantité semble trop élevée (maximum 10000).")
+
+    data['prix_unitaire'] = _convert(report, lines, columns.get('prix_unitaire', empty),
+                                     'prix_unitaire', _parse_decimal, "Prix unitaire invalide.")
+    _check(report, lines, data['prix_unitaire'], 'prix_unitaire', lambda value: value >= 0,
+           "Le prix unitaire ne peut pas être négatif.")
+    _check(report, lines, data['prix_unitaire'], 'prix_unitaire',
+           lambda value: value < Decimal('1e8') and value == value.quantize(Decimal('0.01')),
+           "Prix unitaire invalide (2 décimales, moins de 100 000 000).")
+
+    data['date_acquisition'] = _convert(report, lines, columns.get('date_acquisition', empty),
+                                        'date_acquisition', _parse_date, "Date invalide.")
+
+    # État : code ('hs') ou libellé ('Hors service')
+    etats = {}
+    for code, label in Materiel.ETAT_CHOICES:
+        etats[code] = code
+        etats[label.casefold()] = code
+    data['etat'] = _convert(report, lines, columns.get('etat', empty), 'etat',
+                            lambda value: etats[value.casefold()], "État inconnu.", default='bon')
+
+    # Localisation : colonnes salle / bureau, ou « Salle: X » / « Bureau: Y »
+    salles = list(columns.get('salle', empty))
+    bureaux = list(columns.get('bureau', empty))
+    for index, (line, value) in enumerate(zip(lines, columns.get('localisation', empty))):
+        if not value:
+            continue
+        match = LOCATION_RE.match(value)
+        if match is None:
+            report.add(line, 'localisation', "Localisation attendue : « Salle: nom » ou « Bureau: nom ».")
+        elif match.group(1).lower() == 'salle':
+            salles[index] = salles[index] or match.group(2)
+        else:
+            bureaux[index] = bureaux[index] or match.group(2)
+
+    # Règle de MaterielForm.clean : une salle OU un bureau
+    for line, salle, bureau in zip(lines, salles, bureaux):
+        if not salle and not bureau:
+            report.add(line, 'localisation',
+                       "Vous devez associer le matériel soit à une salle, soit à un bureau.")
+        elif salle and bureau:
+            report.add(line, 'localisation',
+                       "Le matériel ne peut pas être associé à la fois à une salle et à un bureau.")
+
+    data['salle_id'] = _resolve(report, lines, salles, 'salle', _name_lookup(Salle), "Salle")
+    data['bureau_id'] = _resolve(report, lines, bureaux, 'bureau', _name_lookup(Bureau), "Bureau")
+    return data
+
+
+# ---------------------------------------------------------------- Écriture
+
+def import_materiels(file, fmt, batch_size=None, dry_run=False, partial=False):
+    """
+    Importe le matériel d'un fichier CSV / XLSX. Par défaut, rien n'est
+    écrit si une ligne est invalide ; ``partial`` importe les lignes valides.
+    ``dry_run`` valide sans écrire.
+    """
+    report = ImportReport(dry_run=dry_run)
+    lines, columns = read_columns(file, fmt)
+    report.total = len(lines)
+    data = validate_columns(report, lines, columns)
+
+    invalid = set(report.invalid_lines)
+    if dry_run or (invalid and not partial):
+        return report
+
+    fields = list(data)
+    instances = [
+        Materiel(**{name: data[name][index] for name in fields})
+        for index, line in enumerate(lines)
+        if line not in invalid
+    ]
+    with transaction.atomic():
+        created = Materiel.objects.bulk_create(instances, batch_size=batch_size or get_batch_size())
+        bulk_created.send(sender=Materiel, instances=created)
+    report.created = len(created)
+    return report
@@ -0,0 +1,372 @@
+"""
+File de tâches de fond en base (modèle Tache), sans courtier externe.
+
+Les opérations longues (exports, imports, reconstruction des
+statistiques, déclinaisons des photos) sont mises en file par
+``enqueue`` : la vue répond tout de suite (202) avec l'adresse de suivi
+``/taches/<id>/`` (statut, progression, rapport), puis
+``manage.py run_workers`` les exécute dans un groupe de processus (un
+par cœur par défaut).
+
+- Prise en charge : chaque processus réserve la prochaine tâche par un
+  UPDATE conditionnel (``statut='attente'``) ; une seule réussit, sans
+  verrou de ligne (SQLite compris).
+- Nouvel essai : une exception remet la tâche en attente, avec un délai
+  doublé à chaque tentative (PATRIMOINE_JOB_RETRY_DELAY), jusqu'à
+  ``max_tentatives`` ; JobError échoue sans nouvel essai.
+- Reprise : une tâche en cours sans nouvelle depuis
+  PATRIMOINE_JOB_STALE_AFTER secondes (processus arrêté) est remise en
+  attente. Pendant l'exécution, un fil (Heartbeat) rafraîchit
+  ``date_maj`` trois fois par délai, même pendant une longue étape sans
+  ``progress`` ; l'issue n'est enregistrée que si la tâche est toujours
+  réservée par ce processus (une exécution reprise ailleurs l'emporte).
+- Résultats : fichiers écrits dans MEDIA_ROOT (``Tache.resultat``,
+  stockage par contenu, voir storage.py), téléchargés sous un nom
+  lisible (``nom_resultat``). Les tâches terminées depuis
+  PATRIMOINE_JOB_KEEP_DAYS jours sont supprimées par run_workers ;
+  clean_media supprime ensuite leurs fichiers.
+"""
+import os
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils import timezone
+
+from .exports import EXPORTS, WRITERS
+from .images import generate_renditions
+from .imports import ImportFileError, detect_format, import_materiels
+from .models import Salle, Tache
+from .stats import rebuild_snapshot, verify_snapshot
+
+DEFAULTS = {
+    'PATRIMOINE_JOB_RETRY_DELAY': 30,
+    'PATRIMOINE_JOB_STALE_AFTER': 900,
+    'PATRIMOINE_JOB_KEEP_DAYS': 30,
+}
+
+# Écart minimal (secondes) entre deux enregistrements de la progression
+PROGRESS_INTERVAL = 0.5
+
+# Erreurs gardées dans le rapport d'un import
+MAX_REPORTED_ERRORS = 500
+
+JOBS = {}
+
+# Champs écrits à l'issue d'une exécution
+RESULT_FIELDS = (
+    'statut', 'progression', 'message', 'erreur', 'rapport', 'resultat', 'nom_resultat',
+    'date_disponible', 'date_fin', 'date_maj',
+)
+
+
+def get_setting(name):
+    return getattr(settings, name, DEFAULTS[name])
+
+
+class JobError(Exception):
+    """Échec définitif d'une tâche : pas de nouvel essai"""
+
+
+def job(name):
+    """Enregistre une fonction ``(context, **parametres)`` comme type de tâche"""
+    def decorator(function):
+        JOBS[name] = function
+        return function
+    return decorator
+
+
+def enqueue(type_tache, parametres=None, fichier=None, max_tentatives=None):
+    """Met une tâche en file et la retourne ; ``fichier`` est copié dans MEDIA_ROOT"""
+    if type_tache not in JOBS:
+        raise ValueError(f"Type de tâche inconnu : {type_tache}")
+    tache = Tache(type_tache=type_tache, parametres=parametres or {})
+    if max_tentatives is not None:
+        tache.max_tentatives = max_tentatives
+    if fichier is not None:
+        tache.fichier.save(os.path.basename(fichier.name), fichier, save=False)
+    tache.save()
+    return tache
+
+
+def status(tache):
+    """État d'une tâche pour l'adresse de suivi (JSON)"""
+    data = {
+        'id': tache.pk,
+        'type': tache.type_tache,
+        'statut': tache.statut,
+        'statut_label': tache.get_statut_display(),
+        'progression': tache.progression,
+        'message': tache.message,
+        'tentatives': tache.tentatives,
+        'rapport': tache.rapport,
+        'erreur': tache.erreur.strip().splitlines()[-1] if tache.erreur else None,
+        'url': reverse('job_status', args=[tache.pk]),
+        'resultat': None,
+    }
+    if tache.statut == 'terminee' and tache.resultat:
+        data['resultat'] = reverse('job_result', args=[tache.pk])
+    return data
+
+
+class JobContext:
+    """Ce qu'une tâche en cours peut faire : donner sa progression, écrire son résultat"""
+
+    def __init__(self, tache):
+        self.tache = tache
+        self._last_write = 0.0
+
+    def progress(self, done, total=None, message=None):
+        """Progression ``done`` / ``total`` (ou pourcentage), enregistrée au plus toutes les 0,5 s"""
+        percent = min(100, done * 100 // total) if total else min(100, int(done))
+        now = time.monotonic()
+        if message is None and (percent == self.tache.progression or now - self._last_write < PROGRESS_INTERVAL):
+            return
+        self._last_write = now
+        self.tache.progression = percent
+        values = {'progression': percent, 'date_maj': timezone.now()}
+        if message is not None:
+            self.tache.message = values['message'] = message[:255]
+        _reserved(self.tache).update(**values)
+
+    def save_result(self, filename, chunks):
+        """Écrit le fichier résultat (itérable d'octets) dans MEDIA_ROOT"""
+        with tempfile.TemporaryFile() as temporary:
+            for chunk in chunks:
+                temporary.write(chunk)
+            temporary.seek(0)
+            self.tache.resultat.save(filename, File(temporary, name=filename), save=False)
+        self.tache.nom_resultat = filename
+
+
+class Heartbeat(threading.Thread):
+    """Rafraîchit ``date_maj`` d'une tâche en cours, dans son propre fil (et sa connexion)"""
+
+    def __init__(self, tache, interval=None):
+        super().__init__(name=f'heartbeat-{tache.pk}', daemon=True)
+        self.tache = tache
+        self.interval = interval or max(1, get_setting('PATRIMOINE_JOB_STALE_AFTER') / 3)
+        self.stopped = threading.Event()
+
+    def beat(self):
+        try:
+            return bool(_reserved(self.tache).update(date_maj=timezone.now()))
+        except DatabaseError:
+            # Base verrouillée par l'écriture de la tâche : battement suivant
+            return False
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                self.beat()
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def _reserved(tache):
+    """La tâche, tant qu'elle est en cours pour le processus qui l'a réservée"""
+    return Tache.objects.filter(pk=tache.pk, statut='cours', processus=tache.processus)
+
+
+def _finish(tache):
+    """Enregistre l'issue si la tâche est toujours réservée ; False sinon (reprise ailleurs)"""
+    return bool(_reserved(tache).update(**{name: getattr(tache, name) for name in RESULT_FIELDS}))
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(processus=None):
+    """Réserve et retourne la prochaine tâche disponible, ou None"""
+    now = timezone.now()
+    candidates = (
+        Tache.objects.filter(statut='attente', date_disponible__lte=now)
+        .order_by('date_disponible', 'id').values_list('id', flat=True)[:10]
+    )
+    for pk in list(candidates):
+        claimed = Tache.objects.filter(pk=pk, statut='attente').update(
+            statut='cours',
+            processus=processus or worker_name(),
+            tentatives=F('tentatives') + 1,
+            date_debut=now,
+            date_maj=now,
+            message='',
+        )
+        if claimed:
+            return Tache.objects.get(pk=pk)
+    return None
+
+
+def run(tache):
+    """Exécute une tâche réservée et enregistre son issue"""
+    function = JOBS.get(tache.type_tache)
+    context = JobContext(tache)
+    heartbeat = Heartbeat(tache)
+    heartbeat.start()
+    try:
+        try:
+            if function is None:
+                raise JobError(f"Type de tâche inconnu : {tache.type_tache}")
+            function(context, **tache.parametres)
+        finally:
+            heartbeat.stop()
+    except Exception as exc:
+        _failed(tache, exc)
+    else:
+        tache.statut = 'terminee'
+        tache.progression = 100
+        tache.erreur = ''
+        tache.date_fin = tache.date_maj = timezone.now()
+        _finish(tache)
+    return tache
+
+
+def _failed(tache, exc):
+    now = timezone.now()
+    tache.erreur = ''.join(traceback.format_exception(exc))
+    tache.date_maj = now
+    if isinstance(exc, JobError) or tache.tentatives >= tache.max_tentatives:
+        tache.statut = 'echec'
+        tache.message = str(exc)[:255]
+        tache.date_fin = now
+    else:
+        delay = get_setting('PATRIMOINE_JOB_RETRY_DELAY') * 2 ** (tache.tentatives - 1)
+        tache.statut = 'attente'
+        tache.message = f"Nouvel essai dans {delay} s : {exc}"[:255]
+        tache.date_disponible = now + timedelta(seconds=delay)
+    _finish(tache)
+
+
+def requeue_stale(stale_after=None):
+    """Remet en attente (ou en échec) les tâches en cours sans nouvelle ; retourne leur nombre"""
+    stale_after = get_setting('PATRIMOINE_JOB_STALE_AFTER') if stale_after is None else stale_after
+    now = timezone.now()
+    stale = Tache.objects.filter(statut='cours', date_maj__lt=now - timedelta(seconds=stale_after))
+    message = "Processus arrêté pendant la tâche"
+    failed = stale.filter(tentatives__gte=F('max_tentatives')).update(
+        statut='echec', message=message, date_fin=now, date_maj=now,
+    )
+    requeued = stale.update(statut='attente', message=f"{message} : reprise", date_disponible=now, date_maj=now)
+    return failed + requeued
+
+
+def purge(days=None):
+    """Supprime les tâches terminées ou en échec depuis ``days`` jours"""
+    days = get_setting('PATRIMOINE_JOB_KEEP_DAYS') if days is None else days
+    limit = timezone.now() - timedelta(days=days)
+    deleted, _by_model = Tache.objects.filter(statut__in=('terminee', 'echec'), date_fin__lt=limit).delete()
+    return deleted
+
+
+def work(processus=None, stop=None, burst=False, poll=1.0, max_tasks=None):
+    """
+    Boucle d'un processus : réserve et exécute les tâches jusqu'à ``stop``
+    (threading / multiprocessing Event), ou jusqu'à épuisement de la file
+    si ``burst``. Retourne le nombre de tâches exécutées
+    """
+    processus = processus or worker_name()
+    done = 0
+    while not (stop and stop.is_set()):
+        tache = claim(processus)
+        if tache is None:
+            if burst:
+                break
+            requeue_stale()
+            connection.close()
+            if stop:
+                stop.wait(poll)
+            else:
+                time.sleep(poll)
+            continue
+        run(tache)
+        done += 1
+        if max_tasks and done >= max_tasks:
+            break
+    return done
+
+
+# ---------------------------------------------------------------- Tâches
+
+def _counted(rows, context, total):
+    for number, row in enumerate(rows, 1):
+        if number % 1000 == 0:
+            context.progress(number, total)
+        yield row
+
+
+@job('export')
+def export_job(context, kind, fmt, query=''):
+    """Export CSV / XLSX (mêmes critères que la vue export, ``query`` : request.GET)"""
+    if kind not in EXPORTS or fmt not in WRITERS:
+        raise JobError(f"Export inconnu : {kind}.{fmt}")
+    export = EXPORTS[kind]
+    params = QueryDict(query)
+    total = export.queryset(params).count()
+    context.progress(0, total, f"{total} ligne(s) à exporter")
+    chunks = WRITERS[fmt](export, _counted(export.rows(params), context, total))
+    context.save_result(f'{kind}-{timezone.localdate():%Y%m%d}.{fmt}', chunks)
+
+
+@job('import_materiels')
+def import_job(context, nom, simulation=False, partiel=False):
+    """Import du fichier d'entrée de la tâche (voir imports.py)"""
+    context.progress(0, message=f"Lecture de {nom}")
+    try:
+        with context.tache.fichier.open('rb') as file:
+            report = import_materiels(file, detect_format(nom), dry_run=simulation, partial=partiel)
+    except ImportFileError as exc:
+        raise JobError(str(exc)) from exc
+    context.tache.rapport = {
+        'total': report.total,
+        'created': report.created,
+        'dry_run': report.dry_run,
+        'invalid_lines': len(report.invalid_lines),
+        'errors': [
+            [error.line, error.column, error.message]
+            for error in report.errors[:MAX_REPORTED_ERRORS]
+        ],
+    }
+
+
+@job('rebuild_stats')
+def rebuild_stats_job(context):
+    """Reconstruction puis vérification de l'instantané PatrimoineStats"""
+    rebuild_snapshot()
+    context.progress(50, message="Instantané reconstruit, vérification")
+    context.tache.rapport = {'ecarts': len(verify_snapshot())}
+
+
+@job('picture_renditions')
+def picture_renditions_job(context, salle_ids=None, force=False):
+    """Déclinaisons WebP / JPEG des photos de salle (toutes, ou ``salle_ids``)"""
+    salles = Salle.objects.exclude(picture='').only('id', 'picture', 'picture_renditions')
+    if salle_ids is not None:
+        salles = salles.filter(pk__in=salle_ids)
+    total = salles.count()
+    done = skipped = unreadable = 0
+    for number, salle in enumerate(salles.iterator(chunk_size=200), 1):
+        context.progress(number, total)
+        if salle.picture_renditions and not force:
+            skipped += 1
+            continue
+        renditions = generate_renditions(salle.picture)
+        if not renditions:
+            unreadable += 1
+            continue
+        Salle.objects.filter(pk=salle.pk).update(picture_renditions=renditions)
+        done += 1
+    context.tache.rapport = {'traitees': done, 'a_jour': skipped, 'illisibles': unreadable}
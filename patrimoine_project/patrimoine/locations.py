@@ -0,0 +1,106 @@
+"""
+Choix de la localisation du matériel (salle ou bureau) sans liste déroulante.
+
+Une liste ``<select>`` charge et affiche toutes les salles et tous les
+bureaux à chaque affichage du formulaire. Le widget LocationAutocomplete
+n'affiche que le libellé de la valeur courante, lu dans une table
+id -> libellé mise en cache (invalidée par les signaux quand une salle ou
+un bureau est créé, renommé ou supprimé, portée ``locations:<modèle>``) ;
+les suggestions sont chargées au fil de la saisie depuis
+/locations/<salles|bureaux>.json?q=, qui interroge l'index de recherche.
+"""
+from django import forms
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.html import format_html
+
+from . import cache as page_cache
+from .models import Bureau, Salle
+from .search import search_queryset
+
+MAX_RESULTS = 20
+
+LOCATIONS = {
+    'salles': Salle,
+    'bureaux': Bureau,
+}
+
+TYPE_FIELDS = {
+    Salle: 'type_salle',
+    Bureau: 'type_bureau',
+}
+
+
+def _kind(model):
+    return next(kind for kind, location_model in LOCATIONS.items() if location_model is model)
+
+
+def location_label(model, nom, type_value):
+    # Même libellé que Salle.__str__ / Bureau.__str__
+    return nom if nom else f"{model._meta.verbose_name} {type_value}"
+
+
+def _build_labels(model):
+    rows = model.objects.order_by().values_list('id', 'nom', TYPE_FIELDS[model])
+    return {pk: location_label(model, nom, type_value) for pk, nom, type_value in rows.iterator()}
+
+
+def location_labels(model):
+    """Table {id: libellé} de toutes les salles ou de tous les bureaux (en cache)"""
+    timeout = page_cache.get_timeout()
+    if not timeout:
+        return _build_labels(model)
+    scope = f'locations:{model._meta.model_name}'
+    version, = page_cache.get_versions(scope)
+    key = f'{page_cache.KEY_PREFIX}:{scope}:{version}'
+    labels = cache.get(key)
+    if labels is None:
+        labels = _build_labels(model)
+        cache.set(key, labels, timeout)
+    return labels
+
+
+def search_locations(model, query, limit=MAX_RESULTS):
+    """[{'id', 'label'}] : meilleures correspondances, ou premières par nom sans recherche"""
+    queryset, ordering = search_queryset(model.objects.all(), query)
+    ids = list(queryset.order_by(*ordering).values_list('id', flat=True)[:limit])
+    labels = location_labels(model)
+    return [{'id': pk, 'label': labels[pk]} for pk in ids if pk in labels]
+
+
+class LocationAutocomplete(forms.Widget):
+    """
+    Champ caché (id) et zone de saisie avec suggestions ; le libellé de la
+    valeur courante vient de location_labels (aucune requête si en cache)
+    """
+
+    class Media:
+        js = ('js/location_autocomplete.js',)
+
+    def __init__(self, model, attrs=None):
+        super().__init__(attrs)
+        self.model = model
+
+    def format_value(self, value):
+        return '' if value in (None, '') else str(value)
+
+    def render(self, name, value, attrs=None, renderer=None):
+        value = self.format_value(value)
+        label = ''
+        if value.isdigit():
+            label = location_labels(self.model).get(int(value), '')
+        attrs = self.build_attrs(self.attrs, attrs)
+        return format_html(
+            '<div class="location-autocomplete" data-url="{}">'
+            '<input type="hidden" name="{}" value="{}">'
+            '<input type="text" id="{}" class="{}" value="{}" placeholder="{}" autocomplete="off">'
+            '<div class="list-group location-results"></div>'
+            '</div>',
+            reverse('location_search', args=[_kind(self.model)]),
+            name,
+            value,
+            attrs.get('id', ''),
+            attrs.get('class', 'form-control'),
+            label,
+            attrs.get('placeholder', ''),
+        )
@@ -0,0 +1,81 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from patrimoine.benchmark import measure_throughput, route_urls, use_async_views
+
+# Pages servies par async_views.py sous ASGI
+DEFAULT_ROUTES = [
+    'dashboard', 'materiel_list', 'salle_list', 'bureau_list',
+    'materiel_detail', 'salle_detail', 'bureau_detail',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Débit des pages en lecture avec plusieurs clients simultanés : "
+        "WSGI (vues synchrones, un fil par client) contre ASGI (vues "
+        "asynchrones, une boucle d'événements), dans le processus, sur la "
+        "base courante"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-c', '--clients', type=int, nargs='+', default=[1, 8, 32],
+            help="Nombres de clients simultanés à mesurer (défaut : 1 8 32)",
+        )
+        parser.add_argument('-n', '--requests', type=int, default=50, help="Requêtes par client")
+        parser.add_argument('--route', action='append', default=[], help="Route à mesurer (répétable)")
+        parser.add_argument('-o', '--output', help="Fichier JSON des résultats")
+        parser.add_argument(
+            '--with-cache', action='store_true',
+            help="Garde le cache des pages (par défaut désactivé pour mesurer le rendu)",
+        )
+
+    def handle(self, *args, **options):
+        routes = route_urls(options['route'] or DEFAULT_ROUTES)
+        urls = [url for _name, url in routes if url is not None]
+        if not urls:
+            raise CommandError("Aucune route à mesurer : la base est-elle vide (generate_inventory) ?")
+        self.stdout.write(f"Base : {connection.vendor} {connection.settings_dict['NAME']}")
+        self.stdout.write(f"Routes : {', '.join(name for name, url in routes if url is not None)}")
+        connection.close()
+
+        overrides = {'DEBUG': False, 'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if not options['with_cache']:
+            overrides['PATRIMOINE_CACHE_TIMEOUT'] = 0
+
+        results = {'wsgi': {}, 'asgi': {}}
+        with override_settings(**overrides):
+            for mode, asgi in (('wsgi', False), ('asgi', True)):
+                with use_async_views(asgi):
+                    # Chauffe : gabarits compilés, connexions ouvertes
+                    measure_throughput(urls, 1, len(urls), asgi=asgi)
+                    for clients in options['clients']:
+                        results[mode][clients] = measure_throughput(
+                            urls, clients, options['requests'], asgi=asgi
+                        )
+        connection.close()
+
+        self.stdout.write(
+            f"{'mode':<6} {'clients':>8} {'requêtes':>9} {'req/s':>9} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'erreurs':>8}"
+        )
+        for mode, by_clients in results.items():
+            for clients, data in by_clients.items():
+                self.stdout.write(
+                    f"{mode:<6} {clients:>8} {data['requests']:>9} {data['per_second']:>9.1f} "
+                    f"{data['p50_ms']:>9.2f} {data['p95_ms']:>9.2f} {data['errors']:>8}"
+                )
+        for clients in options['clients']:
+            wsgi, asgi = results['wsgi'][clients]['per_second'], results['asgi'][clients]['per_second']
+            if wsgi:
+                self.stdout.write(f"{clients} client(s) : ASGI / WSGI = {asgi / wsgi:.2f}")
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Résultats écrits dans {options['output']}.")
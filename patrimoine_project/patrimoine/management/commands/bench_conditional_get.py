@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from patrimoine.models import Bureau, Salle, Materiel
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare, pour chaque page, une requête complète (200) et une requête "
+        "conditionnelle (304) : octets transférés et temps CPU par requête"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--repeat', type=int, default=50, help="Requêtes par mesure")
+        parser.add_argument(
+            '--with-cache',
+            action='store_true',
+            help="Garde le cache des pages (par défaut désactivé pour mesurer le rendu)",
+        )
+
+    def routes(self):
+        routes = [
+            reverse('dashboard'),
+            reverse('home'),
+            reverse('bureau_list'),
+            reverse('salle_list'),
+            reverse('materiel_list'),
+        ]
+        for model, name in ((Bureau, 'bureau_detail'), (Salle, 'salle_detail'), (Materiel, 'materiel_detail')):
+            pk = model.objects.order_by('pk').values_list('pk', flat=True).first()
+            if pk is not None:
+                routes.append(reverse(name, args=[pk]))
+        return routes
+
+    def measure(self, client, url, repeat, **headers):
+        start = time.process_time()
+        size = 0
+        for _ in range(repeat):
+            response = client.get(url, headers=headers)
+            size += len(response.content)
+        cpu = (time.process_time() - start) / repeat
+        return response, size // repeat, cpu * 1000
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        timeout = None if options['with_cache'] else 0
+        client = Client(SERVER_NAME='localhost')
+
+        overrides = {} if timeout is None else {'PATRIMOINE_CACHE_TIMEOUT': timeout}
+        with override_settings(**overrides):
+            self.stdout.write(
+                f"{'page':<28} {'200 octets':>11} {'200 ms CPU':>11} "
+                f"{'304 octets':>11} {'304 ms CPU':>11} {'gain CPU':>9}"
+            )
+            for url in self.routes():
+                full, full_size, full_cpu = self.measure(client, url, repeat)
+                if full.status_code != 200:
+                    self.stderr.write(f"{url}: statut {full.status_code}, ignorée")
+                    continue
+                headers = {}
+                if full.has_header('ETag'):
+                    headers['If-None-Match'] = full['ETag']
+                if full.has_header('Last-Modified'):
+                    headers['If-Modified-Since'] = full['Last-Modified']
+                cached, cached_size, cached_cpu = self.measure(client, url, repeat, **headers)
+                if cached.status_code != 304:
+                    self.stderr.write(f"{url}: pas de 304 (statut {cached.status_code})")
+                gain = 100 * (1 - cached_cpu / full_cpu) if full_cpu else 0
+                self.stdout.write(
+                    f"{url:<28} {full_size:>11} {full_cpu:>11.2f} "
+                    f"{cached_size:>11} {cached_cpu:>11.2f} {gain:>8.0f}%"
+                )
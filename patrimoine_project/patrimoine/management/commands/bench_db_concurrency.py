@@ -0,0 +1,127 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from patrimoine.models import Materiel, Suppression
+
+BENCH_NAME = '__bench_db_concurrency__'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Écritures et lectures concurrentes sur la base configurée "
+        "(PATRIMOINE_DB_ENGINE) : débit, latences et erreurs « database is "
+        "locked ». Les écritures sont annulées (la base n'est pas modifiée), "
+        "sauf avec --commit"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('-w', '--workers', type=int, default=8, help="Fils d'exécution")
+        parser.add_argument('-n', '--operations', type=int, default=200, help="Opérations par fil")
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.5,
+            help="Part des opérations qui écrivent (0 à 1)",
+        )
+        parser.add_argument(
+            '--commit', action='store_true',
+            help="Valide les écritures (mesure aussi la synchronisation disque), "
+                 "puis supprime les matériels créés",
+        )
+
+    def write(self, commit):
+        # Création d'un matériel avec ses signaux (statistiques, index de
+        # recherche) ; même annulée, la transaction prend le verrou d'écriture
+        try:
+            with transaction.atomic():
+                Materiel.objects.create(nom=BENCH_NAME, etat='bon', quantite=1)
+                if not commit:
+                    raise Rollback
+        except Rollback:
+            pass
+
+    def read(self):
+        list(Materiel.objects.order_by('nom', 'id').values('id', 'nom', 'etat')[:50])
+
+    def worker(self, index, operations, write_ratio, commit, results):
+        latencies = {'write': [], 'read': []}
+        errors = 0
+        every = round(1 / write_ratio) if write_ratio else 0
+        try:
+            for number in range(operations):
+                kind = 'write' if every and (number + index) % every == 0 else 'read'
+                start = time.perf_counter()
+                try:
+                    self.write(commit) if kind == 'write' else self.read()
+                except OperationalError:
+                    errors += 1
+                    continue
+                latencies[kind].append(time.perf_counter() - start)
+        finally:
+            connection.close()
+        results[index] = (latencies, errors)
+
+    def summary(self, name, values):
+        if not values:
+            return f"{name:<8} {0:>8}"
+        values = sorted(values)
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        return (
+            f"{name:<8} {len(values):>8} {statistics.median(values) * 1000:>10.2f} "
+            f"{p95 * 1000:>10.2f} {values[-1] * 1000:>10.2f}"
+        )
+
+    def handle(self, *args, **options):
+        workers, operations = options['workers'], options['operations']
+        write_ratio = max(0.0, min(options['write_ratio'], 1.0))
+        settings_dict = connection.settings_dict
+        self.stdout.write(f"Base : {connection.vendor} {settings_dict['NAME']}")
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout'):
+                    value = cursor.execute(f'PRAGMA {pragma}').fetchone()[0]
+                    self.stdout.write(f"  {pragma} = {value}")
+        else:
+            self.stdout.write(f"  CONN_MAX_AGE = {settings_dict['CONN_MAX_AGE']}")
+        connection.close()
+
+        results = [None] * workers
+        threads = [
+            threading.Thread(
+                target=self.worker,
+                args=(index, operations, write_ratio, options['commit'], results),
+            )
+            for index in range(workers)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if options['commit']:
+            ids = list(Materiel.objects.filter(nom=BENCH_NAME).values_list('id', flat=True))
+            Materiel.objects.filter(id__in=ids).delete()
+            Suppression.objects.filter(modele='materiel', objet_id__in=ids).delete()
+
+        latencies = {'write': [], 'read': []}
+        errors = 0
+        for worker_latencies, worker_errors in results:
+            for kind, values in worker_latencies.items():
+                latencies[kind] += values
+            errors += worker_errors
+        done = sum(len(values) for values in latencies.values())
+
+        self.stdout.write(f"{'':<8} {'nombre':>8} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+        self.stdout.write(self.summary('écriture', latencies['write']))
+        self.stdout.write(self.summary('lecture', latencies['read']))
+        self.stdout.write(
+            f"{done} opérations en {elapsed:.2f} s ({done / elapsed:.0f}/s), "
+            f"{errors} erreur(s) de verrouillage"
+        )
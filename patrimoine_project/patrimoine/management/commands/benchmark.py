@@ -0,0 +1,117 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from patrimoine.benchmark import SCALES, compare, generate_inventory, measure_routes, scale_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure chaque route nommée (latence p50 / p95, requêtes SQL, taille) "
+        "sur la base courante ou sur des bases SQLite générées par échelle ; "
+        "écrit les résultats en JSON et signale les régressions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', action='append', choices=sorted(SCALES), default=[],
+            help="Échelle à mesurer (répétable) : base SQLite générée une fois "
+                 "dans --data-dir puis réutilisée. Sans --scale : base courante",
+        )
+        parser.add_argument('--data-dir', default='benchmarks', help="Bases générées par échelle")
+        parser.add_argument('-n', '--repeat', type=int, default=20, help="Requêtes par route")
+        parser.add_argument('--route', action='append', default=[], help="Route à mesurer (répétable)")
+        parser.add_argument(
+            '--query', default='',
+            help="Paramètres ajoutés à chaque URL, ex : page_size=500 (grandes pages des listes)",
+        )
+        parser.add_argument('-o', '--output', help="Fichier JSON des résultats")
+        parser.add_argument('--baseline', help="Résultats précédents (JSON) à comparer")
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help="Hausse relative tolérée avant de signaler une régression",
+        )
+        parser.add_argument(
+            '--with-cache', action='store_true',
+            help="Garde le cache des pages (par défaut désactivé pour mesurer le rendu)",
+        )
+
+    def use_scale(self, scale, data_dir):
+        """Bascule la connexion sur la base de l'échelle, générée si besoin"""
+        if connection.vendor != 'sqlite':
+            raise CommandError("--scale n'est disponible qu'avec SQLite (PATRIMOINE_DB_ENGINE=sqlite).")
+        path = Path(data_dir) / f'bench-{scale}.sqlite3'
+        exists = path.exists()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        connection.close()
+        connection.settings_dict['NAME'] = str(path)
+        call_command('migrate', verbosity=0, interactive=False)
+        if not exists:
+            self.stdout.write(f"Génération de l'échelle {scale} dans {path}...")
+            generate_inventory(*scale_counts(SCALES[scale]))
+
+    def handle(self, *args, **options):
+        scales = options['scale'] or [None]
+        # Sans DEBUG : pas de journal des requêtes SQL ni de pages d'erreur détaillées
+        overrides = {'DEBUG': False, 'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'localhost']}
+        if not options['with_cache']:
+            overrides['PATRIMOINE_CACHE_TIMEOUT'] = 0
+        original_name = connection.settings_dict['NAME']
+
+        results = {}
+        try:
+            with override_settings(**overrides):
+                for scale in scales:
+                    if scale is not None:
+                        self.use_scale(scale, options['data_dir'])
+                    label = scale or 'courante'
+                    results[label] = measure_routes(
+                        options['repeat'], options['route'] or None, query=options['query'],
+                    )
+                    self.report(label, results[label])
+        finally:
+            connection.close()
+            connection.settings_dict['NAME'] = original_name
+
+        if options['output']:
+            data = {
+                'meta': {
+                    'date': timezone.now().isoformat(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'database': connection.vendor,
+                    'repeat': options['repeat'],
+                    'cache': options['with_cache'],
+                },
+                'results': results,
+            }
+            Path(options['output']).write_text(json.dumps(data, indent=2))
+            self.stdout.write(f"Résultats écrits dans {options['output']}.")
+
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text())['results']
+            regressions = compare(results, baseline, options['threshold'])
+            for scale, route, metric, before, after in regressions:
+                self.stderr.write(f"Régression {scale} {route} {metric} : {before} -> {after}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} régression(s) par rapport à {options['baseline']}.")
+            self.stdout.write(self.style.SUCCESS("Aucune régression."))
+
+    def report(self, label, routes):
+        self.stdout.write(f"\nÉchelle : {label}")
+        self.stdout.write(
+            f"{'route':<22} {'statut':>6} {'p50 ms':>9} {'p95 ms':>9} {'requêtes':>9} {'octets':>10}"
+        )
+        for route, data in routes.items():
+            self.stdout.write(
+                f"{route:<22} {data['status']:>6} {data['p50_ms']:>9.2f} {data['p95_ms']:>9.2f} "
+                f"{data['queries']:>9} {data['bytes']:>10}"
+            )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from patrimoine.images import generate_renditions
+from patrimoine.jobs import enqueue
+from patrimoine.models import Salle
+
+
+class Command(BaseCommand):
+    help = "Génère les déclinaisons WebP / JPEG des photos de salle existantes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Régénère aussi les photos qui ont déjà leurs déclinaisons",
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help="Met le traitement en file pour run_workers et rend la main",
+        )
+
+    def handle(self, *args, **options):
+        if options['background']:
+            tache = enqueue('picture_renditions', {'force': options['force']})
+            self.stdout.write(f"Tâche {tache.pk} en file (exécutée par run_workers).")
+            return
+
+        salles = Salle.objects.exclude(picture='').only('id', 'picture', 'picture_renditions')
+        done = skipped = 0
+        for salle in salles.iterator(chunk_size=200):
+            if salle.picture_renditions and not options['force']:
+                skipped += 1
+                continue
+            renditions = generate_renditions(salle.picture)
+            if not renditions:
+                self.stderr.write(f"Salle {salle.pk} : photo illisible ({salle.picture.name})")
+                continue
+            Salle.objects.filter(pk=salle.pk).update(picture_renditions=renditions)
+            done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"{done} photo(s) traitée(s), {skipped} déjà à jour."
+        ))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from patrimoine.storage import (
+    find_orphans, media_references, media_storage, rehash_files, remove_empty_directories,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Liste (ou supprime avec --delete) les fichiers de MEDIA_ROOT "
+        "auxquels aucun objet ne fait plus référence"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help="Supprime les fichiers orphelins (par défaut : liste seulement)",
+        )
+        parser.add_argument(
+            '--rehash',
+            action='store_true',
+            help="Renomme d'abord d'après leur contenu les fichiers encore référencés sous un ancien nom",
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help="Ignore les fichiers modifiés depuis moins de N secondes (envois en cours, défaut : 3600)",
+        )
+
+    def handle(self, *args, **options):
+        storage = media_storage()
+        if options['rehash']:
+            if options['delete']:
+                updated = rehash_files()
+                self.stdout.write(f"{updated} référence(s) renommée(s) d'après leur contenu.")
+            else:
+                self.stdout.write("--rehash sans --delete : aucun fichier renommé.")
+
+        references = media_references()
+        orphans = find_orphans(storage, references, min_age=options['min_age'])
+        size = sum(orphan_size for _name, orphan_size in orphans)
+        for name, _size in orphans:
+            self.stdout.write(name)
+            if options['delete']:
+                storage.delete(name)
+        if options['delete']:
+            remove_empty_directories(storage)
+
+        shared = sum(1 for count in references.values() if count > 1)
+        verb = "supprimé(s)" if options['delete'] else "à supprimer"
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(orphans)} fichier(s) orphelin(s) {verb} ({size / 1024:.1f} Kio) ; "
+            f"{len(references)} fichier(s) référencé(s), dont {shared} partagé(s)."
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from patrimoine.exports import EXPORTS, WRITERS, stream_export
+
+
+class Command(BaseCommand):
+    help = "Exporte l'inventaire (matériels, salles ou bureaux) en CSV ou XLSX, en flux"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS), help="Objets à exporter")
+        parser.add_argument('--format', dest='fmt', choices=sorted(WRITERS), default='csv')
+        parser.add_argument(
+            '-o', '--output',
+            help="Fichier de sortie (sortie standard par défaut, CSV uniquement)",
+        )
+        parser.add_argument('--chunk-size', type=int, help="Lignes lues par requête")
+
+    def handle(self, *args, **options):
+        if options['fmt'] == 'xlsx' and not options['output']:
+            raise CommandError("L'export XLSX nécessite --output.")
+
+        chunks = stream_export(options['kind'], options['fmt'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stdout.write(self.style.SUCCESS(f"Export écrit dans {options['output']}."))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
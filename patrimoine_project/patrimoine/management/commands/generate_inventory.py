@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from patrimoine.benchmark import SCALES, generate_inventory, scale_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Ajoute un inventaire généré (répartition réaliste des types, états et "
+        "localisations) à la base configurée, pour les mesures de performance"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(SCALES),
+            help="Taille prédéfinie (nombre de matériels ; salles et bureaux en proportion)",
+        )
+        parser.add_argument('--bureaux', type=int, help="Nombre de bureaux")
+        parser.add_argument('--salles', type=int, help="Nombre de salles")
+        parser.add_argument('--materiels', type=int, help="Nombre de matériels")
+        parser.add_argument('--seed', type=int, default=0, help="Graine du générateur")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Lignes par INSERT")
+
+    def handle(self, *args, **options):
+        materiels = options['materiels']
+        if materiels is None:
+            if not options['scale']:
+                raise CommandError("Indiquez --scale ou --materiels.")
+            materiels = SCALES[options['scale']]
+        bureaux, salles, materiels = scale_counts(materiels)
+        bureaux = options['bureaux'] if options['bureaux'] is not None else bureaux
+        salles = options['salles'] if options['salles'] is not None else salles
+
+        def progress(done):
+            self.stdout.write(f"\r{done}/{materiels} matériels", ending='')
+            self.stdout.flush()
+
+        generate_inventory(bureaux, salles, materiels, seed=options['seed'],
+                           batch_size=options['batch_size'], progress=progress)
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"{bureaux} bureaux, {salles} salles et {materiels} matériels ajoutés."
+        ))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from patrimoine.imports import ImportFileError, detect_format, import_materiels
+
+
+class Command(BaseCommand):
+    help = "Importe du matériel en masse depuis un fichier CSV ou XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier .csv ou .xlsx")
+        parser.add_argument('--batch-size', type=int, help="Lignes par INSERT (bulk_create)")
+        parser.add_argument(
+            '--partial',
+            action='store_true',
+            help="Importe les lignes valides même si d'autres sont en erreur",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Valide le fichier sans rien enregistrer",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_materiels(
+                    file,
+                    detect_format(options['path']),
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                    partial=options['partial'],
+                )
+        except (OSError, ImportFileError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report.errors:
+            self.stderr.write(f"Ligne {error.line} [{error.column}] : {error.message}")
+
+        summary = (
+            f"{report.total} ligne(s) lue(s), {len(report.invalid_lines)} en erreur, "
+            f"{report.created} matériel(s) importé(s)."
+        )
+        if report.errors and not report.created:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from patrimoine.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des bureaux, salles et matériels"
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"{count} objet(s) indexé(s)."))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from patrimoine.jobs import enqueue
+from patrimoine.stats import rebuild_snapshot, verify_snapshot
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'instantané des statistiques du patrimoine puis le vérifie"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Vérifie l'instantané existant sans le reconstruire",
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help="Met la reconstruction en file pour run_workers et rend la main",
+        )
+
+    def handle(self, *args, **options):
+        if options['background']:
+            tache = enqueue('rebuild_stats')
+            self.stdout.write(f"Tâche {tache.pk} en file (exécutée par run_workers).")
+            return
+
+        if not options['check']:
+            rebuild_snapshot()
+            self.stdout.write("Instantané reconstruit.")
+
+        mismatches = verify_snapshot()
+        if mismatches:
+            for key, expected, stored in mismatches:
+                self.stderr.write(f"{key}: attendu {expected}, enregistré {stored}")
+            raise CommandError(f"{len(mismatches)} écart(s) dans l'instantané.")
+
+        self.stdout.write(self.style.SUCCESS("Instantané vérifié : aucun écart."))
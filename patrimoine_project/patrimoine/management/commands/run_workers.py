@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def worker_process(options, stop):
+    """Point d'entrée d'un processus du groupe (importable : méthode spawn comprise)"""
+    import django
+
+    django.setup()
+    from patrimoine import jobs
+
+    # Arrêt piloté par le processus principal (stop), pas par Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        jobs.work(stop=stop, burst=options['burst'], poll=options['poll'], max_tasks=options['max_tasks'])
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Exécute les tâches de fond (exports, imports, statistiques, photos) "
+        "dans un groupe de processus, un par cœur par défaut, jusqu'à Ctrl+C "
+        "ou SIGTERM (la tâche en cours se termine)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-p', '--processes', type=int, default=os.cpu_count() or 1,
+            help="Nombre de processus (défaut : nombre de cœurs)",
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help="S'arrête quand la file est vide (traitement ponctuel, tests)",
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help="Attente (secondes) entre deux lectures d'une file vide",
+        )
+        parser.add_argument(
+            '--max-tasks', type=int, default=None,
+            help="Remplace un processus après N tâches (mémoire rendue au système)",
+        )
+
+    def handle(self, *args, **options):
+        from patrimoine import jobs
+
+        recovered = jobs.requeue_stale()
+        purged = jobs.purge()
+        if recovered or purged:
+            self.stdout.write(f"{recovered} tâche(s) reprise(s), {purged} ancienne(s) tâche(s) supprimée(s).")
+
+        processes = max(1, options['processes'])
+        if processes == 1:
+            done = jobs.work(burst=options['burst'], poll=options['poll'], max_tasks=options['max_tasks'])
+            self.stdout.write(self.style.SUCCESS(f"{done} tâche(s) exécutée(s)."))
+            return
+
+        # Chaque processus ouvre ses propres connexions
+        connections.close_all()
+        context = multiprocessing.get_context()
+        stop = context.Event()
+
+        def shutdown(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        def start():
+            process = context.Process(target=worker_process, args=(options, stop), daemon=True)
+            process.start()
+            return process
+
+        pool = [start() for _ in range(processes)]
+        self.stdout.write(f"{processes} processus démarrés (pid {', '.join(str(p.pid) for p in pool)}).")
+        while pool:
+            for process in list(pool):
+                process.join(timeout=0.5)
+                if process.is_alive():
+                    continue
+                pool.remove(process)
+                if process.exitcode:
+                    self.stderr.write(f"Processus {process.pid} arrêté (code {process.exitcode}).")
+                # Remplacé, sauf à l'arrêt ou file vide en mode --burst
+                if not stop.is_set() and not (options['burst'] and process.exitcode == 0):
+                    pool.append(start())
+        self.stdout.write(self.style.SUCCESS("Processus arrêtés."))
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-17 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patrimoine', '0003_salle_picture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatrimoineStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bureau_total', models.IntegerField(default=0, verbose_name='Nombre de bureaux')),
+                ('bureau_surface', models.FloatField(default=0, verbose_name='Surface totale des bureaux')),
+                ('bureau_capacite', models.IntegerField(default=0, verbose_name='Capacité totale des bureaux')),
+                ('salle_total', models.IntegerField(default=0, verbose_name='Nombre de salles')),
+                ('salle_disponibles', models.IntegerField(default=0, verbose_name='Salles disponibles')),
+                ('salle_surface', models.FloatField(default=0, verbose_name='Surface totale des salles')),
+                ('salle_capacite', models.IntegerField(default=0, verbose_name='Capacité totale des salles')),
+                ('salle_taux_somme', models.FloatField(default=0, verbose_name="Somme des taux d'occupation")),
+                ('salle_taux_nombre', models.IntegerField(default=0, verbose_name="Salles avec taux d'occupation")),
+                ('materiel_total', models.IntegerField(default=0, verbose_name='Nombre de matériels')),
+                ('materiel_valeur', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Valeur totale du matériel')),
+                ('materiel_bon', models.IntegerField(default=0, verbose_name='Matériels en bon état')),
+                ('materiel_moyen', models.IntegerField(default=0, verbose_name='Matériels en état moyen')),
+                ('materiel_mauvais', models.IntegerField(default=0, verbose_name='Matériels en mauvais état')),
+                ('materiel_hs', models.IntegerField(default=0, verbose_name='Matériels hors service')),
+                ('materiel_autre', models.IntegerField(default=0, verbose_name='Matériels autre état')),
+                ('par_type', models.JSONField(blank=True, default=dict, help_text="Totaux par type de bureau / salle, ex: {'salle:reunion:surface': 120.0}", verbose_name='Totaux par type')),
+                ('date_modification', models.DateTimeField(auto_now=True, verbose_name='Date de modification')),
+            ],
+            options={
+                'verbose_name': 'Statistiques du patrimoine',
+                'verbose_name_plural': 'Statistiques du patrimoine',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-17 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patrimoine', '0004_patrimoinestats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bureau',
+            index=models.Index(fields=['nom', 'id'], name='patrimoine__nom_d31adc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materiel',
+            index=models.Index(fields=['nom', 'id'], name='patrimoine__nom_d598e9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materiel',
+            index=models.Index(fields=['etat', 'nom', 'id'], name='patrimoine__etat_269268_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salle',
+            index=models.Index(fields=['nom', 'id'], name='patrimoine__nom_845ee4_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:05
+
+from itertools import islice
+
+from django.db import migrations
+
+# Copie figée de l'index de search.py au moment de cette migration :
+# les évolutions du module ne doivent pas changer une migration passée
+MODELS = ('Bureau', 'Salle', 'Materiel')
+COLUMNS = ('nom', 'niveau', 'contenu', 'type_label')
+BATCH_SIZE = 2000
+
+
+def search_table(model):
+    return f'patrimoine_search_{model._meta.model_name}'
+
+
+def document(instance):
+    model_name = instance._meta.model_name
+    if model_name == 'bureau':
+        return (instance.nom, instance.niveau, '',
+                f'{instance.type_bureau} {instance.get_type_bureau_display()}')
+    if model_name == 'salle':
+        return (instance.nom, instance.niveau, instance.equipements,
+                f'{instance.type_salle} {instance.get_type_salle_display()}')
+    return (instance.nom, '', f'{instance.description} {instance.numero_serie}',
+            f'{instance.etat} {instance.get_etat_display()}')
+
+
+def create_sqlite(cursor, table):
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {table} '
+        f'USING fts5({", ".join(COLUMNS)}, '
+        f'tokenize="unicode61 remove_diacritics 2", prefix=\'2 3\')'
+    )
+    cursor.execute(f'DELETE FROM {table}')
+    return f'INSERT INTO {table} (rowid, {", ".join(COLUMNS)}) VALUES (%s, %s, %s, %s, %s)'
+
+
+def create_postgresql(cursor, table):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {table} '
+        f'(object_id bigint PRIMARY KEY, document tsvector NOT NULL)'
+    )
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_gin ON {table} USING GIN (document)')
+    cursor.execute(f'TRUNCATE {table}')
+    vector = ' || '.join(
+        f"setweight(to_tsvector('simple', %s), '{label}')"
+        for label in ('A', 'B', 'C', 'D')
+    )
+    return f'INSERT INTO {table} (object_id, document) VALUES (%s, {vector})'
+
+
+CREATE = {
+    'sqlite': create_sqlite,
+    'postgresql': create_postgresql,
+}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    create = CREATE.get(connection.vendor)
+    if create is None:
+        return
+    with connection.cursor() as cursor:
+        for name in MODELS:
+            model = apps.get_model('patrimoine', name)
+            insert = create(cursor, search_table(model))
+            instances = model.objects.order_by().iterator(chunk_size=BATCH_SIZE)
+            while batch := list(islice(instances, BATCH_SIZE)):
+                cursor.executemany(insert, [(instance.pk, *document(instance)) for instance in batch])
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in CREATE:
+        return
+    with connection.cursor() as cursor:
+        for name in MODELS:
+            cursor.execute(f'DROP TABLE IF EXISTS {search_table(apps.get_model("patrimoine", name))}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patrimoine', '0005_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patrimoine', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bureau',
+            index=models.Index(fields=['type_bureau', 'niveau'], name='patrimoine__type_bu_49c78d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bureau',
+            index=models.Index(fields=['niveau'], name='patrimoine__niveau_907db6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materiel',
+            index=models.Index(fields=['etat', 'salle'], name='patrimoine__etat_fba658_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materiel',
+            index=models.Index(fields=['etat', 'bureau'], name='patrimoine__etat_15b5f0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materiel',
+            index=models.Index(condition=models.Q(('salle__isnull', False)), fields=['nom', 'id'], name='materiel_en_salle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materiel',
+            index=models.Index(condition=models.Q(('bureau__isnull', False)), fields=['nom', 'id'], name='materiel_en_bureau_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salle',
+            index=models.Index(fields=['type_salle', 'disponible', 'capacite'], name='patrimoine__type_sa_6fef86_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salle',
+            index=models.Index(fields=['disponible', 'capacite'], name='patrimoine__disponi_7e02f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salle',
+            index=models.Index(fields=['capacite'], name='patrimoine__capacit_a8d51b_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patrimoine', '0007_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bureau',
+            index=models.Index(fields=['date_modification', 'id'], name='patrimoine__date_mo_51a7f2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materiel',
+            index=models.Index(fields=['date_modification', 'id'], name='patrimoine__date_mo_d6ac5b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salle',
+            index=models.Index(fields=['date_modification', 'id'], name='patrimoine__date_mo_832e68_idx'),
+        ),
+    ]
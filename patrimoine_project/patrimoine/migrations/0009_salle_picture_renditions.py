@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patrimoine', '0008_date_modification_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salle',
+            name='picture_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='déclinaisons de la photo'),
+        ),
+    ]
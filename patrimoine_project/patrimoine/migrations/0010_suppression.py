@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patrimoine', '0009_salle_picture_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suppression',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modele', models.CharField(choices=[('bureau', 'Bureau'), ('salle', 'Salle'), ('materiel', 'Matériel')], max_length=20, verbose_name='Modèle')),
+                ('objet_id', models.BigIntegerField(verbose_name="Identifiant de l'objet")),
+                ('date_suppression', models.DateTimeField(auto_now_add=True, verbose_name='Date de suppression')),
+            ],
+            options={
+                'verbose_name': 'Suppression',
+                'verbose_name_plural': 'Suppressions',
+                'indexes': [models.Index(fields=['date_suppression', 'id'], name='patrimoine__date_su_2457f1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:30
+
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Copie figée des clés de history.py au moment de cette migration
+FIELDS = {
+    'etat': 'e',
+    'quantite': 'q',
+    'prix_unitaire': 'p',
+    'salle_id': 's',
+    'bureau_id': 'b',
+}
+BATCH_SIZE = 1000
+
+
+def month_key(date):
+    date = date.astimezone(dt_timezone.utc)
+    return date.year * 100 + date.month
+
+
+def encode(values):
+    return {
+        FIELDS[name]: str(value) if isinstance(value, Decimal) else value
+        for name, value in values.items() if name in FIELDS
+    }
+
+
+def record_existing(apps, schema_editor):
+    """Point de départ du journal : une création par matériel existant"""
+    Materiel = apps.get_model('patrimoine', 'Materiel')
+    HistoriqueMateriel = apps.get_model('patrimoine', 'HistoriqueMateriel')
+    date = timezone.now()
+    rows = Materiel.objects.order_by('id').values('id', *FIELDS).iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for values in rows:
+        prix = values['prix_unitaire']
+        batch.append(HistoriqueMateriel(
+            materiel_id=values['id'],
+            date=date,
+            mois=month_key(date),
+            action='c',
+            changements=encode(values),
+            delta_valeur=prix * values['quantite'] if prix else 0,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            HistoriqueMateriel.objects.bulk_create(batch)
+            batch = []
+    HistoriqueMateriel.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patrimoine', '0010_suppression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoriqueMois',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.PositiveIntegerField(unique=True, verbose_name='Mois (AAAAMM)')),
+                ('valeur_ouverture', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Valeur en début de mois')),
+            ],
+            options={
+                'verbose_name': "Ouverture mensuelle de l'historique",
+                'verbose_name_plural': "Ouvertures mensuelles de l'historique",
+            },
+        ),
+        migrations.CreateModel(
+            name='HistoriqueMateriel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('materiel_id', models.BigIntegerField(verbose_name='Identifiant du matériel')),
+                ('date', models.DateTimeField(verbose_name='Date')),
+                ('mois', models.PositiveIntegerField(verbose_name='Mois (AAAAMM)')),
+                ('action', models.CharField(choices=[('c', 'Création'), ('m', 'Modification'), ('s', 'Suppression')], max_length=1, verbose_name='Action')),
+                ('changements', models.JSONField(blank=True, default=dict, verbose_name='Champs modifiés')),
+                ('delta_valeur', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Variation de la valeur')),
+            ],
+            options={
+                'verbose_name': 'Historique du matériel',
+                'verbose_name_plural': 'Historique du matériel',
+                'indexes': [models.Index(fields=['materiel_id', 'date', 'id'], name='patrimoine__materie_a5bdd6_idx'), models.Index(fields=['mois', 'date'], name='patrimoine__mois_02a800_idx')],
+            },
+        ),
+        migrations.RunPython(record_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:33
+
+import patrimoine.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patrimoine', '0011_historique_materiel'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='salle',
+            name='picture',
+            field=models.ImageField(blank=True, storage=patrimoine.storage.media_storage, upload_to='salles', verbose_name='photo de la salle'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:46
+
+import django.core.validators
+import django.utils.timezone
+import patrimoine.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patrimoine', '0012_salle_picture_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_tache', models.CharField(max_length=50, verbose_name='Type de tâche')),
+                ('parametres', models.JSONField(blank=True, default=dict, verbose_name='Paramètres')),
+                ('fichier', models.FileField(blank=True, storage=patrimoine.storage.media_storage, upload_to='taches/entrees', verbose_name="Fichier d'entrée")),
+                ('statut', models.CharField(choices=[('attente', 'En attente'), ('cours', 'En cours'), ('terminee', 'Terminée'), ('echec', 'Échec')], default='attente', max_length=10, verbose_name='Statut')),
+                ('progression', models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MaxValueValidator(100)], verbose_name='Progression (%)')),
+                ('message', models.CharField(blank=True, max_length=255, verbose_name='Message')),
+                ('tentatives', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('max_tentatives', models.PositiveSmallIntegerField(default=3, verbose_name='Tentatives maximum')),
+                ('erreur', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('resultat', models.FileField(blank=True, storage=patrimoine.storage.media_storage, upload_to='taches/resultats', verbose_name='Fichier résultat')),
+                ('nom_resultat', models.CharField(blank=True, max_length=255, verbose_name='Nom du fichier résultat')),
+                ('rapport', models.JSONField(blank=True, default=dict, verbose_name='Rapport')),
+                ('processus', models.CharField(blank=True, max_length=100, verbose_name='Processus')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('date_disponible', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Disponible à partir de')),
+                ('date_debut', models.DateTimeField(blank=True, null=True, verbose_name='Début')),
+                ('date_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('date_maj', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Dernière nouvelle')),
+            ],
+            options={
+                'verbose_name': 'Tâche de fond',
+                'verbose_name_plural': 'Tâches de fond',
+                'indexes': [models.Index(fields=['statut', 'date_disponible', 'id'], name='patrimoine__statut_75287a_idx')],
+            },
+        ),
+    ]
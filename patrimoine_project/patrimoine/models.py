@@ -1,5 +1,8 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+
+from .storage import media_storage
 
 
 # Create your models here.
@@ -63,6 +66,15 @@ class Bureau(models.Model):
         verbose_name = "Bureau"
         verbose_name_plural = "Bureaux"
         ordering = ['nom']
+        indexes = [
+            # Pagination par curseur (nom, id)
+            models.Index(fields=['nom', 'id']),
+            # Filtres de BureauSearchForm (voir filters.py)
+            models.Index(fields=['type_bureau', 'niveau']),
+            models.Index(fields=['niveau']),
+            # Derniers objets modifiés (page d'accueil)
+            models.Index(fields=['date_modification', 'id']),
+        ]
 
 
 class Salle(models.Model):
@@ -130,9 +142,18 @@ class Salle(models.Model):
     )
     picture = models.ImageField(
         "photo de la salle",
+        upload_to='salles',
+        storage=media_storage,
         blank=True
 
     )
+    # Déclinaisons WebP / JPEG de la photo (voir images.py)
+    picture_renditions = models.JSONField(
+        "déclinaisons de la photo",
+        default=dict,
+        blank=True,
+        editable=False
+    )
 
     def __str__(self):
         return self.nom if self.nom else f"Salle {self.type_salle}"
@@ -147,6 +168,24 @@ class Salle(models.Model):
         verbose_name = "Salle"
         verbose_name_plural = "Salles"
         ordering = ['nom']
+        indexes = [
+            # Pagination par curseur (nom, id)
+            models.Index(fields=['nom', 'id']),
+            # Filtres de SalleSearchForm (voir filters.py)
+            models.Index(fields=['type_salle', 'disponible', 'capacite']),
+            models.Index(fields=['disponible', 'capacite']),
+            models.Index(fields=['capacite']),
+            # Derniers objets modifiés (page d'accueil)
+            models.Index(fields=['date_modification', 'id']),
+        ]
+
+
+class MaterielQuerySet(models.QuerySet):
+    """Requêtes courantes sur le matériel"""
+
+    def with_localisation(self):
+        """Joint la salle et le bureau (utilisés par get_localisation)"""
+        return self.select_related('salle', 'bureau')
 
 
 class Materiel(models.Model):
@@ -234,6 +273,8 @@ class Materiel(models.Model):
         auto_now=True
     )
 
+    objects = MaterielQuerySet.as_manager()
+
     def __str__(self):
         return self.nom if self.nom else f"Matériel #{self.id}"
 
@@ -276,4 +317,220 @@ class Materiel(models.Model):
             models.Index(fields=['salle']),
             models.Index(fields=['bureau']),
             models.Index(fields=['etat']),
-        ]
\ No newline at end of file
+            # Pagination par curseur (nom, id), avec ou sans filtre d'état
+            models.Index(fields=['nom', 'id']),
+            models.Index(fields=['etat', 'nom', 'id']),
+            # Filtres de MaterielSearchForm (voir filters.py)
+            models.Index(fields=['etat', 'salle']),
+            models.Index(fields=['etat', 'bureau']),
+            # Localisation seule : index partiels parcourus dans l'ordre (nom, id)
+            models.Index(fields=['nom', 'id'], condition=models.Q(salle__isnull=False),
+                         name='materiel_en_salle_idx'),
+            models.Index(fields=['nom', 'id'], condition=models.Q(bureau__isnull=False),
+                         name='materiel_en_bureau_idx'),
+            # Derniers objets modifiés (page d'accueil)
+            models.Index(fields=['date_modification', 'id']),
+        ]
+
+class Suppression(models.Model):
+    """
+    Trace d'un objet supprimé (bureau, salle ou matériel), pour la
+    synchronisation incrémentale (voir sync.py) : renseignée par post_delete,
+    y compris pour le matériel supprimé en cascade avec sa salle ou son bureau
+    """
+    MODELE_CHOICES = [
+        ('bureau', 'Bureau'),
+        ('salle', 'Salle'),
+        ('materiel', 'Matériel'),
+    ]
+
+    modele = models.CharField("Modèle", max_length=20, choices=MODELE_CHOICES)
+    objet_id = models.BigIntegerField("Identifiant de l'objet")
+    date_suppression = models.DateTimeField("Date de suppression", auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_modele_display()} {self.objet_id} supprimé le {self.date_suppression}"
+
+    class Meta:
+        verbose_name = "Suppression"
+        verbose_name_plural = "Suppressions"
+        indexes = [
+            # Lecture des suppressions depuis un jeton de synchronisation
+            models.Index(fields=['date_suppression', 'id']),
+        ]
+
+
+class HistoriqueMateriel(models.Model):
+    """
+    Journal des changements du matériel (voir history.py), en ajout seul :
+    une ligne par création, modification ou suppression, avec uniquement
+    les champs modifiés (clés courtes, voir history.FIELDS) et la variation
+    de la valeur de l'inventaire. ``mois`` (AAAAMM) partitionne le journal :
+    la valeur à une date ne lit que les lignes de son mois.
+    """
+    ACTION_CHOICES = [
+        ('c', 'Création'),
+        ('m', 'Modification'),
+        ('s', 'Suppression'),
+    ]
+
+    materiel_id = models.BigIntegerField("Identifiant du matériel")
+    date = models.DateTimeField("Date")
+    mois = models.PositiveIntegerField("Mois (AAAAMM)")
+    action = models.CharField("Action", max_length=1, choices=ACTION_CHOICES)
+    changements = models.JSONField("Champs modifiés", default=dict, blank=True)
+    delta_valeur = models.DecimalField(
+        "Variation de la valeur",
+        max_digits=20,
+        decimal_places=2,
+        default=0
+    )
+
+    def __str__(self):
+        return f"{self.get_action_display()} du matériel {self.materiel_id} le {self.date}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Le journal du matériel est en ajout seul.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Le journal du matériel est en ajout seul.")
+
+    class Meta:
+        verbose_name = "Historique du matériel"
+        verbose_name_plural = "Historique du matériel"
+        indexes = [
+            # État d'un matériel à une date
+            models.Index(fields=['materiel_id', 'date', 'id']),
+            # Valeur de l'inventaire : lignes d'un mois jusqu'à une date
+            models.Index(fields=['mois', 'date']),
+        ]
+
+
+class HistoriqueMois(models.Model):
+    """Valeur de l'inventaire au début de chaque mois clos (voir history.py)"""
+    mois = models.PositiveIntegerField("Mois (AAAAMM)", unique=True)
+    valeur_ouverture = models.DecimalField(
+        "Valeur en début de mois",
+        max_digits=20,
+        decimal_places=2,
+        default=0
+    )
+
+    def __str__(self):
+        return f"Ouverture {self.mois} : {self.valeur_ouverture}"
+
+    class Meta:
+        verbose_name = "Ouverture mensuelle de l'historique"
+        verbose_name_plural = "Ouvertures mensuelles de l'historique"
+
+
+class PatrimoineStats(models.Model):
+    """
+    Instantané des indicateurs du tableau de bord (une seule ligne).
+    Tenu à jour de façon incrémentale par les signaux (voir signals.py)
+    et reconstruit par la commande ``rebuild_stats``.
+    """
+    bureau_total = models.IntegerField("Nombre de bureaux", default=0)
+    bureau_surface = models.FloatField("Surface totale des bureaux", default=0)
+    bureau_capacite = models.IntegerField("Capacité totale des bureaux", default=0)
+
+    salle_total = models.IntegerField("Nombre de salles", default=0)
+    salle_disponibles = models.IntegerField("Salles disponibles", default=0)
+    salle_surface = models.FloatField("Surface totale des salles", default=0)
+    salle_capacite = models.IntegerField("Capacité totale des salles", default=0)
+    # Somme et nombre des taux d'occupation, pour calculer la moyenne
+    salle_taux_somme = models.FloatField("Somme des taux d'occupation", default=0)
+    salle_taux_nombre = models.IntegerField("Salles avec taux d'occupation", default=0)
+
+    materiel_total = models.IntegerField("Nombre de matériels", default=0)
+    materiel_valeur = models.DecimalField(
+        "Valeur totale du matériel",
+        max_digits=20,
+        decimal_places=2,
+        default=0
+    )
+    materiel_bon = models.IntegerField("Matériels en bon état", default=0)
+    materiel_moyen = models.IntegerField("Matériels en état moyen", default=0)
+    materiel_mauvais = models.IntegerField("Matériels en mauvais état", default=0)
+    materiel_hs = models.IntegerField("Matériels hors service", default=0)
+    materiel_autre = models.IntegerField("Matériels autre état", default=0)
+
+    par_type = models.JSONField(
+        "Totaux par type",
+        default=dict,
+        blank=True,
+        help_text="Totaux par type de bureau / salle, ex: {'salle:reunion:surface': 120.0}"
+    )
+    date_modification = models.DateTimeField(
+        "Date de modification",
+        auto_now=True
+    )
+
+    def __str__(self):
+        return f"Statistiques du patrimoine ({self.date_modification})"
+
+    class Meta:
+        verbose_name = "Statistiques du patrimoine"
+        verbose_name_plural = "Statistiques du patrimoine"
+
+
+class Tache(models.Model):
+    """
+    Tâche de fond (export, import, reconstruction des statistiques...)
+    mise en file par jobs.enqueue et exécutée par ``manage.py run_workers``
+    (voir jobs.py)
+    """
+    STATUT_CHOICES = [
+        ('attente', 'En attente'),
+        ('cours', 'En cours'),
+        ('terminee', 'Terminée'),
+        ('echec', 'Échec'),
+    ]
+
+    type_tache = models.CharField("Type de tâche", max_length=50)
+    parametres = models.JSONField("Paramètres", default=dict, blank=True)
+    fichier = models.FileField(
+        "Fichier d'entrée",
+        upload_to='taches/entrees',
+        storage=media_storage,
+        blank=True
+    )
+    statut = models.CharField("Statut", max_length=10, choices=STATUT_CHOICES, default='attente')
+    progression = models.PositiveSmallIntegerField(
+        "Progression (%)",
+        default=0,
+        validators=[MaxValueValidator(100)]
+    )
+    message = models.CharField("Message", max_length=255, blank=True)
+    tentatives = models.PositiveSmallIntegerField("Tentatives", default=0)
+    max_tentatives = models.PositiveSmallIntegerField("Tentatives maximum", default=3)
+    erreur = models.TextField("Dernière erreur", blank=True)
+    resultat = models.FileField(
+        "Fichier résultat",
+        upload_to='taches/resultats',
+        storage=media_storage,
+        blank=True
+    )
+    nom_resultat = models.CharField("Nom du fichier résultat", max_length=255, blank=True)
+    rapport = models.JSONField("Rapport", default=dict, blank=True)
+    processus = models.CharField("Processus", max_length=100, blank=True)
+    date_creation = models.DateTimeField("Date de création", auto_now_add=True)
+    # Pas avant cette date (nouvel essai après un échec)
+    date_disponible = models.DateTimeField("Disponible à partir de", default=timezone.now)
+    date_debut = models.DateTimeField("Début", null=True, blank=True)
+    date_fin = models.DateTimeField("Fin", null=True, blank=True)
+    # Avancée ou prise en charge ; une tâche en cours sans nouvelle est reprise
+    date_maj = models.DateTimeField("Dernière nouvelle", default=timezone.now)
+
+    def __str__(self):
+        return f"Tâche {self.pk} ({self.type_tache}, {self.get_statut_display()})"
+
+    class Meta:
+        verbose_name = "Tâche de fond"
+        verbose_name_plural = "Tâches de fond"
+        indexes = [
+            # Prochaine tâche à prendre
+            models.Index(fields=['statut', 'date_disponible', 'id']),
+        ]
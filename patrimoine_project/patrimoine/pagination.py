@@ -0,0 +1,201 @@
+"""
+Pagination par curseur (keyset) des listes.
+
+Au lieu d'un OFFSET, chaque page est repérée par la clé de tri de sa
+première / dernière ligne : ``WHERE (nom, id) > (:nom, :id) ORDER BY nom, id
+LIMIT n``. Le coût d'une page ne dépend donc pas de sa position, à condition
+qu'un index couvre (nom, id) (voir Meta.indexes des modèles).
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_MAX_PAGE_SIZE = 500
+
+# Clé de tri : l'ordre par défaut des modèles ('nom') et l'id pour départager
+KEYSET_ORDERING = ('nom', 'id')
+
+# Derniers objets modifiés en premier
+RECENT_ORDERING = ('-date_modification', '-id')
+
+
+@dataclass
+class KeysetPage:
+    """Page de résultats avec les curseurs vers les pages voisines"""
+    object_list: list
+    page_size: int
+    has_next: bool = False
+    has_previous: bool = False
+    next_query: str = ''
+    previous_query: str = ''
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def encode_cursor(values):
+    """Encode les valeurs de la clé de tri dans un jeton opaque pour l'URL"""
+    data = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Décode un jeton ; retourne None s'il est invalide"""
+    if not token:
+        return None
+    try:
+        padding = '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(token + padding))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def _ordering_field(queryset, name):
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    return queryset.model._meta.get_field(name)
+
+
+def clean_cursor(queryset, ordering, values):
+    """
+    Valeurs d'un curseur converties selon les champs de la clé de tri ;
+    None si l'une ne convient pas (jeton modifié à la main)
+    """
+    if values is None:
+        return None
+    try:
+        values = [
+            _ordering_field(queryset, name.lstrip('-')).to_python(value)
+            for name, value in zip(ordering, values)
+        ]
+    except (ValidationError, ValueError, TypeError):
+        return None
+    if any(value is None for value in values):
+        return None
+    return values
+
+
+def get_page_size(request):
+    """Taille de page : ?page_size=, bornée par PATRIMOINE_MAX_PAGE_SIZE"""
+    default = getattr(settings, 'PATRIMOINE_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    maximum = getattr(settings, 'PATRIMOINE_MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+def _keyset_filter(ordering, values, forward):
+    """
+    Construit (a > x) OR (a = x AND b > y) ... pour la clé de tri donnée
+    (< pour reculer ; sens inversé pour les champs triés en '-champ')
+    """
+    condition = Q()
+    for position, name in enumerate(ordering):
+        descending = name.startswith('-')
+        lookup = 'gt' if forward != descending else 'lt'
+        term = Q(**{f'{name.lstrip("-")}__{lookup}': values[position]})
+        for previous, previous_name in enumerate(ordering[:position]):
+            term &= Q(**{previous_name.lstrip('-'): values[previous]})
+        condition |= term
+    return condition
+
+
+def _reverse_ordering(ordering):
+    return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+
+def _cursor_values(row, ordering):
+    # Objets modèles ou dictionnaires (querysets values())
+    values = []
+    for name in ordering:
+        key = name.lstrip('-')
+        value = row[key] if isinstance(row, dict) else getattr(row, key)
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return values
+
+
+def _query_string(request, key, token):
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    params[key] = token
+    return params.urlencode()
+
+
+def _page_queryset(request, queryset, ordering, page_size):
+    """Requête de la page demandée (une ligne de plus pour savoir s'il y a une suite)"""
+    after = clean_cursor(queryset, ordering, decode_cursor(request.GET.get('after'), len(ordering)))
+    before = None
+    if after is None:
+        before = clean_cursor(queryset, ordering, decode_cursor(request.GET.get('before'), len(ordering)))
+    if before is not None:
+        queryset = (
+            queryset.filter(_keyset_filter(ordering, before, forward=False))
+            .order_by(*_reverse_ordering(ordering))
+        )
+    else:
+        if after is not None:
+            queryset = queryset.filter(_keyset_filter(ordering, after, forward=True))
+        queryset = queryset.order_by(*ordering)
+    return queryset[:page_size + 1], after, before
+
+
+def _keyset_page(request, rows, ordering, page_size, after, before):
+    if before is not None:
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+    else:
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after is not None
+
+    page = KeysetPage(object_list=rows, page_size=page_size)
+    if rows:
+        first = _cursor_values(rows[0], ordering)
+        last = _cursor_values(rows[-1], ordering)
+        if has_next:
+            page.has_next = True
+            page.next_query = _query_string(request, 'after', encode_cursor(last))
+        if has_previous:
+            page.has_previous = True
+            page.previous_query = _query_string(request, 'before', encode_cursor(first))
+    return page
+
+
+def paginate_keyset(request, queryset, ordering=KEYSET_ORDERING, page_size=None):
+    """
+    Retourne la page demandée par ?after=<jeton> ou ?before=<jeton>
+    (première page sinon) ; un jeton invalide ramène à la première page
+    """
+    ordering = tuple(ordering)
+    page_size = page_size or get_page_size(request)
+    page_queryset, after, before = _page_queryset(request, queryset, ordering, page_size)
+    return _keyset_page(request, list(page_queryset), ordering, page_size, after, before)
+
+
+async def apaginate_keyset(request, queryset, ordering=KEYSET_ORDERING, page_size=None):
+    """paginate_keyset pour les vues asynchrones (ORM asynchrone)"""
+    ordering = tuple(ordering)
+    page_size = page_size or get_page_size(request)
+    page_queryset, after, before = _page_queryset(request, queryset, ordering, page_size)
+    rows = [row async for row in page_queryset]
+    return _keyset_page(request, rows, ordering, page_size, after, before)
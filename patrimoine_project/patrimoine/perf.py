@@ -0,0 +1,274 @@
+"""
+Mesures de performance par requête.
+
+PerformanceMiddleware (en tête de MIDDLEWARE) relève pour chaque requête :
+
+- la durée totale ;
+- le temps de rendu des gabarits (backend TimedDjangoTemplates, voir
+  TEMPLATES dans settings.py) ;
+- le nombre et la durée des requêtes SQL (``connection.execute_wrapper``
+  sur chaque base) ;
+- les requêtes répétées : une même requête SQL exécutée au moins
+  PATRIMOINE_PERF_DUPLICATE_THRESHOLD fois signale un N+1.
+
+Les mesures sont renvoyées dans l'en-tête ``Server-Timing`` (visible dans
+les outils de développement du navigateur), journalisées en JSON (logger
+``patrimoine.perf`` : INFO, WARNING si la requête est lente ou répétitive)
+et, pour une fraction PATRIMOINE_PERF_SAMPLE_RATE des requêtes, conservées
+dans un tampon circulaire en mémoire (par processus), résumé par route sur
+/perf/ pour l'équipe d'administration.
+"""
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.utils import timezone
+
+from .api import json_response
+
+logger = logging.getLogger('patrimoine.perf')
+
+DEFAULTS = {
+    'PATRIMOINE_PERF_ENABLED': True,
+    'PATRIMOINE_PERF_SERVER_TIMING': True,
+    'PATRIMOINE_PERF_SAMPLE_RATE': 1.0,
+    'PATRIMOINE_PERF_BUFFER_SIZE': 2000,
+    'PATRIMOINE_PERF_DUPLICATE_THRESHOLD': 3,
+    'PATRIMOINE_PERF_SLOW_MS': 500,
+}
+
+# Bornes (ms) des histogrammes de /perf/
+HISTOGRAM_BOUNDS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_current = contextvars.ContextVar('patrimoine_perf_metrics', default=None)
+
+_samples = deque(maxlen=DEFAULTS['PATRIMOINE_PERF_BUFFER_SIZE'])
+_samples_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, name, DEFAULTS[name])
+
+
+class RequestMetrics:
+    """Mesures d'une requête, alimentées par le wrapper SQL et les gabarits"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total_ms = 0.0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.statements = Counter()
+
+    @property
+    def queries(self):
+        return sum(self.statements.values())
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - start) * 1000
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        """[(sql, nombre)] des requêtes répétées au-delà du seuil"""
+        threshold = get_setting('PATRIMOINE_PERF_DUPLICATE_THRESHOLD')
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self):
+        return (
+            f'total;dur={self.total_ms:.1f}, '
+            f'db;dur={self.sql_ms:.1f};desc="SQL x{self.queries}", '
+            f'tpl;dur={self.template_ms:.1f};desc="gabarits"'
+        )
+
+
+def record_template(duration):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.template_ms += duration * 1000
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            record_template(time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Backend Django standard qui chronomètre le rendu des gabarits"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else request.path
+
+
+def _sample(request, response, metrics):
+    duplicates = metrics.duplicates()
+    return {
+        'time': timezone.now().isoformat(),
+        'method': request.method,
+        'path': request.path,
+        'route': _route(request),
+        'status': response.status_code,
+        'total_ms': round(metrics.total_ms, 2),
+        'template_ms': round(metrics.template_ms, 2),
+        'sql_ms': round(metrics.sql_ms, 2),
+        'queries': metrics.queries,
+        'duplicates': [{'sql': sql[:300], 'count': count} for sql, count in duplicates],
+    }
+
+
+def record_sample(sample):
+    size = get_setting('PATRIMOINE_PERF_BUFFER_SIZE')
+    global _samples
+    with _samples_lock:
+        if _samples.maxlen != size:
+            _samples = deque(_samples, maxlen=size)
+        _samples.append(sample)
+
+
+def get_samples():
+    with _samples_lock:
+        return list(_samples)
+
+
+def clear_samples():
+    with _samples_lock:
+        _samples.clear()
+
+
+def _wrap_connections(stack, metrics):
+    """Branche ``metrics`` sur les connexions du fil courant"""
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(metrics))
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not get_setting('PATRIMOINE_PERF_ENABLED'):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                _wrap_connections(stack, metrics)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not get_setting('PATRIMOINE_PERF_ENABLED'):
+            return await self.get_response(request)
+
+        # Les connexions sont propres à un fil : celles du fil où
+        # sync_to_async exécute les requêtes SQL de cette requête HTTP
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        stack = ExitStack()
+        try:
+            await sync_to_async(_wrap_connections)(stack, metrics)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        metrics.finish()
+        if get_setting('PATRIMOINE_PERF_SERVER_TIMING'):
+            response['Server-Timing'] = metrics.server_timing()
+
+        sample = _sample(request, response, metrics)
+        slow = metrics.total_ms >= get_setting('PATRIMOINE_PERF_SLOW_MS')
+        logger.log(
+            logging.WARNING if slow or sample['duplicates'] else logging.INFO,
+            json.dumps(sample, ensure_ascii=False),
+        )
+        if random.random() < get_setting('PATRIMOINE_PERF_SAMPLE_RATE'):
+            record_sample(sample)
+        return response
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(samples):
+    """Par route : nombre, p50 / p95 / max, moyennes SQL et histogramme des durées"""
+    by_route = {}
+    for sample in samples:
+        by_route.setdefault(sample['route'], []).append(sample)
+
+    routes = {}
+    for route, route_samples in sorted(by_route.items()):
+        durations = sorted(sample['total_ms'] for sample in route_samples)
+        histogram = Counter()
+        for duration in durations:
+            bound = next((f'<={b}' for b in HISTOGRAM_BOUNDS if duration <= b), f'>{HISTOGRAM_BOUNDS[-1]}')
+            histogram[bound] += 1
+        labels = [f'<={b}' for b in HISTOGRAM_BOUNDS] + [f'>{HISTOGRAM_BOUNDS[-1]}']
+        count = len(route_samples)
+        routes[route] = {
+            'count': count,
+            'p50_ms': _percentile(durations, 0.5),
+            'p95_ms': _percentile(durations, 0.95),
+            'max_ms': durations[-1],
+            'queries_avg': round(sum(s['queries'] for s in route_samples) / count, 1),
+            'sql_ms_avg': round(sum(s['sql_ms'] for s in route_samples) / count, 2),
+            'template_ms_avg': round(sum(s['template_ms'] for s in route_samples) / count, 2),
+            'with_duplicates': sum(1 for s in route_samples if s['duplicates']),
+            'histogram': {label: histogram[label] for label in labels},
+        }
+    return routes
+
+
+@staff_member_required
+def perf_report(request):
+    """Résumé du tampon par route ; ?samples=1 ajoute les dernières mesures brutes"""
+    samples = get_samples()
+    data = {'samples_count': len(samples), 'routes': summarize(samples)}
+    if request.GET.get('samples'):
+        data['samples'] = samples[-200:]
+    return json_response(data)
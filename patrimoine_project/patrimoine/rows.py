@@ -0,0 +1,171 @@
+"""
+Rendu rapide des lignes des listes (matériel, salles, bureaux).
+
+Rendre une ligne à partir d'un objet modèle coûte trois ``{% url %}``
+(résolution inverse complète), les ``get_*_display`` et les méthodes du
+modèle (get_localisation, get_valeur_totale), soit l'essentiel du temps
+de réponse sur une grande page. Ici :
+
+- les libellés (état, type, localisation) sont calculés par la base
+  (annotations) et les lignes lues en dictionnaires (``values()``, sans
+  instancier de modèles) ; la valeur totale est un simple produit ;
+- les URL d'action sont construites par concaténation à partir d'un
+  gabarit résolu une fois par page (UrlTemplate) ;
+- les lignes sont rendues par un petit gabarit dédié (``*_rows.html``)
+  inséré à la place de ``{{ table_rows }}`` dans la page ; au-delà de
+  ROWS_CHUNK_SIZE lignes, la page est envoyée en flux (en-tête, lignes
+  par paquets, fin). Une page en flux n'est pas mise en cache (voir
+  cache.cached_view) : les pages de taille courante le restent.
+"""
+from dataclasses import dataclass
+
+from django.db.models import Case, CharField, F, Value, When
+from django.db.models.functions import Concat
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from .models import Bureau, Salle, Materiel
+
+ROWS_CHUNK_SIZE = 200
+
+# Remplacé par les lignes dans la page rendue
+ROWS_PLACEHOLDER = '<!--patrimoine:rows-->'
+
+
+class UrlTemplate:
+    """URL d'une route à un argument (pk), résolue une fois : prefix + pk + suffix"""
+
+    SENTINEL = '2147483647'
+
+    def __init__(self, name):
+        self.prefix, self.suffix = reverse(name, args=[self.SENTINEL]).split(self.SENTINEL, 1)
+
+    def format(self, pk):
+        return f'{self.prefix}{pk}{self.suffix}'
+
+
+def choice_label(field_name, choices):
+    """Libellé d'un champ à choix (get_FOO_display) calculé par la base"""
+    return Case(
+        *[When(**{field_name: value}, then=Value(label)) for value, label in choices],
+        default=F(field_name),
+        output_field=CharField(),
+    )
+
+
+def _materiel_annotations():
+    return {
+        'etat_label': choice_label('etat', Materiel.ETAT_CHOICES),
+        # Même texte que Materiel.get_localisation
+        'localisation_label': Case(
+            When(salle__isnull=False, then=Concat(Value('Salle: '), 'salle__nom')),
+            When(bureau__isnull=False, then=Concat(Value('Bureau: '), 'bureau__nom')),
+            default=Value('Non localisé'),
+            output_field=CharField(),
+        ),
+    }
+
+
+def _salle_annotations():
+    return {'type_label': choice_label('type_salle', Salle.TYPE_SALLE_CHOICES)}
+
+
+def _bureau_annotations():
+    return {'type_label': choice_label('type_bureau', Bureau.TYPE_BUREAU_CHOICES)}
+
+
+def _materiel_value(row):
+    # Même calcul que Materiel.get_valeur_totale, sur les colonnes lues (la
+    # base ne garantit pas l'échelle d'un produit de décimaux)
+    prix, quantite = row['prix_unitaire'], row['quantite']
+    row['valeur_totale'] = prix * quantite if prix and quantite else None
+
+
+def _salle_picture(row):
+    # Le gabarit responsive_picture lit salle.picture.url sans déclinaisons
+    name = row['picture']
+    row['picture'] = {'url': Salle.picture.field.storage.url(name)} if name else None
+
+
+@dataclass
+class ListRows:
+    """Colonnes, annotations, routes d'action et gabarit des lignes d'une liste"""
+    fields: tuple
+    annotations: object
+    urls: dict
+    template: str
+    prepare: object = None
+
+    def queryset(self, queryset, ordering):
+        """Lignes en dictionnaires ; la clé de tri est lue pour la pagination"""
+        annotations = self.annotations()
+        keys = [name.lstrip('-') for name in ordering]
+        names = list(dict.fromkeys([*self.fields, *annotations, *keys]))
+        return queryset.annotate(**annotations).values(*names)
+
+    def prepare_rows(self, rows):
+        templates = {key: UrlTemplate(name) for key, name in self.urls.items()}
+        for row in rows:
+            pk = row['id']
+            for key, template in templates.items():
+                row[key] = template.format(pk)
+            if self.prepare:
+                self.prepare(row)
+        return rows
+
+
+LIST_ROWS = {
+    Materiel: ListRows(
+        fields=('id', 'nom', 'quantite', 'prix_unitaire'),
+        annotations=_materiel_annotations,
+        urls={'detail_url': 'materiel_detail', 'update_url': 'materiel_update', 'delete_url': 'materiel_delete'},
+        template='materiels/materiel_rows.html',
+        prepare=_materiel_value,
+    ),
+    Salle: ListRows(
+        fields=('id', 'nom', 'niveau', 'capacite', 'disponible', 'picture', 'picture_renditions'),
+        annotations=_salle_annotations,
+        urls={'detail_url': 'salle_detail', 'update_url': 'salle_update', 'delete_url': 'salle_delete'},
+        template='salles/salle_rows.html',
+        prepare=_salle_picture,
+    ),
+    Bureau: ListRows(
+        fields=('id', 'nom', 'niveau', 'capacite'),
+        annotations=_bureau_annotations,
+        urls={'detail_url': 'bureau_detail', 'update_url': 'bureau_update', 'delete_url': 'bureau_delete'},
+        template='bureaux/bureau_rows.html',
+    ),
+}
+
+
+def render_list(request, template_name, context, model, chunk_size=ROWS_CHUNK_SIZE, asynchronous=False):
+    """
+    Rend la page ``template_name`` avec les lignes de ``context['page']``
+    (dictionnaires de LIST_ROWS[model].queryset) à la place de
+    ``{{ table_rows }}`` ; en flux au-delà de ``chunk_size`` lignes
+    (itérateur asynchrone si ``asynchronous``, pour les vues ASGI)
+    """
+    spec = LIST_ROWS[model]
+    rows = spec.prepare_rows(list(context['page']))
+    rows_template = get_template(spec.template)
+    page = render_to_string(template_name, dict(context, table_rows=mark_safe(ROWS_PLACEHOLDER)), request)
+    head, _placeholder, tail = page.partition(ROWS_PLACEHOLDER)
+
+    if len(rows) <= chunk_size:
+        return HttpResponse(head + rows_template.render({'rows': rows}) + tail)
+
+    def content():
+        yield head
+        for start in range(0, len(rows), chunk_size):
+            yield rows_template.render({'rows': rows[start:start + chunk_size]})
+        yield tail
+
+    async def async_content():
+        for chunk in content():
+            yield chunk
+
+    return StreamingHttpResponse(
+        async_content() if asynchronous else content(), content_type='text/html; charset=utf-8'
+    )
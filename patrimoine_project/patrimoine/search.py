@@ -0,0 +1,277 @@
+"""
+Recherche plein texte pour le paramètre ``search`` des listes.
+
+Un index par modèle est tenu à jour par les signaux (voir signals.py) :
+
+- SQLite : table virtuelle FTS5 ``patrimoine_search_<modèle>`` dont le rowid
+  est l'id de l'objet (classement bm25, accents ignorés) ;
+- PostgreSQL : table ``patrimoine_search_<modèle>`` avec une colonne
+  ``tsvector`` indexée en GIN (classement ts_rank).
+
+Chaque mot de la recherche est traité comme un préfixe (« proj » trouve
+« Projecteur »). Sur les autres bases, on revient à des ``icontains``.
+Les résultats sont annotés par ``search_rank`` (plus petit = plus pertinent)
+et paginés dans cet ordre.
+"""
+import re
+from itertools import groupby, islice
+
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Bureau, Salle, Materiel
+from .pagination import KEYSET_ORDERING
+
+# Ordre des résultats d'une recherche (pagination par curseur)
+SEARCH_ORDERING = ('search_rank', 'id')
+
+# Colonnes indexées et poids respectifs dans le classement
+COLUMNS = ('nom', 'niveau', 'contenu', 'type_label')
+WEIGHTS = (10.0, 2.0, 1.0, 1.0)
+
+# Champs utilisés si aucun index plein texte n'est disponible
+FALLBACK_FIELDS = {
+    Bureau: ('nom', 'type_bureau', 'niveau'),
+    Salle: ('nom', 'niveau', 'type_salle'),
+    Materiel: ('nom', 'etat'),
+}
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Objets indexés par executemany
+INDEX_BATCH_SIZE = 2000
+
+
+def search_table(model):
+    return f'patrimoine_search_{model._meta.model_name}'
+
+
+def document(instance):
+    """Retourne le texte indexé d'un objet, colonne par colonne"""
+    # Comparaison par nom : fonctionne aussi avec les modèles des migrations
+    model_name = instance._meta.model_name
+    if model_name == 'bureau':
+        return {
+            'nom': instance.nom,
+            'niveau': instance.niveau,
+            'contenu': '',
+            'type_label': f'{instance.type_bureau} {instance.get_type_bureau_display()}',
+        }
+    if model_name == 'salle':
+        return {
+            'nom': instance.nom,
+            'niveau': instance.niveau,
+            'contenu': instance.equipements,
+            'type_label': f'{instance.type_salle} {instance.get_type_salle_display()}',
+        }
+    if model_name == 'materiel':
+        return {
+            'nom': instance.nom,
+            'niveau': '',
+            'contenu': f'{instance.description} {instance.numero_serie}',
+            'type_label': f'{instance.etat} {instance.get_etat_display()}',
+        }
+    raise TypeError(f"Modèle non indexé : {type(instance).__name__}")
+
+
+def parse_terms(query):
+    """Découpe la recherche en mots"""
+    return WORD_RE.findall(query or '')
+
+
+class SQLiteFTS5Backend:
+    """Index FTS5 (rowid = id de l'objet)"""
+
+    def create_table(self, cursor, model):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {search_table(model)} '
+            f'USING fts5({", ".join(COLUMNS)}, '
+            f'tokenize="unicode61 remove_diacritics 2", prefix=\'2 3\')'
+        )
+
+    def drop_table(self, cursor, model):
+        cursor.execute(f'DROP TABLE IF EXISTS {search_table(model)}')
+
+    def index(self, cursor, model, pk, doc):
+        self.index_many(cursor, model, [(pk, doc)])
+
+    def index_many(self, cursor, model, docs, replace=True):
+        table = search_table(model)
+        if replace:
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [[pk] for pk, _doc in docs])
+        cursor.executemany(
+            f'INSERT INTO {table} (rowid, {", ".join(COLUMNS)}) VALUES (%s, %s, %s, %s, %s)',
+            [[pk] + [doc[column] for column in COLUMNS] for pk, doc in docs],
+        )
+
+    def remove(self, cursor, model, pk):
+        cursor.execute(f'DELETE FROM {search_table(model)} WHERE rowid = %s', [pk])
+
+    def clear(self, cursor, model):
+        cursor.execute(f'DELETE FROM {search_table(model)}')
+
+    def match_query(self, terms):
+        return ' '.join('"%s"*' % term.replace('"', '') for term in terms)
+
+    def ids_sql(self, model, terms):
+        table = search_table(model)
+        return f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [self.match_query(terms)]
+
+    def rank_sql(self, model, terms):
+        table = search_table(model)
+        weights = ', '.join(str(weight) for weight in WEIGHTS)
+        id_column = f'"{model._meta.db_table}"."id"'
+        sql = (
+            f'SELECT bm25({table}, {weights}) FROM {table} '
+            f'WHERE {table} MATCH %s AND {table}.rowid = {id_column}'
+        )
+        return sql, [self.match_query(terms)]
+
+
+class PostgresBackend:
+    """Index tsvector + GIN (configuration 'simple', sans dictionnaire)"""
+
+    def create_table(self, cursor, model):
+        table = search_table(model)
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} '
+            f'(object_id bigint PRIMARY KEY, document tsvector NOT NULL)'
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_gin ON {table} USING GIN (document)')
+
+    def drop_table(self, cursor, model):
+        cursor.execute(f'DROP TABLE IF EXISTS {search_table(model)}')
+
+    def index(self, cursor, model, pk, doc):
+        self.index_many(cursor, model, [(pk, doc)])
+
+    def index_many(self, cursor, model, docs, replace=True):
+        vector = ' || '.join(
+            f"setweight(to_tsvector('simple', %s), '{label}')"
+            for label in ('A', 'B', 'C', 'D')
+        )
+        conflict = 'ON CONFLICT (object_id) DO UPDATE SET document = EXCLUDED.document' if replace else ''
+        cursor.executemany(
+            f'INSERT INTO {search_table(model)} (object_id, document) VALUES (%s, {vector}) {conflict}',
+            [[pk] + [doc[column] for column in COLUMNS] for pk, doc in docs],
+        )
+
+    def remove(self, cursor, model, pk):
+        cursor.execute(f'DELETE FROM {search_table(model)} WHERE object_id = %s', [pk])
+
+    def clear(self, cursor, model):
+        cursor.execute(f'TRUNCATE {search_table(model)}')
+
+    def match_query(self, terms):
+        return ' & '.join(f"{term.replace(chr(39), '')}:*" for term in terms)
+
+    def ids_sql(self, model, terms):
+        sql = (
+            f"SELECT object_id FROM {search_table(model)} "
+            f"WHERE document @@ to_tsquery('simple', %s)"
+        )
+        return sql, [self.match_query(terms)]
+
+    def rank_sql(self, model, terms):
+        table = search_table(model)
+        id_column = f'"{model._meta.db_table}"."id"'
+        sql = (
+            f"SELECT -ts_rank(document, to_tsquery('simple', %s)) FROM {table} "
+            f"WHERE {table}.object_id = {id_column}"
+        )
+        return sql, [self.match_query(terms)]
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend(conn=None):
+    """Retourne le moteur d'index de la base, ou None (repli icontains)"""
+    backend_class = BACKENDS.get((conn or connection).vendor)
+    return backend_class() if backend_class else None
+
+
+def index_object(instance):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.index(cursor, type(instance), instance.pk, document(instance))
+
+
+def _batches(instances):
+    iterator = iter(instances)
+    while batch := list(islice(iterator, INDEX_BATCH_SIZE)):
+        yield batch
+
+
+def _index_batches(backend, cursor, model, instances, replace=True):
+    count = 0
+    for batch in _batches(instances):
+        backend.index_many(cursor, model, [(instance.pk, document(instance)) for instance in batch], replace)
+        count += len(batch)
+    return count
+
+
+def index_objects(instances):
+    """Indexe une série d'objets (création en masse) : un executemany par lot et par modèle"""
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            for model, group in groupby(instances, key=type):
+                _index_batches(backend, cursor, model, group)
+
+
+def remove_object(instance):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, type(instance), instance.pk)
+
+
+def rebuild_index(models=(Bureau, Salle, Materiel), conn=None):
+    """Reconstruit entièrement l'index ; retourne le nombre d'objets indexés"""
+    conn = conn or connection
+    backend = get_backend(conn)
+    if backend is None:
+        return 0
+    count = 0
+    with conn.cursor() as cursor:
+        for model in models:
+            backend.create_table(cursor, model)
+            backend.clear(cursor, model)
+            instances = model.objects.order_by().iterator(chunk_size=INDEX_BATCH_SIZE)
+            count += _index_batches(backend, cursor, model, instances, replace=False)
+    return count
+
+
+def search_queryset(queryset, query):
+    """
+    Filtre le queryset sur la recherche et l'annote par ``search_rank``.
+    Retourne (queryset, ordre de pagination) ; le queryset est inchangé
+    et l'ordre est celui des listes si la recherche est vide.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return queryset, KEYSET_ORDERING
+
+    model = queryset.model
+    backend = get_backend()
+    if backend is None:
+        condition = Q()
+        for term in terms:
+            term_condition = Q()
+            for name in FALLBACK_FIELDS[model]:
+                term_condition |= Q(**{f'{name}__icontains': term})
+            condition &= term_condition
+        return queryset.filter(condition), KEYSET_ORDERING
+
+    ids_sql, ids_params = backend.ids_sql(model, terms)
+    rank_sql, rank_params = backend.rank_sql(model, terms)
+    queryset = queryset.filter(id__in=RawSQL(ids_sql, ids_params)).annotate(
+        search_rank=RawSQL(rank_sql, rank_params, output_field=FloatField())
+    )
+    return queryset, SEARCH_ORDERING
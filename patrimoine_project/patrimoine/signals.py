@@ -0,0 +1,267 @@
+"""
+Signaux de maintenance des données dérivées des modèles.
+
+- Instantané PatrimoineStats : à chaque enregistrement, la différence entre
+  l'ancienne et la nouvelle contribution de l'objet est appliquée ; à chaque
+  suppression (y compris en cascade), sa contribution est retirée.
+- Index de recherche plein texte (voir search.py).
+- Cache des pages : seules les portées touchées sont invalidées (voir cache.py).
+- Déclinaisons des photos de salle, générées quand la photo change (voir
+  images.py), ou confiées aux tâches de fond si PATRIMOINE_BACKGROUND_RENDITIONS
+  (voir jobs.py).
+- Table Suppression : chaque objet supprimé y laisse une trace pour la
+  synchronisation incrémentale (voir sync.py).
+- Historique du matériel : champs modifiés et variation de valeur, écrits
+  par lots à la validation de la transaction (voir history.py).
+
+bulk_create et QuerySet.update() ne déclenchent pas post_save : les
+écritures en masse émettent un seul signal ``bulk_created`` ou
+``bulk_updated`` pour l'ensemble des objets, qui met à jour les mêmes
+données en une fois. Pour ``bulk_updated``, le résumé (BulkUpdate) est
+cumulé lot par lot avant l'UPDATE : la mémoire ne dépend pas des valeurs
+lues, seulement de ce qui est écrit.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import cache, history, images, locations, search, stats
+from .models import Bureau, Salle, Materiel, Suppression
+
+# Envoyé après un bulk_create : sender=modèle, instances=objets créés (avec pk)
+bulk_created = Signal()
+
+# Envoyé après un QuerySet.update() : sender=modèle, update=BulkUpdate
+# (résumé cumulé sur les valeurs lues avant la modification)
+bulk_updated = Signal()
+
+# Valeurs lues en base avant modification : champs des statistiques,
+# nom (affiché dans les listes du matériel), photo de la salle et
+# localisation du matériel
+TRACKED_FIELDS = {
+    Bureau: stats.STATS_FIELDS[Bureau] + ('nom',),
+    Salle: stats.STATS_FIELDS[Salle] + ('nom', 'picture'),
+    Materiel: stats.STATS_FIELDS[Materiel] + ('salle_id', 'bureau_id'),
+}
+
+
+def current_values(sender, instance):
+    return {name: getattr(instance, name) for name in TRACKED_FIELDS[sender]}
+
+
+def remember_old_values(sender, instance, **kwargs):
+    """Mémorise les valeurs en base avant modification"""
+    instance._old_values = None
+    if instance.pk is not None:
+        instance._old_values = (
+            sender.objects.filter(pk=instance.pk)
+            .values(*TRACKED_FIELDS[sender])
+            .first()
+        )
+
+
+def apply_saved(sender, instance, **kwargs):
+    """Applique la différence ancienne / nouvelle contribution"""
+    new = stats.contribution(sender, current_values(sender, instance))
+    old_values = getattr(instance, '_old_values', None)
+    old = stats.contribution(sender, old_values) if old_values else {}
+    stats.apply_delta(stats.difference(new, old))
+
+
+def apply_deleted(sender, instance, **kwargs):
+    """Retire la contribution de l'objet supprimé"""
+    old = stats.contribution(sender, current_values(sender, instance))
+    stats.apply_delta(stats.difference({}, old))
+
+
+def index_saved(sender, instance, **kwargs):
+    """Met à jour l'objet dans l'index de recherche"""
+    search.index_object(instance)
+
+
+def unindex_deleted(sender, instance, **kwargs):
+    """Retire l'objet de l'index de recherche"""
+    search.remove_object(instance)
+
+
+def cache_scopes(sender, values, old_values=None):
+    """Portées de cache touchées par la modification d'un objet"""
+    model_name = sender._meta.model_name
+    scopes = {'dashboard', 'home', f'list:{model_name}', f"detail:{model_name}:{values['id']}"}
+
+    if sender is Materiel:
+        # Page de la salle / du bureau qui contient (ou contenait) le matériel
+        for data in filter(None, (values, old_values)):
+            if data['salle_id']:
+                scopes.add(f"detail:salle:{data['salle_id']}")
+            if data['bureau_id']:
+                scopes.add(f"detail:bureau:{data['bureau_id']}")
+    else:
+        if old_values is None or old_values['nom'] != values['nom']:
+            # Le nom de la salle / du bureau apparaît dans les listes du matériel
+            scopes.add('list:materiel')
+        type_field = locations.TYPE_FIELDS[sender]
+        if old_values is None or any(old_values[name] != values[name] for name in ('nom', type_field)):
+            # Libellé des choix de localisation (voir locations.py)
+            scopes.add(f'locations:{model_name}')
+    return scopes
+
+
+def invalidate_saved(sender, instance, **kwargs):
+    values = dict(current_values(sender, instance), id=instance.pk)
+    cache.invalidate(*cache_scopes(sender, values, getattr(instance, '_old_values', None)))
+
+
+def invalidate_deleted(sender, instance, **kwargs):
+    values = dict(current_values(sender, instance), id=instance.pk)
+    cache.invalidate(*cache_scopes(sender, values))
+
+
+def record_deleted(sender, instance, **kwargs):
+    """Trace la suppression (le matériel supprimé en cascade passe aussi ici)"""
+    Suppression.objects.create(modele=sender._meta.model_name, objet_id=instance.pk)
+
+
+def history_saved(sender, instance, **kwargs):
+    history.record([history.make_entry(
+        instance.pk, getattr(instance, '_old_values', None), current_values(sender, instance),
+    )])
+
+
+def history_deleted(sender, instance, **kwargs):
+    history.record([history.make_entry(instance.pk, current_values(sender, instance), None)])
+
+
+def apply_bulk_created(sender, instances, **kwargs):
+    """Ajoute la contribution de tous les objets créés en une mise à jour"""
+    delta = {}
+    for instance in instances:
+        for key, value in stats.contribution(sender, current_values(sender, instance)).items():
+            delta[key] = delta.get(key, 0) + value
+    stats.apply_delta(delta)
+
+
+def index_bulk_created(sender, instances, **kwargs):
+    search.index_objects(instances)
+
+
+def invalidate_bulk_created(sender, instances, **kwargs):
+    scopes = set()
+    for instance in instances:
+        values = dict(current_values(sender, instance), id=instance.pk)
+        scopes |= cache_scopes(sender, values)
+    if scopes:
+        cache.invalidate(*scopes)
+
+
+def history_bulk_created(sender, instances, **kwargs):
+    history.record([
+        history.make_entry(instance.pk, None, current_values(sender, instance))
+        for instance in instances
+    ])
+
+
+class BulkUpdate:
+    """
+    Résumé d'un QuerySet.update() : ``add`` reçoit les valeurs suivies
+    (avec 'id') lues avant la modification, par lots, et cumule la
+    différence de l'instantané, les portées de cache et les lignes du
+    journal. ``changes`` : {colonne: nouvelle valeur}
+    """
+
+    def __init__(self, sender, changes):
+        self.sender = sender
+        self.changes = changes
+        self.date = timezone.now()
+        self.ids = []
+        self.delta = {}
+        self.scopes = set()
+        self.entries = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, old_values):
+        for old in old_values:
+            new = {**old, **{name: value for name, value in self.changes.items() if name in old}}
+            self.ids.append(old['id'])
+            row = stats.difference(stats.contribution(self.sender, new), stats.contribution(self.sender, old))
+            for key, value in row.items():
+                self.delta[key] = self.delta.get(key, 0) + value
+            self.scopes |= cache_scopes(self.sender, new, old)
+            if self.sender is Materiel:
+                self.entries.append(history.make_entry(old['id'], old, new, self.date))
+
+
+def apply_bulk_updated(sender, update, **kwargs):
+    """Applique la différence cumulée de toutes les lignes"""
+    stats.apply_delta(update.delta)
+
+
+def index_bulk_updated(sender, update, **kwargs):
+    """Réindexe les objets si un champ indexé (l'état) a changé"""
+    if 'etat' in update.changes:
+        for start in range(0, len(update.ids), search.INDEX_BATCH_SIZE):
+            ids = update.ids[start:start + search.INDEX_BATCH_SIZE]
+            search.index_objects(sender.objects.filter(pk__in=ids).order_by())
+
+
+def invalidate_bulk_updated(sender, update, **kwargs):
+    if update.scopes:
+        cache.invalidate(*update.scopes)
+
+
+def history_bulk_updated(sender, update, **kwargs):
+    history.record(update.entries)
+
+
+def render_picture(sender, instance, **kwargs):
+    """Génère les déclinaisons d'une nouvelle photo (ou les retire)"""
+    old_values = getattr(instance, '_old_values', None)
+    old_name = old_values['picture'] if old_values else ''
+    if instance.picture.name == old_name and (instance.picture_renditions or not old_name):
+        return
+    if instance.picture and getattr(settings, 'PATRIMOINE_BACKGROUND_RENDITIONS', False):
+        # Calculées par run_workers ; la photo d'origine est servie en attendant
+        from . import jobs
+
+        if instance.picture_renditions:
+            instance.picture_renditions = {}
+            sender.objects.filter(pk=instance.pk).update(picture_renditions={})
+        parametres = {'salle_ids': [instance.pk], 'force': True}
+        transaction.on_commit(lambda: jobs.enqueue('picture_renditions', parametres))
+        return
+    renditions = images.generate_renditions(instance.picture) if instance.picture else {}
+    if renditions != instance.picture_renditions:
+        instance.picture_renditions = renditions
+        sender.objects.filter(pk=instance.pk).update(picture_renditions=renditions)
+
+
+def connect_signals():
+    for model in (Bureau, Salle, Materiel):
+        uid = f'patrimoine_stats_{model._meta.model_name}'
+        pre_save.connect(remember_old_values, sender=model, dispatch_uid=uid)
+        post_save.connect(apply_saved, sender=model, dispatch_uid=uid)
+        post_delete.connect(apply_deleted, sender=model, dispatch_uid=uid)
+        search_uid = f'patrimoine_search_{model._meta.model_name}'
+        post_save.connect(index_saved, sender=model, dispatch_uid=search_uid)
+        post_delete.connect(unindex_deleted, sender=model, dispatch_uid=search_uid)
+        cache_uid = f'patrimoine_cache_{model._meta.model_name}'
+        post_save.connect(invalidate_saved, sender=model, dispatch_uid=cache_uid)
+        post_delete.connect(invalidate_deleted, sender=model, dispatch_uid=cache_uid)
+        sync_uid = f'patrimoine_sync_{model._meta.model_name}'
+        post_delete.connect(record_deleted, sender=model, dispatch_uid=sync_uid)
+        bulk_created.connect(apply_bulk_created, sender=model, dispatch_uid=uid)
+        bulk_created.connect(index_bulk_created, sender=model, dispatch_uid=search_uid)
+        bulk_created.connect(invalidate_bulk_created, sender=model, dispatch_uid=cache_uid)
+        bulk_updated.connect(apply_bulk_updated, sender=model, dispatch_uid=uid)
+        bulk_updated.connect(index_bulk_updated, sender=model, dispatch_uid=search_uid)
+        bulk_updated.connect(invalidate_bulk_updated, sender=model, dispatch_uid=cache_uid)
+    history_uid = 'patrimoine_history_materiel'
+    post_save.connect(history_saved, sender=Materiel, dispatch_uid=history_uid)
+    post_delete.connect(history_deleted, sender=Materiel, dispatch_uid=history_uid)
+    bulk_created.connect(history_bulk_created, sender=Materiel, dispatch_uid=history_uid)
+    bulk_updated.connect(history_bulk_updated, sender=Materiel, dispatch_uid=history_uid)
+    post_save.connect(render_picture, sender=Salle, dispatch_uid='patrimoine_images_salle')
@@ -0,0 +1,238 @@
+"""
+Fichiers statiques en production, servis par l'application.
+
+- CompressedManifestStaticFilesStorage (``STORAGES['staticfiles']``) :
+  à collectstatic, chaque fichier est copié sous un nom avec empreinte du
+  contenu (``css/base.3f2a9c1b04de.css``, manifeste staticfiles.json, les
+  ``url()`` des CSS sont réécrites), puis les fichiers texte sont
+  précompressés en gzip et, si le module ``brotli`` est installé, en
+  brotli (``.gz`` / ``.br`` à côté de l'original). Tant que collectstatic
+  n'a pas été lancé (développement, tests), ``{% static %}`` garde les
+  noms d'origine.
+- StaticFilesMiddleware : sert STATIC_ROOT sous STATIC_URL sans serveur
+  web dédié. L'index des fichiers et leurs en-têtes sont construits une
+  fois au démarrage ; la variante compressée est choisie selon
+  Accept-Encoding, les noms avec empreinte sont mis en cache un an
+  (``immutable``), les autres PATRIMOINE_STATIC_MAX_AGE secondes. Relancer
+  le processus après collectstatic. Inactif si DEBUG (runserver sert les
+  fichiers sources).
+"""
+import gzip
+import json
+import mimetypes
+import os
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.json', '.txt', '.xml', '.map')
+
+# En dessous, l'en-tête gzip coûte plus qu'il ne rapporte
+MIN_COMPRESS_SIZE = 256
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+DEFAULT_MAX_AGE = 60
+
+# Encodage HTTP -> extension du fichier précompressé, par ordre de préférence
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _compress(data):
+    """{encodage: données compressées} pour les variantes plus petites que l'original"""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {encoding: compressed for encoding, compressed in variants.items() if len(compressed) < len(data) * 0.95}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Noms avec empreinte (manifeste) et variantes .gz / .br précompressées"""
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # collectstatic pas encore lancé : noms d'origine
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(paths) | set(self.hashed_files.values())):
+            for compressed_name in self.compress(name):
+                yield name, compressed_name, True
+
+    def compress(self, name):
+        """Écrit les variantes compressées d'un fichier ; retourne leurs noms"""
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+            return []
+        with self.open(name) as file:
+            data = file.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return []
+        extensions = dict(ENCODINGS)
+        names = []
+        for encoding, compressed in _compress(data).items():
+            compressed_name = name + extensions[encoding]
+            with open(self.path(compressed_name), 'wb') as file:
+                file.write(compressed)
+            names.append(compressed_name)
+        return names
+
+
+def accepted_encodings(accept_encoding):
+    """
+    Codages d'Accept-Encoding et leur poids : ``gzip;q=0, identity`` ->
+    {'gzip': 0.0, 'identity': 1.0} (q=0 : refusé ; entrées mal formées ignorées)
+    """
+    accepted = {}
+    for value in accept_encoding.split(','):
+        name, *params = [part.strip() for part in value.split(';')]
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, number = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = None
+        if quality is not None:
+            accepted[name.lower()] = quality
+    return accepted
+
+
+class StaticFile:
+    """Un fichier de STATIC_ROOT et ses variantes, en-têtes précalculés"""
+
+    def __init__(self, path, immutable):
+        self.path = path
+        content_type, _encoding = mimetypes.guess_type(path)
+        stat = os.stat(path)
+        self.last_modified = int(stat.st_mtime)
+        max_age = IMMUTABLE_MAX_AGE if immutable else getattr(
+            settings, 'PATRIMOINE_STATIC_MAX_AGE', DEFAULT_MAX_AGE
+        )
+        cache_control = f'public, max-age={max_age}' + (', immutable' if immutable else '')
+        self.variants = []
+        for encoding, extension in ENCODINGS + ((None, ''),):
+            variant_path = path + extension
+            if encoding and not os.path.exists(variant_path):
+                continue
+            size = os.stat(variant_path).st_size
+            headers = {
+                'Content-Type': content_type or 'application/octet-stream',
+                'Content-Length': str(size),
+                'Last-Modified': http_date(self.last_modified),
+                'ETag': f'"{self.last_modified:x}-{size:x}"',
+                'Cache-Control': cache_control,
+            }
+            if encoding:
+                headers['Content-Encoding'] = encoding
+            self.variants.append((encoding, variant_path, headers))
+        if len(self.variants) > 1:
+            for _encoding, _path, headers in self.variants:
+                headers['Vary'] = 'Accept-Encoding'
+
+    def select(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        wildcard = accepted.get('*', 0)
+        for encoding, path, headers in self.variants:
+            if encoding is None or accepted.get(encoding, wildcard) > 0:
+                return path, headers
+
+    def response(self, request):
+        path, headers = self.select(request.headers.get('Accept-Encoding', ''))
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            not_modified = headers['ETag'] in if_none_match or if_none_match.strip() == '*'
+        else:
+            since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            not_modified = since is not None and self.last_modified <= since
+        if not_modified:
+            response = HttpResponseNotModified()
+            for name in ('ETag', 'Last-Modified', 'Cache-Control', 'Vary'):
+                if name in headers:
+                    response[name] = headers[name]
+            return response
+        if request.method == 'HEAD':
+            response = HttpResponse()
+        else:
+            response = FileResponse(open(path, 'rb'))
+            del response['Content-Disposition']
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+
+def _manifest_names(root):
+    """Noms avec empreinte, d'après le manifeste de collectstatic"""
+    try:
+        with open(os.path.join(root, ManifestStaticFilesStorage.manifest_name), encoding='utf-8') as file:
+            return set(json.load(file).get('paths', {}).values())
+    except (OSError, ValueError):
+        return set()
+
+
+def build_index(root):
+    """{nom relatif: StaticFile} de tous les fichiers de ``root``"""
+    if not root or not os.path.isdir(root):
+        return {}
+    hashed = _manifest_names(root)
+    index = {}
+    for directory, _dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if filename.endswith(('.gz', '.br')) and os.path.exists(path[:-3]):
+                continue  # variante : servie à la place de l'original
+            index[name] = StaticFile(path, name in hashed)
+    return index
+
+
+class StaticFilesMiddleware:
+    """Sert STATIC_ROOT (à placer juste après SecurityMiddleware)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix = urlsplit(settings.STATIC_URL).path
+        if not self.prefix.startswith('/'):
+            self.prefix = '/' + self.prefix
+        self.files = build_index(settings.STATIC_ROOT)
+
+    def find(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            return self.files.get(request.path_info[len(self.prefix):])
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.find(request)
+        if static_file is not None:
+            return static_file.response(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = self.find(request)
+        if static_file is not None:
+            return static_file.response(request)
+        return await self.get_response(request)
@@ -0,0 +1,419 @@
+"""
+Calcul des indicateurs (KPI) du tableau de bord.
+
+Chaque table n'est parcourue qu'une seule fois : toutes les valeurs d'un
+modèle sont obtenues par un unique ``aggregate()`` utilisant l'agrégation
+conditionnelle (``Count(..., filter=Q(...))``).
+
+Le tableau de bord lit l'instantané ``PatrimoineStats`` : une seule ligne,
+mise à jour par différence à chaque enregistrement / suppression
+(voir signals.py) et reconstruite par ``manage.py rebuild_stats``.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Avg, Count, DecimalField, F, FloatField, Q, Sum
+from django.db.models.functions import Cast
+
+from .models import Bureau, Salle, Materiel, PatrimoineStats
+
+SNAPSHOT_PK = 1
+
+# Champs lus pour calculer la contribution d'un objet à l'instantané
+STATS_FIELDS = {
+    Bureau: ('type_bureau', 'surface', 'capacite'),
+    Salle: ('type_salle', 'disponible', 'surface', 'capacite'),
+    Materiel: ('etat', 'quantite', 'prix_unitaire'),
+}
+
+# Tolérance de comparaison des sommes flottantes lors de la vérification
+FLOAT_TOLERANCE = 1e-6
+
+
+@dataclass(frozen=True)
+class TypeStats:
+    """Totaux pour un type de bureau ou de salle"""
+    code: str
+    label: str
+    total: int = 0
+    surface: float = 0
+    capacite: int = 0
+
+
+@dataclass(frozen=True)
+class BureauStats:
+    """Indicateurs des bureaux"""
+    total: int = 0
+    surface_totale: float = 0
+    capacite_totale: int = 0
+    par_type: list[TypeStats] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class SalleStats:
+    """Indicateurs des salles"""
+    total: int = 0
+    disponibles: int = 0
+    surface_totale: float = 0
+    capacite_totale: int = 0
+    taux_moyen: float | None = None
+    par_type: list[TypeStats] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class EtatStats:
+    """Nombre de matériels pour un état donné"""
+    etat: str
+    label: str
+    total: int
+
+
+@dataclass(frozen=True)
+class MaterielStats:
+    """Indicateurs du matériel"""
+    total: int = 0
+    valeur_totale: Decimal = Decimal('0')
+    repartition_etat: list[EtatStats] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class DashboardStats:
+    """Ensemble des indicateurs affichés sur le tableau de bord"""
+    bureaux: BureauStats
+    salles: SalleStats
+    materiels: MaterielStats
+
+
+def get_bureau_stats():
+    """Retourne les indicateurs des bureaux (une requête)"""
+    data = Bureau.objects.aggregate(
+        total=Count('id'),
+        surface_totale=Sum('surface'),
+        capacite_totale=Sum('capacite'),
+    )
+    return BureauStats(
+        total=data['total'],
+        surface_totale=data['surface_totale'] or 0,
+        capacite_totale=data['capacite_totale'] or 0,
+    )
+
+
+def get_salle_stats():
+    """Retourne les indicateurs des salles (une requête)"""
+    data = Salle.objects.aggregate(
+        total=Count('id'),
+        disponibles=Count('id', filter=Q(disponible=True)),
+        surface_totale=Sum('surface'),
+        capacite_totale=Sum('capacite'),
+        # Moyenne du taux d'occupation calculée directement en SQL
+        taux_moyen=Avg(
+            Cast('capacite', FloatField()) / F('surface'),
+            filter=Q(capacite__isnull=False, surface__gt=0),
+            output_field=FloatField(),
+        ),
+    )
+    taux_moyen = data['taux_moyen']
+    return SalleStats(
+        total=data['total'],
+        disponibles=data['disponibles'],
+        surface_totale=data['surface_totale'] or 0,
+        capacite_totale=data['capacite_totale'] or 0,
+        taux_moyen=round(taux_moyen, 2) if taux_moyen is not None else None,
+    )
+
+
+def get_materiel_stats():
+    """Retourne les indicateurs du matériel (une requête)"""
+    par_etat = {
+        f'etat_{code}': Count('id', filter=Q(etat=code))
+        for code, _label in Materiel.ETAT_CHOICES
+    }
+    data = Materiel.objects.aggregate(
+        total=Count('id'),
+        valeur_totale=Sum(
+            F('prix_unitaire') * F('quantite'),
+            output_field=DecimalField(max_digits=20, decimal_places=2),
+        ),
+        **par_etat,
+    )
+    repartition_etat = [
+        EtatStats(etat=code, label=label, total=data[f'etat_{code}'])
+        for code, label in Materiel.ETAT_CHOICES
+        if data[f'etat_{code}']
+    ]
+    return MaterielStats(
+        total=data['total'],
+        valeur_totale=data['valeur_totale'] or Decimal('0'),
+        repartition_etat=repartition_etat,
+    )
+
+
+def get_dashboard_stats():
+    """
+    Retourne tous les indicateurs du tableau de bord calculés sur les
+    tables (trois requêtes, sans répartition par type)
+    """
+    return DashboardStats(
+        bureaux=get_bureau_stats(),
+        salles=get_salle_stats(),
+        materiels=get_materiel_stats(),
+    )
+
+
+# ========== INSTANTANÉ (PatrimoineStats) ==========
+
+def contribution(model, values):
+    """
+    Retourne la contribution d'un objet à l'instantané, sous forme de
+    dictionnaire {compteur: valeur}. Les clés contenant ':' vont dans
+    ``par_type``, les autres sont des colonnes de PatrimoineStats.
+    """
+    if model is Bureau:
+        type_bureau = values['type_bureau']
+        surface = values['surface'] or 0
+        capacite = values['capacite'] or 0
+        return {
+            'bureau_total': 1,
+            'bureau_surface': surface,
+            'bureau_capacite': capacite,
+            f'bureau:{type_bureau}:total': 1,
+            f'bureau:{type_bureau}:surface': surface,
+            f'bureau:{type_bureau}:capacite': capacite,
+        }
+
+    if model is Salle:
+        type_salle = values['type_salle']
+        surface = values['surface'] or 0
+        capacite = values['capacite']
+        data = {
+            'salle_total': 1,
+            'salle_disponibles': 1 if values['disponible'] else 0,
+            'salle_surface': surface,
+            'salle_capacite': capacite or 0,
+            f'salle:{type_salle}:total': 1,
+            f'salle:{type_salle}:surface': surface,
+            f'salle:{type_salle}:capacite': capacite or 0,
+        }
+        if surface and capacite is not None:
+            data['salle_taux_somme'] = capacite / float(surface)
+            data['salle_taux_nombre'] = 1
+        return data
+
+    if model is Materiel:
+        data = {'materiel_total': 1, f"materiel_{values['etat']}": 1}
+        if values['prix_unitaire'] is not None and values['quantite']:
+            data['materiel_valeur'] = Decimal(str(values['prix_unitaire'])) * values['quantite']
+        return data
+
+    return {}
+
+
+def difference(new, old):
+    """Retourne new - old, compteur par compteur"""
+    delta = dict(new)
+    for key, value in old.items():
+        delta[key] = delta.get(key, 0) - value
+    return delta
+
+
+def apply_delta(delta):
+    """
+    Applique une différence à l'instantané, dans la transaction courante.
+    Si l'instantané n'existe pas encore, il est reconstruit à partir des tables.
+    """
+    delta = {key: value for key, value in delta.items() if value}
+    if not delta:
+        return
+
+    with transaction.atomic():
+        snapshot = PatrimoineStats.objects.select_for_update().filter(pk=SNAPSHOT_PK).first()
+        if snapshot is None:
+            rebuild_snapshot()
+            return
+
+        par_type = dict(snapshot.par_type)
+        for key, value in delta.items():
+            if ':' in key:
+                par_type[key] = par_type.get(key, 0) + value
+            else:
+                setattr(snapshot, key, getattr(snapshot, key) + value)
+        snapshot.par_type = par_type
+        snapshot.save()
+
+
+def compute_snapshot_values():
+    """
+    Calcule toutes les valeurs de l'instantané à partir des tables
+    (une requête groupée par table)
+    """
+    values = {
+        'bureau_total': 0, 'bureau_surface': 0, 'bureau_capacite': 0,
+        'salle_total': 0, 'salle_disponibles': 0, 'salle_surface': 0, 'salle_capacite': 0,
+        'salle_taux_somme': 0, 'salle_taux_nombre': 0,
+        'materiel_total': 0, 'materiel_valeur': Decimal('0'),
+    }
+    for code, _label in Materiel.ETAT_CHOICES:
+        values[f'materiel_{code}'] = 0
+    par_type = {}
+
+    # order_by() vide : l'ordre par défaut ('nom') casserait le GROUP BY.
+    # Les alias ne doivent pas masquer les champs du modèle (F('surface')).
+    bureaux = Bureau.objects.order_by().values('type_bureau').annotate(
+        total=Count('id'),
+        surface_totale=Sum('surface'),
+        capacite_totale=Sum('capacite'),
+    )
+    for row in bureaux:
+        type_bureau = row['type_bureau']
+        values['bureau_total'] += row['total']
+        values['bureau_surface'] += row['surface_totale'] or 0
+        values['bureau_capacite'] += row['capacite_totale'] or 0
+        par_type[f'bureau:{type_bureau}:total'] = row['total']
+        par_type[f'bureau:{type_bureau}:surface'] = row['surface_totale'] or 0
+        par_type[f'bureau:{type_bureau}:capacite'] = row['capacite_totale'] or 0
+
+    salles = Salle.objects.order_by().values('type_salle').annotate(
+        total=Count('id'),
+        disponibles=Count('id', filter=Q(disponible=True)),
+        surface_totale=Sum('surface'),
+        capacite_totale=Sum('capacite'),
+        taux_somme=Sum(
+            Cast('capacite', FloatField()) / F('surface'),
+            filter=Q(capacite__isnull=False, surface__gt=0),
+            output_field=FloatField(),
+        ),
+        taux_nombre=Count('id', filter=Q(capacite__isnull=False, surface__gt=0)),
+    )
+    for row in salles:
+        type_salle = row['type_salle']
+        values['salle_total'] += row['total']
+        values['salle_disponibles'] += row['disponibles']
+        values['salle_surface'] += row['surface_totale'] or 0
+        values['salle_capacite'] += row['capacite_totale'] or 0
+        values['salle_taux_somme'] += row['taux_somme'] or 0
+        values['salle_taux_nombre'] += row['taux_nombre']
+        par_type[f'salle:{type_salle}:total'] = row['total']
+        par_type[f'salle:{type_salle}:surface'] = row['surface_totale'] or 0
+        par_type[f'salle:{type_salle}:capacite'] = row['capacite_totale'] or 0
+
+    materiels = Materiel.objects.order_by().values('etat').annotate(
+        total=Count('id'),
+        valeur=Sum(
+            F('prix_unitaire') * F('quantite'),
+            output_field=DecimalField(max_digits=20, decimal_places=2),
+        ),
+    )
+    for row in materiels:
+        values['materiel_total'] += row['total']
+        values['materiel_valeur'] += row['valeur'] or 0
+        values[f"materiel_{row['etat']}"] = row['total']
+
+    values['par_type'] = par_type
+    return values
+
+
+def rebuild_snapshot():
+    """Reconstruit entièrement l'instantané et le retourne"""
+    values = compute_snapshot_values()
+    with transaction.atomic():
+        snapshot, _created = PatrimoineStats.objects.update_or_create(
+            pk=SNAPSHOT_PK, defaults=values
+        )
+    return snapshot
+
+
+def _same_value(expected, stored):
+    if isinstance(expected, float) or isinstance(stored, float):
+        return abs(float(expected) - float(stored)) <= FLOAT_TOLERANCE * max(1, abs(float(expected)))
+    return expected == stored
+
+
+def verify_snapshot():
+    """
+    Compare l'instantané aux tables. Retourne la liste des écarts
+    (clé, valeur attendue, valeur enregistrée), vide si tout est correct.
+    """
+    snapshot = PatrimoineStats.objects.filter(pk=SNAPSHOT_PK).first()
+    expected = compute_snapshot_values()
+    if snapshot is None:
+        return [('snapshot', 'présent', None)]
+
+    mismatches = []
+    expected_par_type = expected.pop('par_type')
+    for key, value in expected.items():
+        stored = getattr(snapshot, key)
+        if not _same_value(value, stored):
+            mismatches.append((key, value, stored))
+
+    # Les types disparus restent dans par_type avec des compteurs à zéro
+    for key in sorted(set(expected_par_type) | set(snapshot.par_type)):
+        value = expected_par_type.get(key, 0)
+        stored = snapshot.par_type.get(key, 0)
+        if not _same_value(value, stored):
+            mismatches.append((key, value, stored))
+    return mismatches
+
+
+def _type_stats(par_type, prefix, choices):
+    return [
+        TypeStats(
+            code=code,
+            label=label,
+            total=par_type.get(f'{prefix}:{code}:total', 0),
+            surface=round(par_type.get(f'{prefix}:{code}:surface', 0), 2),
+            capacite=par_type.get(f'{prefix}:{code}:capacite', 0),
+        )
+        for code, label in choices
+        if par_type.get(f'{prefix}:{code}:total')
+    ]
+
+
+def get_snapshot_stats():
+    """Retourne les indicateurs du tableau de bord en lisant une seule ligne"""
+    snapshot = PatrimoineStats.objects.filter(pk=SNAPSHOT_PK).first()
+    if snapshot is None:
+        snapshot = rebuild_snapshot()
+    return snapshot_stats(snapshot)
+
+
+async def aget_snapshot_stats():
+    """get_snapshot_stats pour les vues asynchrones (ORM asynchrone)"""
+    snapshot = await PatrimoineStats.objects.filter(pk=SNAPSHOT_PK).afirst()
+    if snapshot is None:
+        snapshot = await sync_to_async(rebuild_snapshot)()
+    return snapshot_stats(snapshot)
+
+
+def snapshot_stats(snapshot):
+    """DashboardStats à partir de la ligne PatrimoineStats"""
+    taux_moyen = None
+    if snapshot.salle_taux_nombre:
+        taux_moyen = round(snapshot.salle_taux_somme / snapshot.salle_taux_nombre, 2)
+
+    return DashboardStats(
+        bureaux=BureauStats(
+            total=snapshot.bureau_total,
+            surface_totale=round(snapshot.bureau_surface, 2),
+            capacite_totale=snapshot.bureau_capacite,
+            par_type=_type_stats(snapshot.par_type, 'bureau', Bureau.TYPE_BUREAU_CHOICES),
+        ),
+        salles=SalleStats(
+            total=snapshot.salle_total,
+            disponibles=snapshot.salle_disponibles,
+            surface_totale=round(snapshot.salle_surface, 2),
+            capacite_totale=snapshot.salle_capacite,
+            taux_moyen=taux_moyen,
+            par_type=_type_stats(snapshot.par_type, 'salle', Salle.TYPE_SALLE_CHOICES),
+        ),
+        materiels=MaterielStats(
+            total=snapshot.materiel_total,
+            valeur_totale=snapshot.materiel_valeur,
+            repartition_etat=[
+                EtatStats(etat=code, label=label, total=getattr(snapshot, f'materiel_{code}'))
+                for code, label in Materiel.ETAT_CHOICES
+                if getattr(snapshot, f'materiel_{code}')
+            ],
+        ),
+    )
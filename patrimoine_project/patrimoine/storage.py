@@ -0,0 +1,148 @@
+"""
+Stockage des fichiers envoyés (MEDIA_ROOT) nommés d'après leur contenu.
+
+ContentAddressedStorage (``STORAGES['media']``, voir settings.py) range
+chaque fichier sous ``<upload_to>/<2 premiers caractères>/<sha256>.<ext>`` :
+un même contenu envoyé plusieurs fois n'est écrit qu'une fois et les objets
+qui le partagent pointent vers le même nom. Un fichier n'est donc jamais
+supprimé avec l'objet (d'autres peuvent y faire référence) : la commande
+clean_media compte les références en base et supprime les fichiers qui
+n'en ont plus.
+
+Deux envois simultanés du même contenu inédit peuvent encore produire une
+copie suffixée (``_abc1234``), que clean_media --rehash ramène au nom commun.
+"""
+import os
+import posixpath
+import re
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import models
+
+from .images import content_hash
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[\w]+)?$')
+
+# Champs JSON qui contiennent des noms de fichiers (déclinaisons des photos)
+JSON_REFERENCES = {
+    ('patrimoine', 'Salle'): 'picture_renditions',
+}
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage dont les noms sont le hachage SHA-256 du contenu"""
+
+    def hashed_name(self, name, content):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return posixpath.join(directory, digest[:2], f'{digest}{extension}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Même nom, même contenu : rien à écrire
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def media_storage():
+    """Stockage des champs fichier (callable : évalué au chargement des modèles)"""
+    return storages['media']
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(name))
+
+
+def _rendition_names(renditions):
+    for data in (renditions or {}).values():
+        for value in data.values():
+            if isinstance(value, str):
+                yield value
+
+
+def file_fields():
+    """[(modèle, nom du champ)] de tous les champs fichier des applications installées"""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, models.FileField)
+    ]
+
+
+def media_references():
+    """Counter {nom de fichier: nombre de références en base}"""
+    references = Counter()
+    for model, field_name in file_fields():
+        names = model._default_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        references.update(names.values_list(field_name, flat=True).iterator(chunk_size=2000))
+    for (app_label, model_name), field_name in JSON_REFERENCES.items():
+        model = apps.get_model(app_label, model_name)
+        rows = model._default_manager.values_list(field_name, flat=True).iterator(chunk_size=2000)
+        for renditions in rows:
+            references.update(_rendition_names(renditions))
+    return references
+
+
+def rehash_files():
+    """
+    Renomme d'après leur contenu les fichiers référencés sous un ancien nom
+    (``logo_1hlGTQ4.png``...) des champs en ContentAddressedStorage ;
+    retourne le nombre de lignes mises à jour. Les anciens fichiers
+    deviennent orphelins
+    """
+    updated = 0
+    for model, field_name in file_fields():
+        field = model._meta.get_field(field_name)
+        if not isinstance(field.storage, ContentAddressedStorage):
+            continue
+        rows = model._default_manager.exclude(**{field_name: ''}).values_list('pk', field_name)
+        for pk, name in list(rows.iterator(chunk_size=2000)):
+            if is_hashed(name) or not field.storage.exists(name):
+                continue
+            if not callable(field.upload_to):
+                # Même dossier qu'un nouvel envoi (upload_to)
+                name_in_directory = field.generate_filename(None, posixpath.basename(name))
+            else:
+                name_in_directory = name
+            with field.storage.open(name) as file:
+                new_name = field.storage.save(name_in_directory, file)
+            updated += model._default_manager.filter(pk=pk).update(**{field_name: new_name})
+    return updated
+
+
+def find_orphans(storage, references, min_age=0):
+    """
+    [(nom, taille)] des fichiers du stockage sans référence, modifiés il y a
+    plus de ``min_age`` secondes (un envoi en cours n'est pas encore en base)
+    """
+    root = storage.location
+    limit = time.time() - min_age
+    orphans = []
+    for directory, _dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if name in references:
+                continue
+            stat = os.stat(path)
+            if stat.st_mtime <= limit:
+                orphans.append((name, stat.st_size))
+    return sorted(orphans)
+
+
+def remove_empty_directories(storage):
+    root = storage.location
+    for directory, dirnames, filenames in os.walk(root, topdown=False):
+        if directory != root and not os.listdir(directory):
+            os.rmdir(directory)
@@ -0,0 +1,144 @@
+"""
+Synchronisation incrémentale : /sync/?since=<jeton>.
+
+La réponse contient les bureaux, salles et matériels créés ou modifiés
+depuis le jeton, les identifiants supprimés (table Suppression, alimentée
+par post_delete, cascades comprises) et un nouveau jeton à renvoyer à
+l'appel suivant. Sans jeton, tout l'inventaire est transmis.
+
+Le jeton est opaque : il contient, pour chaque table, la position
+(date_modification, id) de la dernière ligne transmise. Chaque table est
+lue à partir de cette position sur l'index (date_modification, id) : le
+coût d'un appel dépend du nombre de changements, pas de la taille des
+tables. Si ``has_more`` est vrai, il faut rappeler immédiatement avec le
+nouveau jeton.
+
+Les lignes modifiées depuis moins de PATRIMOINE_SYNC_LAG secondes ne sont
+pas encore transmises : une transaction en cours peut encore valider une
+ligne datée d'avant la dernière position lue, qui serait sinon perdue.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .api import FIELDS, RESOURCES, _serialize, get_api_page_size, json_response
+from .models import Suppression
+from .pagination import decode_cursor, encode_cursor
+
+DEFAULT_LAG = 2
+
+# Position de départ d'un client qui n'a encore rien reçu
+ORIGIN = [datetime(1970, 1, 1, tzinfo=dt_timezone.utc).isoformat(), 0]
+
+# Ordre du jeton (et de la réponse : les salles et bureaux avant leur matériel)
+STREAMS = ('bureaux', 'salles', 'materiels', 'suppressions')
+
+SUPPRESSION_RESOURCES = {
+    'bureau': 'bureaux',
+    'salle': 'salles',
+    'materiel': 'materiels',
+}
+
+
+class SyncError(ValueError):
+    pass
+
+
+def get_lag():
+    return timedelta(seconds=getattr(settings, 'PATRIMOINE_SYNC_LAG', DEFAULT_LAG))
+
+
+def decode_token(token):
+    """Jeton -> {flux: [date iso, id]} ; SyncError s'il est invalide"""
+    values = decode_cursor(token, len(STREAMS) * 2)
+    if values is None:
+        raise SyncError("Jeton de synchronisation invalide.")
+    positions = {}
+    for index, stream in enumerate(STREAMS):
+        date, pk = values[2 * index:2 * index + 2]
+        if not isinstance(date, str) or parse_datetime(date) is None or not isinstance(pk, int):
+            raise SyncError("Jeton de synchronisation invalide.")
+        positions[stream] = [date, pk]
+    return positions
+
+
+def encode_token(positions):
+    return encode_cursor([value for stream in STREAMS for value in positions[stream]])
+
+
+def _after(date_field, position):
+    """
+    Lignes strictement après (date, id) : ``date >= d`` reste une plage
+    sur l'index, l'égalité exacte est départagée par l'id
+    """
+    date, pk = parse_datetime(position[0]), position[1]
+    return Q(**{f'{date_field}__gte': date}) & ~Q(**{date_field: date, 'id__lte': pk})
+
+
+def _read(queryset, date_field, position, cutoff, limit):
+    """Lit au plus ``limit`` lignes après la position ; (lignes, reste-t-il des lignes)"""
+    rows = list(
+        queryset.filter(_after(date_field, position), **{f'{date_field}__lt': cutoff})
+        .order_by(date_field, 'id')[:limit + 1]
+    )
+    return rows[:limit], len(rows) > limit
+
+
+def _position(row, date_field):
+    return [row[date_field].isoformat(), row['id']]
+
+
+def changes_since(token=None, limit=500, now=None):
+    """
+    Changements depuis le jeton (tout l'inventaire sans jeton) :
+    ``{'bureaux': [...], 'salles': [...], 'materiels': [...],
+    'suppressions': {'bureaux': [ids], ...}, 'token': ..., 'has_more': bool}``
+    """
+    cutoff = (now or timezone.now()) - get_lag()
+    if token:
+        positions = decode_token(token)
+    else:
+        # Premier appel : les suppressions passées ne concernent pas le client
+        positions = {stream: list(ORIGIN) for stream in STREAMS}
+        positions['suppressions'] = [cutoff.isoformat(), 0]
+
+    data = {'has_more': False}
+    for resource in STREAMS[:-1]:
+        model = RESOURCES[resource]
+        rows, more = _read(
+            model.objects.values(*FIELDS[model]), 'date_modification',
+            positions[resource], cutoff, limit,
+        )
+        if rows:
+            positions[resource] = _position(rows[-1], 'date_modification')
+        data[resource] = _serialize(rows)
+        data['has_more'] |= more
+
+    rows, more = _read(
+        Suppression.objects.values('id', 'modele', 'objet_id', 'date_suppression'),
+        'date_suppression', positions['suppressions'], cutoff, limit,
+    )
+    if rows:
+        positions['suppressions'] = _position(rows[-1], 'date_suppression')
+    deleted = {resource: [] for resource in SUPPRESSION_RESOURCES.values()}
+    for row in rows:
+        deleted[SUPPRESSION_RESOURCES[row['modele']]].append(row['objet_id'])
+    data['suppressions'] = deleted
+    data['has_more'] |= more
+
+    data['token'] = encode_token(positions)
+    return data
+
+
+def sync_changes(request):
+    """GET /sync/?since=<jeton>&page_size=<n> (n lignes au plus par table)"""
+    if request.method != 'GET':
+        return json_response({'error': 'Méthode non autorisée.'}, status=405)
+    try:
+        data = changes_since(request.GET.get('since'), get_api_page_size(request))
+    except SyncError as exc:
+        return json_response({'error': str(exc)}, status=400)
+    return json_response(data)
@@ -0,0 +1,19 @@
+from django import template
+
+from patrimoine.cache import fragment_key, get_timeout
+
+register = template.Library()
+
+
+@register.simple_tag
+def cache_version(*parts):
+    """
+    Version d'une portée pour {% cache %}, ex :
+    {% cache_version 'detail:salle' salle.pk as version %}
+    """
+    return fragment_key(':'.join(str(part) for part in parts))
+
+
+@register.simple_tag
+def cache_timeout():
+    return get_timeout()
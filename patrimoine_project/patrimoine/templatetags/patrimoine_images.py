@@ -0,0 +1,28 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from patrimoine.images import srcset
+
+register = template.Library()
+
+
+@register.inclusion_tag('base/picture.html')
+def responsive_picture(salle, rendition='detail', sizes='100vw', css_class='', style=''):
+    """
+    Photo d'une salle en <picture> : WebP puis JPEG, la largeur adaptée
+    étant choisie par le navigateur ; photo d'origine si elle n'a pas de
+    déclinaisons. Ex : {% responsive_picture salle 'thumb' sizes='80px' %}
+    (``salle`` peut être une ligne de liste en dictionnaire, voir rows.py)
+    """
+    renditions = (salle['picture_renditions'] if isinstance(salle, dict) else salle.picture_renditions) or {}
+    fallback = renditions.get(rendition)
+    return {
+        'salle': salle,
+        'webp_srcset': srcset(renditions, 'webp') if fallback else '',
+        'jpeg_srcset': srcset(renditions, 'jpeg') if fallback else '',
+        'fallback': fallback,
+        'src': default_storage.url(fallback['jpeg']) if fallback else '',
+        'sizes': sizes,
+        'css_class': css_class,
+        'style': style,
+    }
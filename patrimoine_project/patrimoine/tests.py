@@ -1,3 +1,1816 @@
-from django.test import TestCase
+import csv
+import gzip
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import QueryDict
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from patrimoine_project.database import database_settings
+
+from .models import (
+    Bureau, Salle, Materiel, PatrimoineStats, Suppression, HistoriqueMateriel, HistoriqueMois, Tache,
+)
+from .pagination import encode_cursor, paginate_keyset
+from .search import rebuild_index, search_queryset
+from .filters import apply_filters
+from .imports import import_materiels
+from .locations import location_labels
+from .rows import LIST_ROWS, ROWS_CHUNK_SIZE, UrlTemplate
+from .history import inventory_value, materiel_state
+from .benchmark import (
+    compare, generate_inventory, measure_routes, scale_counts, use_async_views,
+)
+from .bulk import update_materiels
+from .signals import bulk_created, bulk_updated
+from .pagination import KEYSET_ORDERING
+from . import cache as page_cache
+from . import history
+from . import jobs
+from . import perf
+from .stats import get_dashboard_stats, get_snapshot_stats, verify_snapshot
+
 
 # Create your tests here.
+@override_settings(PATRIMOINE_CACHE_TIMEOUT=0)
+class PatrimoineTestCase(TestCase):
+    """Cache des pages désactivé : les tests inspectent response.context (voir PageCacheTest)"""
+
+
+class DashboardStatsTest(PatrimoineTestCase):
+    """Indicateurs du tableau de bord"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Bureau.objects.create(type_bureau='box', nom='B1', surface=20, capacite=2)
+        Bureau.objects.create(type_bureau='open', nom='B2', surface=80)
+        cls.salle = Salle.objects.create(type_salle='reunion', nom='S1', surface=40, capacite=10)
+        Salle.objects.create(type_salle='formation', nom='S2', surface=50, capacite=20, disponible=False)
+        Salle.objects.create(type_salle='pleniere', nom='S3')
+        Materiel.objects.create(salle=cls.salle, nom='Projecteur', quantite=2,
+                                prix_unitaire=Decimal('100.50'), etat='bon')
+        Materiel.objects.create(salle=cls.salle, nom='Chaise', quantite=10,
+                                prix_unitaire=Decimal('5'), etat='hs')
+        Materiel.objects.create(salle=cls.salle, nom='Table', quantite=3, etat='bon')
+
+    def test_values(self):
+        stats = get_dashboard_stats()
+        self.assertEqual(stats.bureaux.total, 2)
+        self.assertEqual(stats.bureaux.surface_totale, 100)
+        self.assertEqual(stats.bureaux.capacite_totale, 2)
+        self.assertEqual(stats.salles.total, 3)
+        self.assertEqual(stats.salles.disponibles, 2)
+        self.assertEqual(stats.salles.capacite_totale, 30)
+        self.assertEqual(stats.salles.taux_moyen, round((10 / 40 + 20 / 50) / 2, 2))
+        self.assertEqual(stats.materiels.total, 3)
+        self.assertEqual(stats.materiels.valeur_totale, Decimal('251.00'))
+        self.assertEqual(
+            [(e.etat, e.total) for e in stats.materiels.repartition_etat],
+            [('bon', 2), ('hs', 1)],
+        )
+
+    def test_one_query_per_table(self):
+        with self.assertNumQueries(3):
+            get_dashboard_stats()
+
+    def test_empty_database(self):
+        Materiel.objects.all().delete()
+        Salle.objects.all().delete()
+        Bureau.objects.all().delete()
+        stats = get_dashboard_stats()
+        self.assertEqual(stats.salles.taux_moyen, None)
+        self.assertEqual(stats.materiels.valeur_totale, 0)
+        self.assertEqual(stats.materiels.repartition_etat, [])
+
+    def test_dashboard_view(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Hors service')
+
+
+class PatrimoineStatsSnapshotTest(PatrimoineTestCase):
+    """Instantané tenu à jour par les signaux"""
+
+    def setUp(self):
+        self.salle = Salle.objects.create(type_salle='reunion', nom='S1', surface=40, capacite=10)
+        self.bureau = Bureau.objects.create(type_bureau='box', nom='B1', surface=12.5, capacite=2)
+        self.materiel = Materiel.objects.create(salle=self.salle, nom='PC', quantite=2,
+                                                prix_unitaire=Decimal('300'))
+        Materiel.objects.create(salle=self.salle, nom='Ecran', quantite=1,
+                                prix_unitaire=Decimal('50'), etat='moyen')
+
+    def assertSnapshotMatchesTables(self):
+        self.assertEqual(verify_snapshot(), [])
+        live, snapshot = get_dashboard_stats(), get_snapshot_stats()
+        self.assertEqual(snapshot.materiels, live.materiels)
+        self.assertEqual(snapshot.salles.taux_moyen, live.salles.taux_moyen)
+        self.assertEqual(snapshot.bureaux.total, live.bureaux.total)
+
+    def test_created(self):
+        self.assertSnapshotMatchesTables()
+        stats = get_snapshot_stats()
+        self.assertEqual(stats.materiels.valeur_totale, Decimal('650'))
+        self.assertEqual([(t.code, t.surface) for t in stats.bureaux.par_type], [('box', 12.5)])
+
+    def test_updated(self):
+        self.materiel.etat = 'hs'
+        self.materiel.quantite = 5
+        self.materiel.save()
+        self.salle.type_salle = 'formation'
+        self.salle.disponible = False
+        self.salle.surface = 50
+        self.salle.save()
+        self.assertSnapshotMatchesTables()
+        stats = get_snapshot_stats()
+        self.assertEqual(stats.materiels.valeur_totale, Decimal('1550'))
+        self.assertEqual([t.code for t in stats.salles.par_type], ['formation'])
+
+    def test_cascade_delete(self):
+        self.salle.delete()
+        self.assertSnapshotMatchesTables()
+        self.assertEqual(get_snapshot_stats().materiels.total, 0)
+
+    def test_dashboard_reads_one_row(self):
+        get_snapshot_stats()
+        with self.assertNumQueries(1):
+            get_snapshot_stats()
+
+    def test_rebuild_command(self):
+        # Une mise à jour en masse contourne les signaux
+        Materiel.objects.update(quantite=10)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stats', '--check', stdout=StringIO(), stderr=StringIO())
+        out = StringIO()
+        call_command('rebuild_stats', stdout=out)
+        self.assertIn('aucun écart', out.getvalue())
+        self.assertEqual(PatrimoineStats.objects.count(), 1)
+
+
+class MaterielListQueryCountTest(PatrimoineTestCase):
+    """Le nombre de requêtes d'une liste ne dépend pas du nombre de lignes"""
+
+    LIST_URLS = ['materiel_list', 'materiel_bon', 'materiel_moyen',
+                 'materiel_mauvais', 'materiel_hs', 'materiel_autre']
+
+    def add_materiels(self, count):
+        salle = Salle.objects.create(type_salle='reunion', nom='Salle')
+        bureau = Bureau.objects.create(type_bureau='box', nom='Bureau')
+        for i in range(count):
+            for etat, _label in Materiel.ETAT_CHOICES:
+                location = {'salle': salle} if i % 2 else {'bureau': bureau}
+                Materiel.objects.create(nom=f'M{i}', etat=etat, **location)
+
+    def count_queries(self, url_name):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_constant_query_count(self):
+        self.add_materiels(2)
+        before = {name: self.count_queries(name) for name in self.LIST_URLS}
+        self.add_materiels(20)
+        for name in self.LIST_URLS:
+            with self.subTest(url=name):
+                self.assertEqual(self.count_queries(name), before[name])
+                # Lecture de l'état (ETag) puis la page
+                self.assertLessEqual(before[name], 2)
+
+    def test_location_rendered(self):
+        self.add_materiels(2)
+        response = self.client.get(reverse('materiel_bon'))
+        self.assertContains(response, 'Salle: Salle')
+        self.assertContains(response, 'Bureau: Bureau')
+
+
+class KeysetPaginationTest(PatrimoineTestCase):
+    """Pagination par curseur (nom, id)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Noms en double pour vérifier le départage par id
+        for i in range(7):
+            Bureau.objects.create(type_bureau='box', nom=f'B{i // 2}')
+
+    def get_page(self, **params):
+        request = RequestFactory().get('/', params)
+        return paginate_keyset(request, Bureau.objects.all(), page_size=3)
+
+    def test_walk_forward_and_back(self):
+        expected = list(Bureau.objects.order_by('nom', 'id'))
+        pages = [self.get_page()]
+        while pages[-1].has_next:
+            query = dict(p.split('=') for p in pages[-1].next_query.split('&'))
+            pages.append(self.get_page(**query))
+        self.assertEqual([b for page in pages for b in page], expected)
+        self.assertFalse(pages[0].has_previous)
+
+        query = dict(p.split('=') for p in pages[-1].previous_query.split('&'))
+        self.assertEqual(list(self.get_page(**query)), list(pages[-2]))
+
+    def test_invalid_cursor_returns_first_page(self):
+        self.assertEqual(list(self.get_page(after='pas-un-jeton')), list(self.get_page()))
+
+    def test_tampered_cursor_returns_first_page(self):
+        first = list(self.get_page())
+        for values in (['a', 'x'], ['B0', [1]], ['B0', {'id': 1}], [None, 1]):
+            self.assertEqual(list(self.get_page(after=encode_cursor(values))), first)
+            self.assertEqual(list(self.get_page(before=encode_cursor(values))), first)
+        for name in ('materiel_list', 'salle_list', 'bureau_list'):
+            response = self.client.get(reverse(name), {'after': encode_cursor(['a', 'x'])})
+            self.assertEqual(response.status_code, 200)
+
+    def test_query_string_kept(self):
+        request = RequestFactory().get('/', {'search': 'B', 'after': encode_cursor(['B0', 0])})
+        page = paginate_keyset(request, Bureau.objects.all(), page_size=1)
+        self.assertIn('search=B', page.next_query)
+        self.assertEqual(page.next_query.count('after='), 1)
+
+    @override_settings(PATRIMOINE_PAGE_SIZE=2)
+    def test_list_view_paginated(self):
+        response = self.client.get(reverse('bureau_list'))
+        self.assertEqual(len(response.context['bureaux']), 2)
+        self.assertContains(response, 'Suivant')
+        response = self.client.get(reverse('bureau_list'), {'page_size': 5})
+        self.assertEqual(len(response.context['bureaux']), 5)
+
+
+class FullTextSearchTest(PatrimoineTestCase):
+    """Index plein texte tenu à jour par les signaux"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.salle = Salle.objects.create(type_salle='conference', nom='Salle Atlantique',
+                                         niveau='RDC', equipements='Projecteur, WiFi')
+        cls.projecteur = Materiel.objects.create(salle=cls.salle, nom='Projecteur Epson',
+                                                 numero_serie='SN-4242')
+        cls.ecran = Materiel.objects.create(salle=cls.salle, nom='Écran', etat='hs',
+                                            description='Écran pour projecteur')
+
+    def search(self, model, query):
+        queryset, ordering = search_queryset(model.objects.all(), query)
+        return list(queryset.order_by(*ordering))
+
+    def test_prefix_and_ranking(self):
+        # « proj » trouve les deux, le nom pèse plus que la description
+        self.assertEqual(self.search(Materiel, 'proj'), [self.projecteur, self.ecran])
+
+    def test_accents_serial_and_labels(self):
+        self.assertEqual(self.search(Materiel, 'ecran'), [self.ecran])
+        self.assertEqual(self.search(Materiel, 'SN 4242'), [self.projecteur])
+        self.assertEqual(self.search(Materiel, 'hors service'), [self.ecran])
+        self.assertEqual(self.search(Salle, 'conférence wifi'), [self.salle])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.projecteur.nom = 'Vidéoprojecteur'
+        self.projecteur.save()
+        self.assertEqual(self.search(Materiel, 'video'), [self.projecteur])
+        self.salle.delete()
+        self.assertEqual(self.search(Materiel, 'proj'), [])
+
+    def test_bulk_created_indexed_in_batches(self):
+        created = Materiel.objects.bulk_create([Materiel(nom=f'Tabouret {i}') for i in range(5)])
+        with CaptureQueriesContext(connection) as queries:
+            bulk_created.send(sender=Materiel, instances=created)
+        statements = [q['sql'] for q in queries if 'patrimoine_search_materiel' in q['sql']]
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(len(self.search(Materiel, 'tabou')), 5)
+
+    def test_rebuild(self):
+        self.assertEqual(rebuild_index(), 3)
+        self.assertEqual(self.search(Salle, 'atlan'), [self.salle])
+
+    def test_list_views(self):
+        for name in ('salle_list', 'list_salle', 'bureau_list', 'materiel_list', 'materiel_hs'):
+            with self.subTest(url=name):
+                response = self.client.get(reverse(name), {'search': 'proj'})
+                self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('materiel_hs'), {'search': 'proj'})
+        self.assertEqual([row['id'] for row in response.context['materiels']], [self.ecran.pk])
+
+    def test_ranked_pagination(self):
+        response = self.client.get(reverse('materiel_list'), {'search': 'proj', 'page_size': 1})
+        self.assertEqual([row['id'] for row in response.context['materiels']], [self.projecteur.pk])
+        response = self.client.get(reverse('materiel_list') + '?' + response.context['page'].next_query)
+        self.assertEqual([row['id'] for row in response.context['materiels']], [self.ecran.pk])
+
+
+class ListRowsTest(PatrimoineTestCase):
+    """Lignes des listes précalculées (libellés, URL) et envoyées en flux"""
+
+    def test_rows_match_model_methods(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1')
+        bureau = Bureau.objects.create(type_bureau='open', nom='B1')
+        Materiel.objects.create(nom='A', salle=salle, quantite=3, prix_unitaire=Decimal('10.50'))
+        Materiel.objects.create(nom='B', bureau=bureau, etat='hs', prix_unitaire=0)
+        Materiel.objects.create(nom='C', etat='autre')
+        spec = LIST_ROWS[Materiel]
+        rows = spec.prepare_rows(list(spec.queryset(Materiel.objects.all(), KEYSET_ORDERING)))
+        for row in rows:
+            materiel = Materiel.objects.get(pk=row['id'])
+            with self.subTest(materiel=materiel.nom):
+                self.assertEqual(row['localisation_label'], materiel.get_localisation())
+                self.assertEqual(row['etat_label'], materiel.get_etat_display())
+                self.assertEqual(row['valeur_totale'], materiel.get_valeur_totale())
+                self.assertEqual(row['update_url'], reverse('materiel_update', args=[materiel.pk]))
+        self.assertEqual(str(rows[0]['valeur_totale']), '31.50')
+
+        spec = LIST_ROWS[Bureau]
+        row, = spec.queryset(Bureau.objects.all(), KEYSET_ORDERING)
+        self.assertEqual(row['type_label'], bureau.get_type_bureau_display())
+
+    def test_url_template(self):
+        self.assertEqual(UrlTemplate('salle_delete').format(42), reverse('salle_delete', args=[42]))
+
+    def test_large_page_streamed(self):
+        count = ROWS_CHUNK_SIZE + 10
+        Materiel.objects.bulk_create(Materiel(nom=f'M{i:04d}') for i in range(count))
+        response = self.client.get(reverse('materiel_list'), {'page_size': count})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.count('name="ids"'), count)
+        self.assertLess(content.index('M0000'), content.index(f'M{count - 1:04d}'))
+        self.assertIn('</html>', content)
+
+        small = self.client.get(reverse('materiel_list'))
+        self.assertFalse(small.streaming)
+        self.assertContains(small, 'Non localisé')
+
+
+class FilterEngineTest(PatrimoineTestCase):
+    """Filtres des formulaires de recherche"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reunion = Salle.objects.create(type_salle='reunion', nom='R1', capacite=8)
+        cls.grande = Salle.objects.create(type_salle='reunion', nom='R2', capacite=30, disponible=False)
+        cls.formation = Salle.objects.create(type_salle='formation', nom='F1', capacite=40)
+        cls.bureau = Bureau.objects.create(type_bureau='open', nom='O1', niveau='RDC')
+        cls.en_salle = Materiel.objects.create(salle=cls.reunion, nom='A', etat='hs')
+        cls.en_bureau = Materiel.objects.create(bureau=cls.bureau, nom='B', etat='hs')
+
+    def filtered(self, model, query='', **fixed):
+        queryset, _form = apply_filters(model.objects.all(), QueryDict(query), **fixed)
+        return set(queryset)
+
+    def test_salle_criteria(self):
+        self.assertEqual(self.filtered(Salle, 'type_salle=reunion&capacite_min=10'), {self.grande})
+        self.assertEqual(self.filtered(Salle, 'disponible=true'), {self.reunion, self.formation})
+        self.assertEqual(self.filtered(Salle, 'capacite_min=abc'), {self.reunion, self.grande, self.formation})
+        self.assertEqual(self.filtered(Salle, 'type_salle=formation', type_salle='reunion'),
+                         {self.reunion, self.grande})
+
+    def test_materiel_and_bureau_criteria(self):
+        self.assertEqual(self.filtered(Materiel, 'etat=hs&localisation=bureau'), {self.en_bureau})
+        self.assertEqual(self.filtered(Materiel, 'localisation=salle'), {self.en_salle})
+        self.assertEqual(self.filtered(Bureau, 'niveau=RDC&type_bureau=open'), {self.bureau})
+        self.assertEqual(self.filtered(Bureau, 'type_bureau=box'), set())
+
+    def test_per_type_urls(self):
+        response = self.client.get(reverse('salle_reunion'), {'capacite_min': 10})
+        self.assertEqual([row['id'] for row in response.context['salles']], [self.grande.pk])
+        response = self.client.get(reverse('materiel_hs'), {'localisation': 'salle'})
+        self.assertEqual([row['id'] for row in response.context['materiels']], [self.en_salle.pk])
+
+
+@skipUnless(connection.vendor == 'sqlite', "plans d'exécution SQLite")
+class FilterIndexUsageTest(PatrimoineTestCase):
+    """Chaque combinaison de filtres passe par un index, jamais par un parcours de table"""
+
+    CRITERIA = {
+        Bureau: {'type_bureau': 'box', 'niveau': 'RDC'},
+        Salle: {'type_salle': 'reunion', 'disponible': 'true', 'capacite_min': '10'},
+        Materiel: {'etat': 'bon', 'localisation': 'salle'},
+    }
+
+    def assertUsesIndex(self, queryset):
+        """
+        Chaque accès à la table est une recherche dans un index (SEARCH),
+        ou le parcours d'un index partiel, qui ne contient que les lignes
+        retenues par sa condition
+        """
+        plan = queryset.explain()
+        table = queryset.model._meta.db_table
+        allowed = [rf'\bSEARCH {table} USING (COVERING )?INDEX\b']
+        allowed += [
+            rf'\bSCAN {table} USING INDEX {index.name}\b'
+            for index in queryset.model._meta.indexes if index.condition is not None
+        ]
+        lines = [line for line in plan.splitlines() if re.search(rf'\b(SCAN|SEARCH) {table}\b', line)]
+        self.assertTrue(lines, plan)
+        for line in lines:
+            self.assertRegex(line, '|'.join(allowed), plan)
+
+    def test_all_combinations(self):
+        for model, criteria in self.CRITERIA.items():
+            names = list(criteria)
+            for size in range(1, len(names) + 1):
+                for combination in itertools.combinations(names, size):
+                    params = QueryDict(mutable=True)
+                    params.update({name: criteria[name] for name in combination})
+                    queryset, _form = apply_filters(model.objects.all(), params)
+                    with self.subTest(model=model.__name__, filters=combination):
+                        self.assertUsesIndex(queryset.order_by(*KEYSET_ORDERING)[:51])
+
+
+@override_settings(PATRIMOINE_HOME_RECENT=2)
+class HomePageTest(PatrimoineTestCase):
+    """Accueil : compteurs et derniers objets, listes complètes en JSON"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.salles = [Salle.objects.create(type_salle='reunion', nom=f'S{i}') for i in range(5)]
+
+    def test_counts_and_recent_items(self):
+        get_snapshot_stats()
+        # État (ETag), instantané, puis une requête par type d'objet
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['stats'].salles.total, 5)
+        self.assertEqual([item['nom'] for item in response.context['salles']], ['S4', 'S3'])
+
+    def test_json_list(self):
+        url = reverse('home_items', args=['salles'])
+        names, next_query = [], ''
+        while next_query is not None:
+            data = self.client.get(url + next_query, {'page_size': 2} if not next_query else {}).json()
+            names += [item['nom'] for item in data['results']]
+            next_query = data['next']
+        self.assertEqual(names, ['S4', 'S3', 'S2', 'S1', 'S0'])
+        self.assertEqual(self.client.get(reverse('home_items', args=['inconnu'])).status_code, 404)
+
+
+@override_settings(PATRIMOINE_CACHE_TIMEOUT=300)
+class PageCacheTest(TestCase):
+    """Pages en cache invalidées par portée"""
+
+    def setUp(self):
+        cache.clear()
+        self.salle = Salle.objects.create(type_salle='reunion', nom='S1')
+        self.autre_salle = Salle.objects.create(type_salle='reunion', nom='S2')
+        self.bureau = Bureau.objects.create(type_bureau='box', nom='B1')
+        self.materiel = Materiel.objects.create(salle=self.salle, nom='PC')
+
+    def assertCached(self, url, cached=True):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        # Une requête reste : la lecture de l'état pour l'ETag
+        if cached:
+            self.assertEqual(len(context.captured_queries), 1, url)
+        else:
+            self.assertGreater(len(context.captured_queries), 1, url)
+
+    def test_materiel_update_invalidates_affected_pages_only(self):
+        urls = {
+            'dashboard': reverse('dashboard'),
+            'bureaux': reverse('bureau_list'),
+            'salles': reverse('salle_list'),
+            'materiels': reverse('materiel_list'),
+            'materiel': reverse('materiel_detail', args=[self.materiel.pk]),
+        }
+        for url in urls.values():
+            self.client.get(url)
+            self.assertCached(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.materiel.etat = 'hs'
+            self.materiel.save()
+
+        for name in ('dashboard', 'materiels', 'materiel'):
+            self.assertCached(urls[name], cached=False)
+        for name in ('bureaux', 'salles'):
+            self.assertCached(urls[name])
+
+    def test_detail_fragment(self):
+        scope = f'detail:salle:{self.salle.pk}'
+        other_scope = f'detail:salle:{self.autre_salle.pk}'
+        before = page_cache.get_versions(scope, other_scope)
+        self.materiel.salle = self.autre_salle
+        self.materiel.save()
+        after = page_cache.get_versions(scope, other_scope)
+        # Ancienne et nouvelle salle invalidées
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+
+        url = reverse('salle_detail', args=[self.autre_salle.pk])
+        self.assertContains(self.client.get(url), 'PC')
+        self.materiel.nom = 'Portable'
+        self.materiel.save()
+        self.assertContains(self.client.get(url), 'Portable')
+
+    def test_renaming_salle_invalidates_materiel_lists(self):
+        url = reverse('materiel_list')
+        self.client.get(url)
+        self.salle.disponible = False
+        self.salle.save()
+        self.assertCached(url)
+        self.salle.nom = 'Salle renommée'
+        self.salle.save()
+        self.assertContains(self.client.get(url), 'Salle renommée')
+
+
+class ConditionalGetTest(PatrimoineTestCase):
+    """ETag / Last-Modified : 304 sans rendu tant que rien n'a changé"""
+
+    def setUp(self):
+        self.salle = Salle.objects.create(type_salle='reunion', nom='S1')
+        self.autre_salle = Salle.objects.create(type_salle='reunion', nom='S2')
+        self.materiel = Materiel.objects.create(salle=self.salle, nom='PC')
+
+    def revalidate(self, url, response):
+        headers = {'If-None-Match': response['ETag']}
+        if response.has_header('Last-Modified'):
+            headers['If-Modified-Since'] = response['Last-Modified']
+        return self.client.get(url, headers=headers)
+
+    def assertNotModified(self, url, response):
+        with self.assertNumQueries(1):
+            revalidated = self.revalidate(url, response)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+
+    def test_unchanged_pages(self):
+        urls = [
+            reverse('dashboard'), reverse('home'), reverse('bureau_list'),
+            reverse('salle_list'), reverse('materiel_list'),
+            reverse('salle_detail', args=[self.salle.pk]),
+            reverse('materiel_detail', args=[self.materiel.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertNotModified(url, response)
+
+    def test_materiel_change_in_salle(self):
+        url = reverse('salle_detail', args=[self.salle.pk])
+        response = self.client.get(url)
+        self.materiel.nom = 'Portable'
+        self.materiel.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_materiel_moved_out_or_deleted(self):
+        url = reverse('salle_detail', args=[self.salle.pk])
+        other = Materiel.objects.create(salle=self.salle, nom='Écran')
+        response = self.client.get(url)
+        # Le Max ne bouge pas pour la salle quittée : le nombre de matériels change
+        Materiel.objects.filter(pk=other.pk).update(salle=self.autre_salle)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+        response = self.client.get(url)
+        self.materiel.delete()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_deletion_changes_list_etag(self):
+        url = reverse('salle_list')
+        response = self.client.get(url)
+        self.autre_salle.delete()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+        # Les suppressions sont lues dans Suppression : pas de COUNT sur les tables
+        response = self.client.get(reverse('materiel_list'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotModified(reverse('materiel_list'), response)
+        self.assertNotIn('COUNT(', queries[0]['sql'])
+        self.materiel.delete()
+        self.assertEqual(self.revalidate(reverse('materiel_list'), response).status_code, 200)
+
+    def test_if_modified_since_alone_after_delete_or_move(self):
+        hour_ago = timezone.now() - timedelta(hours=1)
+        for model in (Salle, Materiel):
+            model.objects.update(date_modification=hour_ago)
+        list_url = reverse('materiel_list')
+        detail_url = reverse('salle_detail', args=[self.salle.pk])
+        listed = self.client.get(list_url)
+        self.assertEqual(
+            self.client.get(list_url, headers={'If-Modified-Since': listed['Last-Modified']}).status_code, 304,
+        )
+        # Fiche : pas de date, seul l'ETag permet un 304
+        detail = self.client.get(detail_url)
+        self.assertFalse(detail.has_header('Last-Modified'))
+
+        Materiel.objects.filter(pk=self.materiel.pk).update(salle=self.autre_salle)
+        moved = self.client.get(detail_url, headers={'If-Modified-Since': http_date(time.time())})
+        self.assertEqual(moved.status_code, 200)
+
+        self.materiel.delete()
+        response = self.client.get(list_url, headers={'If-Modified-Since': listed['Last-Modified']})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'PC')
+
+    def test_missing_object(self):
+        self.assertEqual(self.client.get(reverse('salle_detail', args=[999])).status_code, 404)
+
+
+class PictureRenditionsTest(PatrimoineTestCase):
+    """Déclinaisons WebP / JPEG des photos de salle"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def upload(self, size=(2000, 1000), color='red', name='photo.jpg'):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Fabricant'  # Make
+        Image.new('RGB', size, color).save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_renditions_generated_on_upload(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1', picture=self.upload())
+        renditions = Salle.objects.get(pk=salle.pk).picture_renditions
+        self.assertEqual(
+            {name: data['width'] for name, data in renditions.items()},
+            {'thumb': 320, 'detail': 800, 'full': 1600},
+        )
+        self.assertEqual(renditions['thumb']['height'], 160)
+        for data in renditions.values():
+            for fmt in ('webp', 'jpeg'):
+                with default_storage.open(data[fmt]) as file:
+                    image = Image.open(file)
+                    self.assertEqual(image.size, (data['width'], data['height']))
+                    self.assertFalse(image.getexif())
+
+    def test_content_addressed_names(self):
+        first = Salle.objects.create(type_salle='reunion', nom='S1', picture=self.upload())
+        second = Salle.objects.create(type_salle='reunion', nom='S2', picture=self.upload())
+        other = Salle.objects.create(type_salle='reunion', nom='S3', picture=self.upload(color='blue'))
+        # Même contenu, mêmes fichiers ; contenu différent, autres fichiers
+        self.assertEqual(first.picture_renditions, second.picture_renditions)
+        self.assertNotEqual(first.picture_renditions, other.picture_renditions)
+
+    def test_small_image_not_enlarged(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1', picture=self.upload(size=(400, 300)))
+        widths = [data['width'] for data in salle.picture_renditions.values()]
+        self.assertEqual(widths, [320, 400, 400])
+
+    def test_unchanged_picture_not_reprocessed(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1', picture=self.upload())
+        name = salle.picture_renditions['thumb']['webp']
+        default_storage.delete(name)
+        salle.nom = 'Salle 1'
+        salle.save()
+        self.assertFalse(default_storage.exists(name))
+
+        salle.picture = ''
+        salle.save()
+        self.assertEqual(Salle.objects.get(pk=salle.pk).picture_renditions, {})
+
+    def test_templates_use_srcset(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1', picture=self.upload())
+        response = self.client.get(reverse('salle_detail', args=[salle.pk]))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '-detail.jpg')
+        self.assertContains(response, ' 1600w')
+        self.assertNotContains(response, salle.picture.url)
+        response = self.client.get(reverse('salle_list'))
+        self.assertContains(response, '-thumb.jpg')
+
+    def test_backfill_command(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1', picture=self.upload())
+        Salle.objects.filter(pk=salle.pk).update(picture_renditions={})
+        out = StringIO()
+        call_command('build_picture_renditions', stdout=out)
+        self.assertIn('1 photo(s) traitée(s)', out.getvalue())
+        self.assertIn('thumb', Salle.objects.get(pk=salle.pk).picture_renditions)
+
+
+class MediaStorageTest(PatrimoineTestCase):
+    """Photos nommées d'après leur contenu et nettoyage des fichiers orphelins"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def upload(self, color='red', name='photo.JPG'):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root).replace(os.sep, '/')
+            for directory, _dirs, names in os.walk(self.media_root) for name in names
+        )
+
+    def clean(self, *args):
+        out = StringIO()
+        call_command('clean_media', '--min-age', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_same_content_stored_once(self):
+        first = Salle.objects.create(type_salle='reunion', nom='S1', picture=self.upload())
+        second = Salle.objects.create(type_salle='reunion', nom='S2', picture=self.upload(name='copie.jpg'))
+        self.assertEqual(first.picture.name, second.picture.name)
+        self.assertRegex(first.picture.name, r'^salles/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        pictures = [name for name in self.files() if not name.startswith('salles/renditions/')]
+        self.assertEqual(pictures, [first.picture.name])
+
+    def test_orphans_listed_then_deleted(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1', picture=self.upload())
+        Salle.objects.create(type_salle='reunion', nom='S2', picture=self.upload())
+        other = Salle.objects.create(type_salle='reunion', nom='S3', picture=self.upload(color='blue'))
+        old_name = other.picture.name
+        other.picture = self.upload(color='green')
+        other.save()
+
+        output = self.clean()
+        self.assertIn(old_name, output)
+        self.assertNotIn(salle.picture.name, output)
+        self.assertIn(old_name, self.files())  # sans --delete : rien n'est supprimé
+
+        self.clean('--delete')
+        files = self.files()
+        self.assertNotIn(old_name, files)
+        for kept in Salle.objects.all():
+            self.assertIn(kept.picture.name, files)
+            self.assertIn(kept.picture_renditions['thumb']['webp'], files)
+        self.assertIn('0 fichier(s) orphelin(s)', self.clean('--delete'))
+
+    def test_recent_files_kept(self):
+        default_storage.save('envoi_en_cours.jpg', ContentFile(b'x'))
+        out = StringIO()
+        call_command('clean_media', '--delete', stdout=out)
+        self.assertIn('envoi_en_cours.jpg', self.files())
+
+    def test_rehash_legacy_copies(self):
+        data = self.upload().read()
+        legacy = [default_storage.save(name, ContentFile(data)) for name in ('logo.jpg', 'logo.jpg')]
+        self.assertNotEqual(legacy[0], legacy[1])
+        for index, name in enumerate(legacy):
+            salle = Salle.objects.create(type_salle='reunion', nom=f'S{index}')
+            Salle.objects.filter(pk=salle.pk).update(picture=name)
+
+        output = self.clean('--rehash', '--delete')
+        self.assertIn('2 référence(s) renommée(s)', output)
+        names = set(Salle.objects.values_list('picture', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(self.files(), sorted(names))
+
+
+class InventoryExportTest(PatrimoineTestCase):
+    """Exports CSV / XLSX en flux"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.salle = Salle.objects.create(type_salle='reunion', nom='S1', capacite=10)
+        cls.bureau = Bureau.objects.create(type_bureau='box', nom='B1')
+        Materiel.objects.create(salle=cls.salle, nom='PC', quantite=2, prix_unitaire=Decimal('100.50'))
+        Materiel.objects.create(salle=cls.salle, nom='Écran', quantite=3, etat='hs')
+        Materiel.objects.create(bureau=cls.bureau, nom='Imprimante, laser')
+
+    def read_csv(self, response):
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(content.splitlines()))
+
+    def test_materiels_csv(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('export', args=['materiels', 'csv']))
+            rows = self.read_csv(response)
+        self.assertIn('attachment; filename="materiels-', response['Content-Disposition'])
+        self.assertEqual(rows[0][:3], ['ID', 'Nom', 'État'])
+        by_name = {row[1]: row for row in rows[1:]}
+        self.assertEqual(by_name['PC'][4:6], ['100.50', '201.00'])
+        self.assertEqual(by_name['PC'][8], 'Salle: S1')
+        self.assertEqual(by_name['Écran'][2], 'Hors service')
+        self.assertEqual(by_name['Imprimante, laser'][8], 'Bureau: B1')
+
+    def test_filters_applied(self):
+        response = self.client.get(reverse('export', args=['materiels', 'csv']), {'etat': 'hs'})
+        self.assertEqual([row[1] for row in self.read_csv(response)[1:]], ['Écran'])
+
+    def test_search_applied(self):
+        for params in ({'search': 'imprim'}, {'recherche': 'imprim'}):
+            response = self.client.get(reverse('export', args=['materiels', 'csv']), params)
+            self.assertEqual([row[1] for row in self.read_csv(response)[1:]], ['Imprimante, laser'])
+
+    def test_room_counts(self):
+        rows = self.read_csv(self.client.get(reverse('export', args=['salles', 'csv'])))
+        self.assertEqual(rows[1][1], 'S1')
+        self.assertEqual(rows[1][-3:], ['oui', '2', '5'])
+        rows = self.read_csv(self.client.get(reverse('export', args=['bureaux', 'csv'])))
+        self.assertEqual(rows[1][-2:], ['1', '1'])
+
+    def test_xlsx(self):
+        response = self.client.get(reverse('export', args=['salles', 'xlsx']))
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIn('xl/workbook.xml', archive.namelist())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('<t>Nombre de matériels</t>', sheet)
+        self.assertIn('<t>S1</t>', sheet)
+        self.assertIn('<c><v>10</v></c>', sheet)
+
+    def test_xlsx_control_characters_removed(self):
+        Salle.objects.create(type_salle='reunion', nom='S\x0b2\x00')
+        response = self.client.get(reverse('export', args=['salles', 'xlsx']))
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        self.assertIn('S2', [cell.text for cell in sheet.iter(f'{namespace}t')])
+
+    def test_unknown_export(self):
+        self.assertEqual(self.client.get(reverse('export', args=['salles', 'pdf'])).status_code, 404)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_inventory', 'materiels', '--chunk-size', '1', stdout=out)
+        self.assertEqual(len(out.getvalue().strip().splitlines()), 4)
+        with tempfile.NamedTemporaryFile(suffix='.xlsx') as output:
+            call_command('export_inventory', 'bureaux', '--format', 'xlsx', '-o', output.name, stdout=StringIO())
+            self.assertTrue(zipfile.is_zipfile(output.name))
+
+
+class InventoryImportTest(PatrimoineTestCase):
+    """Import en masse (bulk_create) avec rapport d'erreurs par ligne"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.salle = Salle.objects.create(type_salle='reunion', nom='Salle A')
+        cls.bureau = Bureau.objects.create(type_bureau='box', nom='Bureau B')
+
+    def csv_file(self, text, name='import.csv'):
+        return SimpleUploadedFile(name, text.encode('utf-8-sig'), content_type='text/csv')
+
+    def test_import_csv(self):
+        content = (
+            'nom;salle;bureau;quantite;etat;prix_unitaire;date_acquisition\n'
+            'PC;salle a;;2;Hors service;100,50;31/12/2024\n'
+            'Écran;;Bureau B;;;;\n'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('materiel_import'), {'fichier': self.csv_file(content)})
+        self.assertContains(response, '2 matériel(s) importé(s)')
+        pc = Materiel.objects.get(nom='PC')
+        self.assertEqual((pc.salle, pc.quantite, pc.etat), (self.salle, 2, 'hs'))
+        self.assertEqual(pc.prix_unitaire, Decimal('100.50'))
+        self.assertEqual(pc.date_acquisition.isoformat(), '2024-12-31')
+        ecran = Materiel.objects.get(nom='Écran')
+        self.assertEqual((ecran.bureau, ecran.quantite, ecran.etat), (self.bureau, 1, 'bon'))
+        # Données dérivées mises à jour par bulk_created
+        self.assertEqual(verify_snapshot(), [])
+        self.assertEqual(get_snapshot_stats().materiels.total, 2)
+        queryset, _ordering = search_queryset(Materiel.objects.all(), 'ecran')
+        self.assertEqual(list(queryset), [ecran])
+
+    def test_batched_inserts(self):
+        content = 'nom,salle\n' + ''.join(f'M{i},Salle A\n' for i in range(25))
+        with CaptureQueriesContext(connection) as context:
+            call_command('import_inventory', self.write(content), '--batch-size', '10', stdout=StringIO())
+        inserts = [q for q in context.captured_queries if q['sql'].startswith('INSERT INTO "patrimoine_materiel"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(Materiel.objects.count(), 25)
+
+    def write(self, content, suffix='.csv'):
+        file = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        file.write(content)
+        file.close()
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_errors_reported_per_row(self):
+        content = (
+            'nom,salle,bureau,quantite,prix_unitaire,etat\n'
+            'OK,Salle A,,1,10,bon\n'
+            'Deux lieux,Salle A,Bureau B,1,,\n'
+            'Sans lieu,,,1,,\n'
+            'Inconnue,Salle Z,,1,,\n'
+            'Quantité,Salle A,,-1,,\n'
+            'Trop,Salle A,,20000,,\n'
+            'Prix,Salle A,,1,abc,\n'
+            'État,Salle A,,1,,cassé\n'
+        )
+        report = self.import_text(content)
+        self.assertEqual(report.total, 8)
+        self.assertEqual(report.created, 0)
+        self.assertEqual(report.invalid_lines, [3, 4, 5, 6, 7, 8, 9])
+        columns = {error.line: error.column for error in report.errors}
+        self.assertEqual(columns, {3: 'localisation', 4: 'localisation', 5: 'salle', 6: 'quantite',
+                                   7: 'quantite', 8: 'prix_unitaire', 9: 'etat'})
+        self.assertFalse(Materiel.objects.exists())
+
+        report = self.import_text(content, partial=True)
+        self.assertEqual(report.created, 1)
+        self.assertEqual(list(Materiel.objects.values_list('nom', flat=True)), ['OK'])
+
+    def import_text(self, content, **options):
+        return import_materiels(BytesIO(content.encode()), 'csv', **options)
+
+    def test_dry_run(self):
+        report = self.import_text('nom,salle\nPC,Salle A\n', dry_run=True)
+        self.assertTrue(report.ok)
+        self.assertEqual(report.created, 0)
+        self.assertFalse(Materiel.objects.exists())
+
+    def test_export_round_trip(self):
+        Materiel.objects.create(salle=self.salle, nom='PC', quantite=3, etat='moyen',
+                                prix_unitaire=Decimal('12.00'))
+        Materiel.objects.create(bureau=self.bureau, nom='Lampe')
+        # Chaque import double l'inventaire : 2, puis 4 lignes exportées
+        for fmt, count in (('csv', 2), ('xlsx', 4)):
+            with self.subTest(fmt=fmt):
+                response = self.client.get(reverse('export', args=['materiels', fmt]))
+                data = b''.join(response.streaming_content)
+                upload = SimpleUploadedFile(f'export.{fmt}', data)
+                response = self.client.post(reverse('materiel_import'), {'fichier': upload})
+                self.assertContains(response, f'{count} matériel(s) importé(s)')
+        copies = Materiel.objects.filter(nom='PC')
+        self.assertEqual(
+            set(copies.values_list('salle', 'quantite', 'etat', 'prix_unitaire')),
+            {(self.salle.pk, 3, 'moyen', Decimal('12.00'))},
+        )
+        self.assertEqual(Materiel.objects.filter(nom='Lampe', bureau=self.bureau).count(), 4)
+
+    def test_invalid_file(self):
+        response = self.client.post(reverse('materiel_import'), {'fichier': self.csv_file('a,b', 'x.pdf')})
+        self.assertContains(response, 'Format non pris en charge')
+        response = self.client.post(reverse('materiel_import'), {'fichier': self.csv_file('nom\nPC\n')})
+        self.assertContains(response, 'manquante')
+
+
+class MaterielBulkUpdateTest(PatrimoineTestCase):
+    """Changements d'état et déplacements en une requête UPDATE"""
+
+    def setUp(self):
+        self.salle = Salle.objects.create(type_salle='reunion', nom='Salle A')
+        self.bureau = Bureau.objects.create(type_bureau='box', nom='Bureau B')
+        self.autre_bureau = Bureau.objects.create(type_bureau='box', nom='Bureau C')
+        self.projecteurs = [
+            Materiel.objects.create(salle=self.salle, nom=f'Projecteur {i}', prix_unitaire=10)
+            for i in range(3)
+        ]
+        self.chaises = [Materiel.objects.create(bureau=self.bureau, nom=f'Chaise {i}') for i in range(4)]
+        get_snapshot_stats()
+
+    def test_etat_change_single_update(self):
+        before = Materiel.objects.get(pk=self.projecteurs[0].pk).date_modification
+        ids = [materiel.pk for materiel in self.projecteurs[:2]]
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                count = update_materiels(Materiel.objects.filter(pk__in=ids), etat='hs')
+        self.assertEqual(count, 2)
+        updates = [q for q in context.captured_queries if q['sql'].startswith('UPDATE "patrimoine_materiel"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(set(Materiel.objects.filter(etat='hs').values_list('pk', flat=True)), set(ids))
+        self.assertGreater(Materiel.objects.get(pk=ids[0]).date_modification, before)
+        self.assertEqual(verify_snapshot(), [])
+        self.assertEqual(get_snapshot_stats().materiels.total, 7)
+        queryset, _ordering = search_queryset(Materiel.objects.all(), 'hors service')
+        self.assertEqual(set(queryset.values_list('pk', flat=True)), set(ids))
+
+    @override_settings(PATRIMOINE_BULK_UPDATE_BATCH_SIZE=2)
+    def test_large_selection_in_batches(self):
+        received = []
+        handler = lambda sender, **kwargs: received.append(kwargs)
+        bulk_updated.connect(handler, sender=Materiel)
+        self.addCleanup(bulk_updated.disconnect, handler, sender=Materiel)
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                count = update_materiels(Materiel.objects.filter(etat='bon'), etat='hs')
+        self.assertEqual(count, 7)
+        # Lectures par lots, un seul UPDATE, une seule mise à jour de l'instantané
+        updates = [q['sql'] for q in context.captured_queries if q['sql'].startswith('UPDATE "patrimoine_materiel"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn(' IN (', updates[0])
+        snapshot = [q for q in context.captured_queries if q['sql'].startswith('UPDATE "patrimoine_patrimoinestats"')]
+        self.assertEqual(len(snapshot), 1)
+        self.assertEqual(len(received), 1)
+        self.assertEqual(HistoriqueMateriel.objects.filter(action='m').count(), 7)
+        self.assertFalse(Materiel.objects.exclude(etat='hs').exists())
+        self.assertEqual(verify_snapshot(), [])
+
+    def test_relocation_keeps_invariant(self):
+        update_materiels(Materiel.objects.filter(bureau=self.bureau), salle=self.salle)
+        self.assertEqual(Materiel.objects.filter(salle=self.salle, bureau__isnull=True).count(), 7)
+        update_materiels(Materiel.objects.filter(salle=self.salle), bureau=self.autre_bureau)
+        self.assertEqual(Materiel.objects.filter(bureau=self.autre_bureau, salle__isnull=True).count(), 7)
+        self.assertEqual(verify_snapshot(), [])
+        with self.assertRaises(ValidationError):
+            update_materiels(Materiel.objects.all(), salle=self.salle, bureau=self.bureau)
+        with self.assertRaises(ValidationError):
+            update_materiels(Materiel.objects.all())
+
+    def test_one_aggregated_signal(self):
+        received = []
+        handler = lambda sender, **kwargs: received.append(kwargs)
+        post_save.connect(handler, sender=Materiel)
+        bulk_updated.connect(handler, sender=Materiel)
+        try:
+            update_materiels(Materiel.objects.all(), etat='moyen')
+        finally:
+            post_save.disconnect(handler, sender=Materiel)
+            bulk_updated.disconnect(handler, sender=Materiel)
+        self.assertEqual(len(received), 1)
+        self.assertEqual(len(received[0]['update']), 7)
+        self.assertEqual(received[0]['update'].changes, {'etat': 'moyen'})
+
+    def test_cache_scopes_invalidated(self):
+        scope = f'detail:bureau:{self.bureau.pk}'
+        before = page_cache.get_versions(scope)
+        update_materiels(Materiel.objects.filter(bureau=self.bureau), bureau=self.autre_bureau)
+        self.assertNotEqual(page_cache.get_versions(scope), before)
+
+    def test_form_view(self):
+        ids = [materiel.pk for materiel in self.chaises[:2]]
+        response = self.client.get(reverse('materiel_bulk'), {'ids': ids})
+        self.assertContains(response, '2 matériel(s) sélectionné(s)')
+        response = self.client.post(reverse('materiel_bulk'), {'ids': ids, 'salle': self.salle.pk})
+        self.assertRedirects(response, reverse('materiel_list'))
+        self.assertEqual(Materiel.objects.filter(salle=self.salle).count(), 5)
+
+        response = self.client.post(reverse('materiel_bulk'), {'ids': ids, 'salle': self.salle.pk,
+                                                               'bureau': self.bureau.pk})
+        self.assertContains(response, 'à la fois à une salle et à un bureau')
+
+    def test_json_api(self):
+        url = reverse('materiel_bulk_api')
+        response = self.client.post(url, {'depuis_bureau': self.bureau.pk, 'bureau': self.autre_bureau.pk,
+                                           'etat': 'mauvais'}, content_type='application/json')
+        self.assertEqual(response.json(), {'updated': 4})
+        self.assertEqual(Materiel.objects.filter(bureau=self.autre_bureau, etat='mauvais').count(), 4)
+        response = self.client.post(url, {'ids': [self.projecteurs[0].pk]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+
+class JsonApiTest(PatrimoineTestCase):
+    """API JSON : champs choisis, inclusion du matériel, pagination par curseur"""
+
+    def add_salles(self, count):
+        for i in range(count):
+            salle = Salle.objects.create(type_salle='reunion', nom=f'Salle {i}')
+            for j in range(3):
+                Materiel.objects.create(salle=salle, nom=f'M{i}-{j}', prix_unitaire=Decimal('1.50'))
+
+    def test_sparse_fields(self):
+        self.add_salles(1)
+        response = self.client.get(reverse('api_list', args=['materiels']), {'fields': 'nom,prix_unitaire'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        row = response.json()['results'][0]
+        self.assertEqual(row, {'id': row['id'], 'nom': 'M0-0', 'prix_unitaire': '1.50'})
+        response = self.client.get(reverse('api_list', args=['materiels']), {'fields': 'nom,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+
+    def test_include_constant_queries(self):
+        url = reverse('api_list', args=['salles'])
+        params = {'include': 'materiels', 'fields': 'nom', 'fields[materiels]': 'nom,etat'}
+        self.add_salles(2)
+        # État (ETag), page des salles, matériel de la page
+        with self.assertNumQueries(3):
+            self.client.get(url, params)
+        self.add_salles(20)
+        with self.assertNumQueries(3):
+            results = self.client.get(url, params).json()['results']
+        self.assertEqual(len(results), 22)
+        first = next(row for row in results if row['nom'] == 'Salle 0')
+        self.assertEqual([m['nom'] for m in first['materiels']], ['M0-0', 'M0-1', 'M0-2'])
+        self.assertEqual(set(first['materiels'][0]), {'id', 'nom', 'etat'})
+        response = self.client.get(reverse('api_list', args=['materiels']), {'include': 'materiels'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination(self):
+        self.add_salles(4)
+        url = reverse('api_list', args=['materiels'])
+        seen = []
+        query = {'page_size': 5, 'fields': 'id'}
+        response = self.client.get(url, query)
+        while True:
+            data = response.json()
+            seen += [row['id'] for row in data['results']]
+            if not data['next']:
+                break
+            response = self.client.get(url + data['next'])
+        self.assertEqual(seen, sorted(Materiel.objects.values_list('id', flat=True)))
+
+    def test_filters_and_detail(self):
+        self.add_salles(2)
+        Materiel.objects.filter(nom='M1-2').update(etat='hs')
+        response = self.client.get(reverse('api_list', args=['materiels']), {'etat': 'hs', 'fields': 'nom'})
+        self.assertEqual([row['nom'] for row in response.json()['results']], ['M1-2'])
+
+        salle = Salle.objects.get(nom='Salle 1')
+        response = self.client.get(reverse('api_detail', args=['salles', salle.pk]), {'include': 'materiels'})
+        data = response.json()
+        self.assertEqual(data['nom'], 'Salle 1')
+        self.assertIsNone(data['picture'])
+        self.assertEqual(len(data['materiels']), 3)
+        self.assertEqual(self.client.get(reverse('api_detail', args=['salles', 999])).status_code, 404)
+        self.assertEqual(self.client.get('/api/inconnu/').status_code, 404)
+
+
+@override_settings(PATRIMOINE_SYNC_LAG=0)
+class SyncTest(PatrimoineTestCase):
+    """Synchronisation incrémentale : changements et suppressions depuis un jeton"""
+
+    def sync(self, token=None, **params):
+        if token:
+            params['since'] = token
+        response = self.client.get(reverse('sync'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_initial_then_changes(self):
+        bureau = Bureau.objects.create(type_bureau='box', nom='B1')
+        salle = Salle.objects.create(type_salle='reunion', nom='S1')
+        Materiel.objects.create(salle=salle, nom='M1')
+        data = self.sync()
+        self.assertEqual([row['nom'] for row in data['bureaux']], ['B1'])
+        self.assertEqual([row['nom'] for row in data['materiels']], ['M1'])
+        self.assertFalse(data['has_more'])
+
+        # Rien de nouveau : réponse vide, jeton inchangé
+        empty = self.sync(data['token'])
+        self.assertEqual(empty['bureaux'] + empty['salles'] + empty['materiels'], [])
+        self.assertEqual(empty['token'], data['token'])
+
+        bureau.nom = 'B1 bis'
+        bureau.save()
+        Materiel.objects.create(bureau=bureau, nom='M2')
+        changes = self.sync(data['token'])
+        self.assertEqual([row['nom'] for row in changes['bureaux']], ['B1 bis'])
+        self.assertEqual(changes['salles'], [])
+        self.assertEqual([row['nom'] for row in changes['materiels']], ['M2'])
+        self.assertEqual(changes['materiels'][0]['bureau'], bureau.pk)
+
+    def test_deletions_with_cascade(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1')
+        ids = [Materiel.objects.create(salle=salle, nom=f'M{i}').pk for i in range(3)]
+        salle_id = salle.pk
+        token = self.sync()['token']
+        salle.delete()
+        self.assertEqual(Suppression.objects.filter(modele='materiel').count(), 3)
+        changes = self.sync(token)
+        self.assertEqual(changes['suppressions']['salles'], [salle_id])
+        self.assertEqual(sorted(changes['suppressions']['materiels']), ids)
+        self.assertEqual(changes['materiels'], [])
+        # Déjà transmises : plus renvoyées
+        self.assertEqual(self.sync(changes['token'])['suppressions']['materiels'], [])
+
+    def test_bulk_update_paginated(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1')
+        for i in range(5):
+            Materiel.objects.create(salle=salle, nom=f'M{i}')
+        token = self.sync()['token']
+        # Même date_modification pour toutes les lignes : départagées par l'id
+        update_materiels(Materiel.objects.all(), etat='hs')
+        seen = []
+        while True:
+            data = self.sync(token, page_size=2)
+            seen += [row['id'] for row in data['materiels']]
+            self.assertTrue(all(row['etat'] == 'hs' for row in data['materiels']))
+            token = data['token']
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, sorted(Materiel.objects.values_list('id', flat=True)))
+
+    def test_queries_and_invalid_token(self):
+        token = self.sync()['token']
+        Materiel.objects.create(nom='M1')
+        # Une requête par table et une pour les suppressions
+        with self.assertNumQueries(4):
+            self.sync(token)
+        response = self.client.get(reverse('sync'), {'since': 'invalide'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_lag(self):
+        token = self.sync()['token']
+        Materiel.objects.create(nom='M1')
+        with override_settings(PATRIMOINE_SYNC_LAG=60):
+            data = self.sync(token)
+        self.assertEqual(data['materiels'], [])
+        self.assertEqual(len(self.sync(data['token'])['materiels']), 1)
+
+
+class DatabaseSettingsTest(TestCase):
+    """Profils de base de données choisis par l'environnement et PRAGMA SQLite"""
+
+    def test_profiles(self):
+        sqlite = database_settings(Path('/srv'), {})['default']
+        self.assertEqual(sqlite['NAME'], Path('/srv/db.sqlite3'))
+        self.assertEqual(sqlite['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+
+        postgresql = database_settings(Path('/srv'), {
+            'PATRIMOINE_DB_ENGINE': 'postgresql',
+            'PATRIMOINE_DB_NAME': 'inventaire',
+            'PATRIMOINE_DB_CONN_MAX_AGE': '60',
+            'PATRIMOINE_DB_DISABLE_SERVER_SIDE_CURSORS': '1',
+        })['default']
+        self.assertEqual(postgresql['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(postgresql['NAME'], 'inventaire')
+        self.assertEqual(postgresql['CONN_MAX_AGE'], 60)
+        self.assertTrue(postgresql['CONN_HEALTH_CHECKS'])
+        self.assertTrue(postgresql['DISABLE_SERVER_SIDE_CURSORS'])
+
+        with self.assertRaises(ValueError):
+            database_settings(Path('/srv'), {'PATRIMOINE_DB_ENGINE': 'oracle'})
+
+    @skipUnless(connection.vendor == 'sqlite', "PRAGMA propres à SQLite")
+    def test_sqlite_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+class BenchmarkTest(PatrimoineTestCase):
+    """Jeu de données généré et mesures par route"""
+
+    def test_generate_inventory(self):
+        generate_inventory(*scale_counts(200), seed=1, batch_size=50)
+        self.assertEqual(Materiel.objects.count(), 200)
+        self.assertEqual(Salle.objects.count(), 5)
+        self.assertEqual(Bureau.objects.count(), 8)
+        etats = set(Materiel.objects.values_list('etat', flat=True))
+        self.assertLessEqual(etats, set(dict(Materiel.ETAT_CHOICES)))
+        self.assertIn('bon', etats)
+        self.assertTrue(Materiel.objects.filter(salle__isnull=False, bureau__isnull=True).exists())
+        self.assertFalse(Materiel.objects.filter(salle__isnull=False, bureau__isnull=False).exists())
+        self.assertEqual(verify_snapshot(), [])
+        self.assertEqual(get_snapshot_stats().materiels.total, 200)
+
+    def test_measure_routes(self):
+        generate_inventory(*scale_counts(40))
+        results = measure_routes(repeat=2, names={'dashboard', 'materiel_list', 'salle_detail'}, client=self.client)
+        self.assertEqual(set(results), {'dashboard', 'materiel_list', 'salle_detail'})
+        data = results['salle_detail']
+        self.assertEqual(data['status'], 200)
+        self.assertEqual(data['url'], reverse('salle_detail', args=[Salle.objects.order_by('id').first().pk]))
+        self.assertGreater(data['queries'], 0)
+        self.assertGreater(data['bytes'], 0)
+        self.assertLessEqual(data['p50_ms'], data['p95_ms'])
+
+    def test_compare(self):
+        baseline = {'1k': {'home': {'p50_ms': 2.0, 'p95_ms': 3.0, 'queries': 5, 'bytes': 1000}}}
+        same = {'1k': {'home': {'p50_ms': 2.5, 'p95_ms': 3.5, 'queries': 5, 'bytes': 1100}}}
+        self.assertEqual(compare(same, baseline), [])
+        slower = {'1k': {'home': {'p50_ms': 2.0, 'p95_ms': 9.0, 'queries': 6, 'bytes': 1000}}}
+        self.assertEqual(compare(slower, baseline), [
+            ('1k', 'home', 'p95_ms', 3.0, 9.0),
+            ('1k', 'home', 'queries', 5, 6),
+        ])
+
+
+class AsyncViewsTest(PatrimoineTestCase):
+    """Vues asynchrones (ASGI) : mêmes pages que les vues synchrones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.salle = Salle.objects.create(type_salle='reunion', nom='S1', surface=20, capacite=8)
+        cls.bureau = Bureau.objects.create(type_bureau='open', nom='B1')
+        cls.materiel = Materiel.objects.create(
+            nom='Projecteur', salle=cls.salle, quantite=2, prix_unitaire=Decimal('10.50'),
+        )
+        Materiel.objects.create(nom='Chaise', bureau=cls.bureau, etat='hs')
+
+    def urls(self):
+        return [
+            reverse('dashboard'),
+            reverse('materiel_list'),
+            reverse('materiel_hs'),
+            reverse('salle_list') + '?search=S1',
+            reverse('bureau_list'),
+            reverse('materiel_detail', args=[self.materiel.pk]),
+            reverse('salle_detail', args=[self.salle.pk]),
+            reverse('bureau_detail', args=[self.bureau.pk]),
+        ]
+
+    async def test_same_pages_as_sync_views(self):
+        expected = {url: await self.async_client.get(url) for url in self.urls()}
+        with use_async_views(True):
+            for url, sync_response in expected.items():
+                with self.subTest(url=url):
+                    self.assertTrue(iscoroutinefunction(resolve(url.split('?')[0]).func))
+                    response = await self.async_client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.content, sync_response.content)
+        self.assertFalse(iscoroutinefunction(resolve(reverse('dashboard')).func))
+
+    async def test_not_found_and_not_modified(self):
+        with use_async_views(True):
+            response = await self.async_client.get(reverse('salle_detail', args=[self.salle.pk + 100]))
+            self.assertEqual(response.status_code, 404)
+
+            url = reverse('bureau_detail', args=[self.bureau.pk])
+            response = await self.async_client.get(url)
+            self.assertIn('no-cache', response['Cache-Control'])
+            response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    async def test_large_list_streamed_asynchronously(self):
+        count = ROWS_CHUNK_SIZE + 10
+        await Materiel.objects.abulk_create(Materiel(nom=f'M{i:04d}') for i in range(count))
+        with use_async_views(True):
+            response = await self.async_client.get(reverse('materiel_list'), {'page_size': count})
+        self.assertTrue(response.streaming)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(content.count('name="ids"'), count)
+        self.assertIn('</html>', content)
+
+    async def test_server_timing_counts_queries(self):
+        with use_async_views(True):
+            response = await self.async_client.get(reverse('salle_detail', args=[self.salle.pk]))
+        queries = int(re.search(r'SQL x(\d+)', response['Server-Timing']).group(1))
+        # État (ETag), salle et matériels
+        self.assertGreaterEqual(queries, 3)
+
+
+class PerformanceMiddlewareTest(PatrimoineTestCase):
+    """Mesures par requête : en-tête Server-Timing, requêtes répétées, tampon par route"""
+
+    def setUp(self):
+        perf.clear_samples()
+
+    def test_server_timing_and_sample(self):
+        Salle.objects.create(type_salle='reunion', nom='S1')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('salle_list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="SQL x\d+", tpl;dur=[\d.]+')
+        self.assertIn(f'"SQL x{len(queries)}"', timing)
+        sample = perf.get_samples()[-1]
+        self.assertEqual(sample['route'], 'salle_list')
+        self.assertEqual(sample['queries'], len(queries))
+        self.assertGreater(sample['template_ms'], 0)
+        self.assertEqual(sample['duplicates'], [])
+
+    def test_duplicates(self):
+        metrics = perf.RequestMetrics()
+
+        def execute(sql, params, many, context):
+            return None
+
+        for pk in range(4):
+            metrics(execute, 'SELECT * FROM patrimoine_salle WHERE id = %s', [pk], False, {})
+        metrics(execute, 'SELECT 1', [], False, {})
+        self.assertEqual(metrics.queries, 5)
+        self.assertEqual(metrics.duplicates(), [('SELECT * FROM patrimoine_salle WHERE id = %s', 4)])
+
+    @override_settings(PATRIMOINE_PERF_SAMPLE_RATE=0)
+    def test_sampling(self):
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(perf.get_samples(), [])
+
+    def test_report_for_staff_only(self):
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('dashboard'))
+        response = self.client.get(reverse('perf_report'))
+        self.assertEqual(response.status_code, 302)
+
+        staff = User.objects.create_user('admin', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        data = self.client.get(reverse('perf_report')).json()
+        dashboard = data['routes']['dashboard']
+        self.assertEqual(dashboard['count'], 2)
+        self.assertEqual(sum(dashboard['histogram'].values()), 2)
+        self.assertLessEqual(dashboard['p50_ms'], dashboard['max_ms'])
+
+
+class LocationAutocompleteTest(PatrimoineTestCase):
+    """Localisation du matériel : suggestions par recherche, libellés en cache"""
+
+    def test_form_page_does_not_list_locations(self):
+        for i in range(30):
+            Salle.objects.create(type_salle='reunion', nom=f'Salle {i}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('materiel_create'))
+        content = response.content.decode()
+        self.assertNotIn('Salle 29', content)
+        self.assertNotIn('<option value="', content.split('name="etat"')[0])
+        self.assertIn(reverse('location_search', args=['salles']), content)
+        self.assertIn('js/location_autocomplete.js', content)
+        self.assertLessEqual(len(queries), 1)
+
+    def test_update_shows_label_and_post_saves(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='Salle Bleue')
+        materiel = Materiel.objects.create(salle=salle, nom='Chaise')
+        response = self.client.get(reverse('materiel_update', args=[materiel.pk]))
+        self.assertContains(response, 'value="Salle Bleue"')
+
+        bureau = Bureau.objects.create(type_bureau='box', nom='B1')
+        response = self.client.post(reverse('materiel_update', args=[materiel.pk]), {
+            'bureau': bureau.pk, 'nom': 'Chaise', 'quantite': 1, 'etat': 'bon',
+        })
+        self.assertEqual(response.status_code, 302)
+        materiel.refresh_from_db()
+        self.assertEqual((materiel.salle_id, materiel.bureau_id), (None, bureau.pk))
+
+    def test_search_endpoint(self):
+        Salle.objects.create(type_salle='reunion', nom='Salle Bleue')
+        Salle.objects.create(type_salle='formation', nom='Salle Verte')
+        Salle.objects.create(type_salle='conference', nom='')
+        url = reverse('location_search', args=['salles'])
+        results = self.client.get(url, {'q': 'ver'}).json()['results']
+        self.assertEqual([item['label'] for item in results], ['Salle Verte'])
+        labels = [item['label'] for item in self.client.get(url).json()['results']]
+        self.assertEqual(sorted(labels), ['Salle Bleue', 'Salle Verte', 'Salle conference'])
+        self.assertEqual(self.client.get(reverse('location_search', args=['materiels'])).status_code, 404)
+
+    @override_settings(PATRIMOINE_CACHE_TIMEOUT=300)
+    def test_labels_cached_and_invalidated(self):
+        cache.clear()
+        salle = Salle.objects.create(type_salle='reunion', nom='Salle Bleue')
+        self.assertEqual(location_labels(Salle), {salle.pk: 'Salle Bleue'})
+        with self.assertNumQueries(0):
+            location_labels(Salle)
+        salle.nom = 'Salle Rouge'
+        salle.save()
+        self.assertEqual(location_labels(Salle), {salle.pk: 'Salle Rouge'})
+        # Autre champ : la table reste valable
+        salle.capacite = 12
+        salle.save()
+        with self.assertNumQueries(0):
+            location_labels(Salle)
+        salle.delete()
+        self.assertEqual(location_labels(Salle), {})
+
+
+class MaterielHistoryTest(PatrimoineTestCase):
+    """Journal du matériel : écriture par lots, état et valeur à une date"""
+
+    def entries(self, **filters):
+        return list(HistoriqueMateriel.objects.filter(**filters).order_by('id').values_list('action', 'changements'))
+
+    def test_only_changed_fields(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            materiel = Materiel.objects.create(nom='Chaise', quantite=2, prix_unitaire=Decimal('10.50'))
+        with self.captureOnCommitCallbacks(execute=True):
+            materiel.etat = 'hs'
+            materiel.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            materiel.nom = 'Chaise pliante'  # champ non suivi : pas de ligne
+            materiel.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            materiel.delete()
+        self.assertEqual(self.entries(), [
+            ('c', {'e': 'bon', 'q': 2, 'p': '10.50', 's': None, 'b': None}),
+            ('m', {'e': 'hs'}),
+            ('s', {}),
+        ])
+        deltas = HistoriqueMateriel.objects.order_by('id').values_list('delta_valeur', flat=True)
+        self.assertEqual(list(deltas), [Decimal('21.00'), Decimal('0'), Decimal('-21.00')])
+
+    def test_state_at_date(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            materiel = Materiel.objects.create(nom='Écran', quantite=1, prix_unitaire=Decimal('100'))
+        created = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            materiel.quantite = 3
+            materiel.save()
+        self.assertEqual(materiel_state(materiel.pk, created)['quantite'], 1)
+        state = materiel_state(materiel.pk, timezone.now())
+        self.assertEqual((state['quantite'], state['prix_unitaire']), (3, Decimal('100')))
+        self.assertIsNone(materiel_state(materiel.pk, created - timedelta(days=1)))
+
+        response = self.client.get(reverse('materiel_history_state', args=[materiel.pk]))
+        self.assertEqual(response.json()['state']['quantite'], 3)
+        response = self.client.get(reverse('materiel_history_state', args=[materiel.pk]), {'at': 'hier'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cascade_written_in_one_batch(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1')
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                Materiel.objects.create(salle=salle, nom=f'M{i}')
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                salle.delete()
+        inserts = [q for q in queries if q['sql'].startswith('INSERT') and 'historiquemateriel' in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(HistoriqueMateriel.objects.filter(action='s').count(), 5)
+
+    def test_rolled_back_changes_not_recorded(self):
+        materiel = Materiel.objects.create(nom='M')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            materiel.etat = 'hs'
+            materiel.save()
+        self.assertTrue(callbacks)
+        self.assertFalse(HistoriqueMateriel.objects.exists())
+
+    def test_rolled_back_savepoint_keeps_outer_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Materiel.objects.create(nom='A')
+                with self.assertRaises(ValueError):
+                    with transaction.atomic():
+                        Materiel.objects.create(nom='B')
+                        raise ValueError
+        self.assertEqual(list(HistoriqueMateriel.objects.values_list('action', flat=True)), ['c'])
+        self.assertEqual(history._state().committed, [])
+
+    def test_bulk_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ids = [Materiel.objects.create(nom=f'M{i}').pk for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            update_materiels(Materiel.objects.filter(pk__in=ids[:2]), etat='hs')
+        self.assertEqual(self.entries(action='m'), [('m', {'e': 'hs'}), ('m', {'e': 'hs'})])
+
+    def test_append_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Materiel.objects.create(nom='M')
+        entry = HistoriqueMateriel.objects.get()
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+
+    def test_inventory_value_by_month(self):
+        def add(year, month, day, delta):
+            date = datetime(year, month, day, 12, tzinfo=dt_timezone.utc)
+            HistoriqueMateriel.objects.create(
+                materiel_id=1, date=date, mois=year * 100 + month, action='m', delta_valeur=delta,
+            )
+
+        add(2024, 11, 5, 100)
+        add(2024, 12, 20, 50)
+        add(2025, 2, 1, -30)
+        add(2025, 2, 15, 10)
+        at = datetime(2025, 2, 10, tzinfo=dt_timezone.utc)
+        self.assertEqual(inventory_value(at), Decimal('120'))
+        openings = dict(HistoriqueMois.objects.values_list('mois', 'valeur_ouverture'))
+        self.assertEqual(openings, {202412: 100, 202501: 150, 202502: 150})
+        # Ouverture connue : une requête pour elle, une pour les lignes du mois
+        with self.assertNumQueries(2):
+            self.assertEqual(inventory_value(datetime(2025, 2, 28, tzinfo=dt_timezone.utc)), Decimal('130'))
+        self.assertEqual(inventory_value(datetime(2024, 10, 1, tzinfo=dt_timezone.utc)), 0)
+
+        response = self.client.get(reverse('inventory_history_value'), {'at': '2025-01-15T00:00:00+00:00'})
+        self.assertEqual(Decimal(response.json()['valeur']), Decimal('150'))
+
+    def test_commit_after_month_opening(self):
+        def at(day, hour, minute):
+            month = 1 if day == 31 else 2
+            return mock.patch('django.utils.timezone.now', return_value=datetime(2025, month, day, hour, minute, tzinfo=dt_timezone.utc))
+
+        HistoriqueMateriel.objects.create(
+            materiel_id=1, date=datetime(2024, 12, 5, tzinfo=dt_timezone.utc), mois=202412, action='m', delta_valeur=100,
+        )
+        with at(1, 0, 10), self.captureOnCommitCallbacks(execute=True):
+            with at(31, 23, 59):
+                Materiel.objects.create(nom='Écran', quantite=1, prix_unitaire=Decimal('50'))
+            # Début du mois : ouverture pas encore enregistrée
+            with at(1, 0, 2):
+                self.assertEqual(inventory_value(timezone.now()), Decimal('100'))
+                self.assertFalse(HistoriqueMois.objects.filter(mois=202502).exists())
+            # Ouverture de février enregistrée avant la validation
+            self.assertEqual(inventory_value(timezone.now()), Decimal('100'))
+            self.assertEqual(HistoriqueMois.objects.get(mois=202502).valeur_ouverture, 100)
+        # Validée en février : la ligne compte dans février, pas dans janvier
+        entry = HistoriqueMateriel.objects.get(action='c')
+        self.assertEqual((entry.date, entry.mois), (datetime(2025, 2, 1, 0, 10, tzinfo=dt_timezone.utc), 202502))
+        self.assertEqual(inventory_value(datetime(2025, 2, 1, 0, 20, tzinfo=dt_timezone.utc)), Decimal('150'))
+
+
+class JobQueueTest(PatrimoineTestCase):
+    """Tâches de fond : file en base, nouveaux essais, suivi et fichiers résultat"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root, PATRIMOINE_JOB_RETRY_DELAY=0)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def run_workers(self):
+        out = StringIO()
+        call_command('run_workers', '--processes', '1', '--burst', stdout=out)
+        return out.getvalue()
+
+    def test_export_result(self):
+        salle = Salle.objects.create(type_salle='reunion', nom='S1')
+        Materiel.objects.create(nom='PC', salle=salle, etat='hs')
+        Materiel.objects.create(nom='Chaise', etat='bon')
+        response = self.client.post(reverse('export_job', args=['materiels', 'csv']) + '?etat=hs')
+        self.assertEqual(response.status_code, 202)
+        status_url = response['Location']
+        self.assertEqual(self.client.get(status_url).json()['statut'], 'attente')
+        self.assertEqual(self.client.get(reverse('export_job', args=['materiels', 'csv'])).status_code, 405)
+
+        self.assertIn('1 tâche(s) exécutée(s)', self.run_workers())
+        data = self.client.get(status_url).json()
+        self.assertEqual((data['statut'], data['progression'], data['tentatives']), ('terminee', 100, 1))
+        tache = Tache.objects.get()
+        self.assertRegex(tache.resultat.name, r'^taches/resultats/[0-9a-f]{2}/[0-9a-f]{64}\.csv$')
+
+        download = self.client.get(data['resultat'])
+        self.assertIn('attachment; filename="materiels-', download['Content-Disposition'])
+        content = b''.join(download.streaming_content)
+        expected = b''.join(self.client.get(reverse('export', args=['materiels', 'csv']), {'etat': 'hs'}).streaming_content)
+        self.assertEqual(content, expected)
+        # Référencé par la tâche : pas un orphelin pour clean_media
+        out = StringIO()
+        call_command('clean_media', '--min-age', '0', stdout=out)
+        self.assertNotIn(tache.resultat.name, out.getvalue())
+
+    def test_background_import(self):
+        Salle.objects.create(type_salle='reunion', nom='S1')
+        content = 'nom;salle;quantite\nPC;S1;2\nÉcran;S1;x\n'
+        upload = SimpleUploadedFile('inventaire.csv', content.encode('utf-8-sig'), content_type='text/csv')
+        response = self.client.post(reverse('materiel_import'), {'fichier': upload, 'partiel': 'on', 'arriere_plan': 'on'})
+        self.assertEqual(response.status_code, 202)
+        self.assertContains(response, 'data-url="/taches/', status_code=202)
+        self.assertFalse(Materiel.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.run_workers()
+        tache = Tache.objects.get()
+        self.assertEqual(tache.statut, 'terminee', tache.erreur)
+        self.assertEqual((tache.rapport['total'], tache.rapport['created'], tache.rapport['invalid_lines']), (2, 1, 1))
+        self.assertEqual(list(Materiel.objects.values_list('nom', 'quantite')), [('PC', 2)])
+        self.assertEqual(verify_snapshot(), [])
+
+    def test_retries_then_failure(self):
+        def flaky(context, fail_until):
+            if context.tache.tentatives < fail_until:
+                raise RuntimeError('indisponible')
+
+        jobs.JOBS['test_flaky'] = flaky
+        self.addCleanup(jobs.JOBS.pop, 'test_flaky')
+        succeeded = jobs.enqueue('test_flaky', {'fail_until': 3})
+        failed = jobs.enqueue('test_flaky', {'fail_until': 99}, max_tentatives=2)
+        self.run_workers()
+        succeeded.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual((succeeded.statut, succeeded.tentatives), ('terminee', 3))
+        self.assertEqual((failed.statut, failed.tentatives), ('echec', 2))
+        self.assertIn('RuntimeError: indisponible', failed.erreur)
+        self.assertEqual(jobs.status(failed)['erreur'], 'RuntimeError: indisponible')
+
+        # Échec définitif : pas de nouvel essai
+        unknown = jobs.enqueue('export', {'kind': 'inconnu', 'fmt': 'csv'})
+        self.run_workers()
+        unknown.refresh_from_db()
+        self.assertEqual((unknown.statut, unknown.tentatives), ('echec', 1))
+
+    def test_outcome_of_superseded_run_ignored(self):
+        def slow(context):
+            # Reprise par un autre processus pendant l'exécution
+            Tache.objects.filter(pk=context.tache.pk).update(date_maj=timezone.now() - timedelta(hours=1))
+            jobs.requeue_stale()
+            jobs.claim('b')
+            context.progress(50, message='ancienne exécution')
+            raise RuntimeError('trop tard')
+
+        jobs.JOBS['test_slow'] = slow
+        self.addCleanup(jobs.JOBS.pop, 'test_slow')
+        tache = jobs.enqueue('test_slow')
+        jobs.run(jobs.claim('a'))
+        tache.refresh_from_db()
+        self.assertEqual((tache.statut, tache.processus, tache.tentatives, tache.erreur), ('cours', 'b', 2, ''))
+        self.assertNotEqual(tache.message, 'ancienne exécution')
+
+    @override_settings(PATRIMOINE_BACKGROUND_RENDITIONS=True)
+    def test_background_renditions(self):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), 'blue').save(buffer, 'JPEG')
+        picture = SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            salle = Salle.objects.create(type_salle='reunion', nom='S1', picture=picture)
+        self.assertEqual(salle.picture_renditions, {})
+        tache = Tache.objects.get()
+        self.assertEqual(tache.parametres, {'salle_ids': [salle.pk], 'force': True})
+
+        self.run_workers()
+        salle.refresh_from_db()
+        self.assertIn('detail', salle.picture_renditions)
+        self.assertEqual(Tache.objects.get().rapport, {'traitees': 1, 'a_jour': 0, 'illisibles': 0})
+
+    def test_claim_and_stale_recovery(self):
+        tache = jobs.enqueue('rebuild_stats')
+        later = jobs.enqueue('rebuild_stats')
+        Tache.objects.filter(pk=later.pk).update(date_disponible=timezone.now() + timedelta(hours=1))
+        self.assertEqual(jobs.claim('a').pk, tache.pk)
+        self.assertIsNone(jobs.claim('b'))
+
+        # Processus arrêté pendant la tâche : reprise
+        self.assertEqual(jobs.requeue_stale(), 0)
+        Tache.objects.filter(pk=tache.pk).update(date_maj=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        claimed = jobs.claim('b')
+        self.assertEqual((claimed.pk, claimed.processus, claimed.tentatives), (tache.pk, 'b', 2))
+        jobs.run(claimed)
+        self.assertEqual(claimed.rapport, {'ecarts': 0})
+
+        # Exécution rafraîchie par son fil de battement : pas reprise
+        Tache.objects.filter(pk=later.pk).update(date_disponible=timezone.now())
+        running = jobs.claim('c')
+        Tache.objects.filter(pk=later.pk).update(date_maj=timezone.now() - timedelta(hours=1))
+        self.assertTrue(jobs.Heartbeat(running).beat())
+        self.assertEqual(jobs.requeue_stale(), 0)
+        self.assertFalse(jobs.Heartbeat(claimed).beat())
+        Tache.objects.filter(pk=later.pk).update(statut='attente', date_disponible=timezone.now() + timedelta(hours=1))
+
+        Tache.objects.filter(pk=tache.pk).update(date_fin=timezone.now() - timedelta(days=60))
+        self.assertEqual(jobs.purge(), 1)
+        self.assertEqual(list(Tache.objects.values_list('pk', flat=True)), [later.pk])
+
+
+class StaticFilesTest(TestCase):
+    """Statiques avec empreinte, précompressés et servis par l'application"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.static = override_settings(STATIC_ROOT=cls.static_root)
+        cls.static.enable()
+        call_command('collectstatic', interactive=False, verbosity=0, ignore_patterns=['admin'])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.static.disable()
+        shutil.rmtree(cls.static_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_fingerprinted_and_precompressed(self):
+        url = staticfiles_storage.url('css/base.css')
+        self.assertRegex(url, r'^/static/css/base\.[0-9a-f]{12}\.css$')
+        path = os.path.join(self.static_root, url[len('/static/'):])
+        with open(path, 'rb') as original, gzip.open(path + '.gz') as compressed:
+            self.assertEqual(compressed.read(), original.read())
+
+    def test_served_with_far_future_cache(self):
+        url = staticfiles_storage.url('css/base.css')
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(b':root', gzip.decompress(b''.join(response.streaming_content)))
+
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn(b':root', b''.join(plain.streaming_content))
+
+        for accept_encoding in ('gzip;q=0, identity', 'GZIP; Q=0.0', '*;q=0', 'br;q=0'):
+            refused = self.client.get(url, headers={'Accept-Encoding': accept_encoding})
+            self.assertNotIn('Content-Encoding', refused, accept_encoding)
+        wildcard = self.client.get(url, headers={'Accept-Encoding': 'br;q=0, *;q=0.5'})
+        self.assertEqual(wildcard['Content-Encoding'], 'gzip')
+
+        not_modified = self.client.get(url, headers={'If-None-Match': plain['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_unhashed_name_short_cache(self):
+        response = self.client.get('/static/css/base.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.client.get('/static/css/absent.css').status_code, 404)
+
+    def test_templates_use_bundles(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, staticfiles_storage.url('css/home.css'))
+        self.assertNotContains(response, '<style>')
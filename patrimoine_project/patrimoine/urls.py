@@ -1,48 +1,79 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path
-from . import views
+from . import api, async_views, perf, sync, views
+
+# Pages en lecture : vues asynchrones sous ASGI (voir async_views.py)
+pages = async_views if getattr(settings, 'PATRIMOINE_ASYNC_VIEWS', False) else views
 
 urlpatterns = [
 
     path('home', views.home, name='home'),
+    path('home/<str:kind>.json', views.home_items, name='home_items'),
+    path('locations/<str:kind>.json', views.location_search, name='location_search'),
+
+    path('', pages.dashboard, name='dashboard'),
+
+    # API JSON en lecture seule (resource : bureaux, salles, materiels)
+    path('api/<str:resource>/', api.api_list, name='api_list'),
+    path('api/<str:resource>/<int:pk>/', api.api_detail, name='api_detail'),
+
+    # Synchronisation incrémentale (?since=<jeton>)
+    path('sync/', sync.sync_changes, name='sync'),
+
+    # Historique du matériel (?at=<date ISO>)
+    path('historique/materiels/<int:pk>/', views.materiel_history_state, name='materiel_history_state'),
+    path('historique/valeur/', views.inventory_history_value, name='inventory_history_value'),
+
+    # Tâches de fond (voir jobs.py) : statut / progression et fichier résultat
+    path('taches/<int:pk>/', views.job_status, name='job_status'),
+    path('taches/<int:pk>/resultat/', views.job_result, name='job_result'),
+    path('taches/statistiques/', views.rebuild_stats_job, name='rebuild_stats_job'),
+
+    # Mesures de performance par route (équipe d'administration)
+    path('perf/', perf.perf_report, name='perf_report'),
 
-    path('', views.dashboard, name='dashboard'),
+    # Exports CSV / XLSX (kind : materiels, salles, bureaux)
+    path('export/<str:kind>.<str:fmt>', views.export, name='export'),
+    path('export/<str:kind>.<str:fmt>/tache/', views.export_job, name='export_job'),
 
     # Bureau
-    path('bureaux/', views.bureau_list, name='bureau_list'),
-    path('bureaux/box/', views.bureau_box, name='bureau_box'),
-    path('bureaux/cloisonne/', views.bureau_cloisonne, name='bureau_cloisonne'),
-    path('bureaux/open/', views.bureau_open, name='bureau_open'),
-    path('bureaux/entier/', views.bureau_entier, name='bureau_entier'),
-    path('bureaux/<int:pk>/', views.bureau_detail, name='bureau_detail'),
+    path('bureaux/', pages.bureau_list, name='bureau_list'),
+    path('bureaux/box/', pages.bureau_list, {'type_bureau': 'box'}, name='bureau_box'),
+    path('bureaux/cloisonne/', pages.bureau_list, {'type_bureau': 'cloisonne'}, name='bureau_cloisonne'),
+    path('bureaux/open/', pages.bureau_list, {'type_bureau': 'open'}, name='bureau_open'),
+    path('bureaux/entier/', pages.bureau_list, {'type_bureau': 'entier'}, name='bureau_entier'),
+    path('bureaux/<int:pk>/', pages.bureau_detail, name='bureau_detail'),
     path('bureaux/create/', views.bureau_create, name='bureau_create'),
     path('bureaux/<int:pk>/edit/', views.bureau_update, name='bureau_update'),
     path('bureaux/<int:pk>/delete/', views.bureau_delete, name='bureau_delete'),
 
     # Salle
-    path('salles/', views.salle_list, name='salle_list'),
-    path('salles/reunion/', views.salle_reunion, name='salle_reunion'),
-    path('salles/conference/', views.salle_conference, name='salle_conference'),
-    path('salles/pleniere/', views.salle_pleniere, name='salle_pleniere'),
-    path('salles/formation/', views.salle_formation, name='salle_formation'),
+    path('salles/', pages.salle_list, name='salle_list'),
+    path('salles/reunion/', pages.salle_list, {'type_salle': 'reunion'}, name='salle_reunion'),
+    path('salles/conference/', pages.salle_list, {'type_salle': 'conference'}, name='salle_conference'),
+    path('salles/pleniere/', pages.salle_list, {'type_salle': 'pleniere'}, name='salle_pleniere'),
+    path('salles/formation/', pages.salle_list, {'type_salle': 'formation'}, name='salle_formation'),
 
-    path('salles/<int:pk>/', views.salle_detail, name='salle_detail'),
+    path('salles/<int:pk>/', pages.salle_detail, name='salle_detail'),
     path('salles/create/', views.salle_create, name='salle_create'),
     path('salles/<int:pk>/edit/', views.salle_update, name='salle_update'),
     path('salles/<int:pk>/delete/', views.salle_delete, name='salle_delete'),
 
     # Materiel
-    path('materiels/', views.materiel_list, name='materiel_list'),
+    path('materiels/', pages.materiel_list, name='materiel_list'),
 
-    path('materiels/bon/', views.materiel_bon, name='materiel_bon'),
-    path('materiels/moyen/', views.materiel_moyen, name='materiel_moyen'),
-    path('materiels/mauvais/', views.materiel_mauvais, name='materiel_mauvais'),
-    path('materiels/hs/', views.materiel_hs, name='materiel_hs'),
-    path('materiels/autre/', views.materiel_autre, name='materiel_autre'),
+    path('materiels/bon/', pages.materiel_list, {'etat': 'bon'}, name='materiel_bon'),
+    path('materiels/moyen/', pages.materiel_list, {'etat': 'moyen'}, name='materiel_moyen'),
+    path('materiels/mauvais/', pages.materiel_list, {'etat': 'mauvais'}, name='materiel_mauvais'),
+    path('materiels/hs/', pages.materiel_list, {'etat': 'hs'}, name='materiel_hs'),
+    path('materiels/autre/', pages.materiel_list, {'etat': 'autre'}, name='materiel_autre'),
 
-    path('materiels/<int:pk>/', views.materiel_detail, name='materiel_detail'),
+    path('materiels/<int:pk>/', pages.materiel_detail, name='materiel_detail'),
     path('materiels/create/', views.materiel_create, name='materiel_create'),
+    path('materiels/import/', views.materiel_import, name='materiel_import'),
+    path('materiels/bulk/', views.materiel_bulk, name='materiel_bulk'),
+    path('materiels/bulk.json', views.materiel_bulk_api, name='materiel_bulk_api'),
     path('materiels/<int:pk>/edit/', views.materiel_update, name='materiel_update'),
     path('materiels/<int:pk>/delete/', views.materiel_delete, name='materiel_delete'),
 
@@ -1,116 +1,215 @@
+import json
+
 from django.db.models import Q,  Sum, F
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib import messages
-from .forms import BureauForm, SalleForm, MaterielForm
+from django.contrib.admin.views.decorators import staff_member_required
+from .forms import BureauForm, SalleForm, MaterielForm, InventoryImportForm, MaterielBulkForm
 from django.db.models import Sum, Count, Avg
-from .models import Bureau, Salle, Materiel
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from .models import Bureau, Salle, Materiel, Tache
+from .stats import get_snapshot_stats
+from .pagination import RECENT_ORDERING, paginate_keyset
+from .search import search_queryset
+from .filters import apply_filters
+from .cache import cached_view
+from .exports import CONTENT_TYPES, EXPORTS, stream_export
+from .imports import ImportFileError, detect_format, import_materiels
+from .bulk import update_materiels
+from .locations import LOCATIONS, search_locations
+from .history import inventory_value, materiel_state
+from .rows import LIST_ROWS, render_list
+from . import conditional, jobs
+from .conditional import conditional_view
 
 # Create your views here.
-def home(request):
-    salles = Salle.objects.all()
-    bureaux = Bureau.objects.all()
-    materiels = Materiel.objects.all()
-    context = {
-        'salles': salles,'bureaux': bureaux,'materiels': materiels,
-        }
-    return render(request, 'patrimoine/home.html', context)
-
-# -------------------------------------------------------------------------------------------------
-
-
-def dashboard(request):
-    # ===== BUREAUX =====
-    total_bureaux = Bureau.objects.count()
-    surface_totale_bureaux = Bureau.objects.aggregate(Sum('surface'))['surface__sum'] or 0
-    capacite_totale_bureaux = Bureau.objects.aggregate(Sum('capacite'))['capacite__sum'] or 0
-
-    # ===== SALLES =====
-    total_salles = Salle.objects.count()
-    salles_disponibles = Salle.objects.filter(disponible=True).count()
-    surface_totale_salles = Salle.objects.aggregate(Sum('surface'))['surface__sum'] or 0
-    capacite_totale_salles = Salle.objects.aggregate(Sum('capacite'))['capacite__sum'] or 0
-
-    # Moyenne taux occupation
-    salles_avec_surface = Salle.objects.exclude(surface=None).exclude(capacite=None)
-    taux_moyen = None
-    if salles_avec_surface.exists():
-        taux_list = [
-            salle.capacite / float(salle.surface)
-            for salle in salles_avec_surface
-        ]
-        taux_moyen = round(sum(taux_list) / len(taux_list), 2)
-
-    # ===== MATERIEL =====
-    #total_materiel = Materiel.objects.count()
-
-    valeur_totale = Materiel.objects.aggregate(
-        total=Sum(F('prix_unitaire') * F('quantite'))
-    )['total'] or 0
-
-    total_materiel = Materiel.objects.count()
-
-    repartition_etat = Materiel.objects.values('etat').annotate(total=Count('etat'))
-
-    context = {
-        'total_bureaux': total_bureaux,
-        'surface_totale_bureaux': surface_totale_bureaux,
-        'capacite_totale_bureaux': capacite_totale_bureaux,
-
-        'total_salles': total_salles,
-        'salles_disponibles': salles_disponibles,
-        'surface_totale_salles': surface_totale_salles,
-        'capacite_totale_salles': capacite_totale_salles,
-        'taux_moyen': taux_moyen,
-
-        'total_materiel': total_materiel,
-        'valeur_totale': valeur_totale,
-        'repartition_etat': repartition_etat,
-    }
-
-    return render(request, 'dashboard.html', context)
+def home_item(obj):
+    """Résumé d'un objet pour la page d'accueil (HTML et JSON)"""
+    if isinstance(obj, Salle):
+        detail = f"{obj.get_type_salle_display()} - {obj.niveau or 'Niveau non spécifié'}"
+        url = reverse('salle_detail', args=[obj.pk])
+    elif isinstance(obj, Bureau):
+        detail = f"{obj.get_type_bureau_display()} - {obj.niveau or 'Niveau non spécifié'}"
+        url = reverse('bureau_detail', args=[obj.pk])
+    else:
+        detail = obj.get_etat_display()
+        url = reverse('materiel_detail', args=[obj.pk])
+    return {'id': obj.pk, 'nom': str(obj), 'detail': detail, 'url': url}
 
-# ==============================
-# ======== BUREAU ==============
-# ==============================
 
-def bureau_list(request):
-    bureaux = Bureau.objects.all()
-    """Liste des salles avec recherche"""
-    search_query = request.GET.get('search', '')
+# Colonnes chargées pour la page d'accueil, par type d'objet
+HOME_KINDS = {
+    'salles': (Salle, ('id', 'nom', 'type_salle', 'niveau', 'date_modification')),
+    'bureaux': (Bureau, ('id', 'nom', 'type_bureau', 'niveau', 'date_modification')),
+    'materiels': (Materiel, ('id', 'nom', 'etat', 'date_modification')),
+}
 
-    if search_query:
-        bureaux = bureaux.filter(
-            Q(nom__icontains=search_query) |
-            Q(type_bureau__icontains=search_query) |
-            Q(niveau__icontains=search_query)
-        )
-    bureaux = bureaux.order_by('nom')
 
-    return render(request, 'bureaux/bureau_list.html', {'bureaux': bureaux})
+@conditional_view(conditional.home_state)
+@cached_view('home')
+def home(request):
+    """Accueil : compteurs (une ligne) et derniers objets modifiés"""
+    count = getattr(settings, 'PATRIMOINE_HOME_RECENT', 6)
+    context = {'stats': get_snapshot_stats()}
+    for kind, (model, fields) in HOME_KINDS.items():
+        recent = model.objects.only(*fields).order_by(*RECENT_ORDERING)[:count]
+        context[kind] = [home_item(obj) for obj in recent]
+    return render(request, 'patrimoine/home.html', context)
 
 
+@conditional_view(conditional.home_state)
+@cached_view('home')
+def home_items(request, kind):
+    """Liste complète (JSON, paginée) chargée à la demande par la page d'accueil"""
+    if kind not in HOME_KINDS:
+        raise Http404
+    model, fields = HOME_KINDS[kind]
+    page = paginate_keyset(request, model.objects.only(*fields), RECENT_ORDERING)
+    return JsonResponse({
+        'results': [home_item(obj) for obj in page],
+        'next': f'?{page.next_query}' if page.has_next else None,
+    })
+
+
+def location_search(request, kind):
+    """Suggestions du widget de localisation : {"results": [{"id": ..., "label": ...}]}"""
+    if kind not in LOCATIONS:
+        raise Http404
+    return JsonResponse({'results': search_locations(LOCATIONS[kind], request.GET.get('q', ''))})
+
+
+def _history_date(request):
+    """Date ?at= (ISO 8601) des vues d'historique, maintenant par défaut ; None si invalide"""
+    value = request.GET.get('at')
+    if not value:
+        return timezone.now()
+    try:
+        at = parse_datetime(value)
+    except ValueError:
+        return None
+    if at is not None and timezone.is_naive(at):
+        at = timezone.make_aware(at)
+    return at
+
+
+def materiel_history_state(request, pk):
+    """État suivi d'un matériel à la date ?at= (null s'il n'existait pas)"""
+    at = _history_date(request)
+    if at is None:
+        return JsonResponse({'error': "Date invalide"}, status=400)
+    return JsonResponse({'id': pk, 'at': at, 'state': materiel_state(pk, at)})
+
+
+def inventory_history_value(request):
+    """Valeur de l'inventaire à la date ?at="""
+    at = _history_date(request)
+    if at is None:
+        return JsonResponse({'error': "Date invalide"}, status=400)
+    return JsonResponse({'at': at, 'valeur': inventory_value(at)})
+
+
+def _job_accepted(tache):
+    """202 : la tâche est en file, son état se lit à l'adresse Location"""
+    data = jobs.status(tache)
+    response = JsonResponse(data, status=202)
+    response['Location'] = data['url']
+    return response
+
+
+def job_status(request, pk):
+    """Statut, progression et rapport d'une tâche de fond (à interroger régulièrement)"""
+    return JsonResponse(jobs.status(get_object_or_404(Tache, pk=pk)))
+
+
+def job_result(request, pk):
+    """Fichier résultat d'une tâche terminée, sous son nom lisible"""
+    tache = get_object_or_404(Tache, pk=pk, statut='terminee')
+    if not tache.resultat:
+        raise Http404
+    return FileResponse(tache.resultat.open('rb'), as_attachment=True, filename=tache.nom_resultat)
+
+
+def export_job(request, kind, fmt):
+    """Export en tâche de fond (POST, mêmes critères que l'export en flux)"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST attendu.'}, status=405)
+    if kind not in EXPORTS or fmt not in CONTENT_TYPES:
+        raise Http404
+    tache = jobs.enqueue('export', {'kind': kind, 'fmt': fmt, 'query': request.GET.urlencode()})
+    return _job_accepted(tache)
+
+
+@staff_member_required
+def rebuild_stats_job(request):
+    """Reconstruction de l'instantané des statistiques en tâche de fond (POST, administration)"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST attendu.'}, status=405)
+    return _job_accepted(jobs.enqueue('rebuild_stats'))
 
-def bureau_box(request):
-    bureaux = Bureau.objects.filter(type_bureau='box')
-    return render(request, 'bureaux/bureau_list.html', {'bureaux': bureaux})
+# -------------------------------------------------------------------------------------------------
 
 
-def bureau_cloisonne(request):
-    bureaux = Bureau.objects.filter(type_bureau='cloisonne')
-    return render(request, 'bureaux/bureau_list.html', {'bureaux': bureaux})
+@conditional_view(conditional.dashboard_state)
+@cached_view('dashboard')
+def dashboard(request):
+    """Tableau de bord : lecture de l'instantané PatrimoineStats (une ligne)"""
+    context = {'stats': get_snapshot_stats()}
+    return render(request, 'dashboard.html', context)
 
+def export(request, kind, fmt):
+    """Export CSV / XLSX en flux, avec les mêmes critères que les listes"""
+    if kind not in EXPORTS or fmt not in CONTENT_TYPES:
+        raise Http404
+    response = StreamingHttpResponse(
+        stream_export(kind, fmt, request.GET), content_type=CONTENT_TYPES[fmt]
+    )
+    filename = f'{kind}-{timezone.localdate():%Y%m%d}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def list_query(request, queryset, *, rows=None, **criteres):
+    """
+    Critères et recherche d'une liste, sans lire la base : retourne
+    (queryset, ordre de pagination, contexte sans la page)
+    """
+    queryset, filter_form = apply_filters(queryset, request.GET, **criteres)
+    search_query = request.GET.get('search', '') or filter_form.cleaned_data.get('recherche', '')
+    queryset, ordering = search_queryset(queryset, search_query)
+    if rows is not None:
+        queryset = LIST_ROWS[rows].queryset(queryset, ordering)
+    return queryset, ordering, {'search_query': search_query, 'filter_form': filter_form}
+
+
+def filtered_list(request, queryset, *, rows=None, **criteres):
+    """
+    Chemin commun des listes : critères du formulaire de recherche
+    (``criteres`` impose des valeurs, ex : type_salle='reunion'),
+    recherche plein texte puis pagination par curseur. Avec ``rows``
+    (modèle de rows.LIST_ROWS), la page contient des dictionnaires prêts
+    à afficher plutôt que des objets
+    """
+    queryset, ordering, context = list_query(request, queryset, rows=rows, **criteres)
+    return dict(context, page=paginate_keyset(request, queryset, ordering))
 
-def bureau_open(request):
-    bureaux = Bureau.objects.filter(type_bureau='open')
-    return render(request, 'bureaux/bureau_list.html', {'bureaux': bureaux})
 
+# ==============================
+# ======== BUREAU ==============
+# ==============================
 
-def bureau_entier(request):
-    bureaux = Bureau.objects.filter(type_bureau='entier')
-    return render(request, 'bureaux/bureau_list.html', {'bureaux': bureaux})
+@conditional_view(conditional.bureau_list_state)
+@cached_view('list:bureau')
+def bureau_list(request, **criteres):
+    """Liste des bureaux avec filtres et recherche"""
+    context = filtered_list(request, Bureau.objects.all(), rows=Bureau, **criteres)
+    context['bureaux'] = context['page']
+    return render_list(request, 'bureaux/bureau_list.html', context, Bureau)
 
 
+@conditional_view(conditional.bureau_detail_state)
 def bureau_detail(request, pk):
     bureau = get_object_or_404(Bureau, pk=pk)
     materiels = bureau.materiels.all()
@@ -152,41 +251,16 @@ def bureau_delete(request, pk):
 # ========= SALLE ==============
 # ==============================
 
-def salle_list(request):
-    salles = Salle.objects.all()
-    """Liste des salles avec recherche"""
-    search_query = request.GET.get('search', '')
-
-    if search_query:
-        salles = salles.filter(
-            Q(nom__icontains=search_query) |
-            Q(niveau__icontains=search_query) |
-            Q(type_salle__icontains=search_query)
-        )
-    salles = salles.order_by('niveau')
-    return render(request, 'salles/salle_list.html', {'salles': salles})
-
-
-def salle_reunion(request):
-    salles = Salle.objects.filter(type_salle='reunion')
-    return render(request, 'salles/salle_list.html', {'salles': salles})
-
-
-def salle_conference(request):
-    salles = Salle.objects.filter(type_salle='conference')
-    return render(request, 'salles/salle_list.html', {'salles': salles})
-
-
-def salle_pleniere(request):
-    salles = Salle.objects.filter(type_salle='pleniere')
-    return render(request, 'salles/salle_list.html', {'salles': salles})
-
-
-def salle_formation(request):
-    salles = Salle.objects.filter(type_salle='formation')
-    return render(request, 'salles/salle_list.html', {'salles': salles})
+@conditional_view(conditional.salle_list_state)
+@cached_view('list:salle')
+def salle_list(request, **criteres):
+    """Liste des salles avec filtres et recherche"""
+    context = filtered_list(request, Salle.objects.all(), rows=Salle, **criteres)
+    context['salles'] = context['page']
+    return render_list(request, 'salles/salle_list.html', context, Salle)
 
 
+@conditional_view(conditional.salle_detail_state)
 def salle_detail(request, pk):
     salle = get_object_or_404(Salle, pk=pk)
     materiels = salle.materiels.all()
@@ -228,45 +302,17 @@ def salle_delete(request, pk):
 # ========= MATERIEL ===========
 # ==============================
 
-def materiel_list(request):
-    materiels = Materiel.objects.select_related('salle', 'bureau').all()
-    """Liste des salles avec recherche"""
-    search_query = request.GET.get('search', '')
-
-    if search_query:
-        materiels = materiels.filter(
-            Q(nom__icontains=search_query) |
-            Q(etat__icontains=search_query)
-        )
-    materiels = materiels.order_by('nom')
-    return render(request, 'materiels/materiel_list.html', {'materiels': materiels})
-
-
-def materiel_bon(request):
-    materiels = Materiel.objects.filter(etat='bon')
-    return render(request, 'materiels/materiel_list.html', {'materiels': materiels})
-
-
-def materiel_moyen(request):
-    materiels = Materiel.objects.filter(etat='moyen')
-    return render(request, 'materiels/materiel_list.html', {'materiels': materiels})
-
-
-def materiel_mauvais(request):
-    materiels = Materiel.objects.filter(etat='mauvais')
-    return render(request, 'materiels/materiel_list.html', {'materiels': materiels})
-
-
-def materiel_hs(request):
-    materiels = Materiel.objects.filter(etat='hs')
-    return render(request, 'materiels/materiel_list.html', {'materiels': materiels})
-
-
-def materiel_autre(request):
-    materiels = Materiel.objects.filter(etat='autre')
-    return render(request, 'materiels/materiel_list.html', {'materiels': materiels})
+@conditional_view(conditional.materiel_list_state)
+@cached_view('list:materiel')
+def materiel_list(request, **criteres):
+    """Liste du matériel avec filtres et recherche (localisation calculée par la base)"""
+    context = filtered_list(request, Materiel.objects.all(), rows=Materiel, **criteres)
+    context['materiels'] = context['page']
+    return render_list(request, 'materiels/materiel_list.html', context, Materiel)
 
 
+@conditional_view(conditional.materiel_detail_state)
+@cached_view('detail:materiel:{pk}')
 def materiel_detail(request, pk):
     materiel = get_object_or_404(Materiel, pk=pk)
     return render(request, 'materiels/materiel_detail.html', {'materiel': materiel})
@@ -303,6 +349,80 @@ def materiel_delete(request, pk):
     return render(request, 'materiels/materiel_confirm_delete.html', {'materiel': materiel})
 
 
+def run_bulk_form(form):
+    """Applique le formulaire de modification en masse ; retourne le nombre de matériels modifiés"""
+    data = form.cleaned_data
+    return update_materiels(
+        form.selection(),
+        etat=data.get('etat'),
+        salle=data.get('salle'),
+        bureau=data.get('bureau'),
+    )
+
+
+def materiel_bulk(request):
+    """Changement d'état / déplacement du matériel coché dans la liste"""
+    if request.method == 'POST':
+        form = MaterielBulkForm(request.POST)
+        if form.is_valid():
+            run_bulk_form(form)
+            return redirect('materiel_list')
+    else:
+        form = MaterielBulkForm(initial={'ids': request.GET.getlist('ids')})
+    selected = len(form['ids'].value() or [])
+    return render(request, 'materiels/materiel_bulk.html', {'form': form, 'selected': selected})
+
+
+def materiel_bulk_api(request):
+    """
+    Même opération en JSON : POST {"ids": [...], "etat": "hs"} ou
+    {"depuis_bureau": 3, "bureau": 4} ; retourne {"updated": n}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST attendu.'}, status=405)
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'JSON invalide.'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Objet JSON attendu.'}, status=400)
+    form = MaterielBulkForm(data)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    return JsonResponse({'updated': run_bulk_form(form)})
+
+
+def materiel_import(request):
+    """Import en masse depuis un fichier CSV / XLSX, avec rapport d'erreurs par ligne"""
+    report = None
+    if request.method == 'POST':
+        form = InventoryImportForm(request.POST, request.FILES)
+        if form.is_valid() and form.cleaned_data['arriere_plan']:
+            fichier = form.cleaned_data['fichier']
+            tache = jobs.enqueue('import_materiels', {
+                'nom': fichier.name,
+                'simulation': form.cleaned_data['simulation'],
+                'partiel': form.cleaned_data['partiel'],
+            }, fichier=fichier)
+            return render(request, 'materiels/materiel_import.html', {
+                'form': InventoryImportForm(), 'tache': jobs.status(tache),
+            }, status=202)
+        if form.is_valid():
+            fichier = form.cleaned_data['fichier']
+            try:
+                report = import_materiels(
+                    fichier,
+                    detect_format(fichier.name),
+                    dry_run=form.cleaned_data['simulation'],
+                    partial=form.cleaned_data['partiel'],
+                )
+            except ImportFileError as exc:
+                form.add_error('fichier', str(exc))
+    else:
+        form = InventoryImportForm()
+    return render(request, 'materiels/materiel_import.html', {'form': form, 'report': report})
+
+
 # ---------------------------------------------------------------------------------------------------------------------
 
 # --------------  salle ------------------------
@@ -319,22 +439,12 @@ def add_salle(request):
     return render(request, 'patrimoine/add_salle.html', {'form': form})
 
 
+@conditional_view(conditional.salle_list_state)
+@cached_view('list:salle')
 def list_salle(request):
-    '''Liste'''
-    salles = Salle.objects.all()
-    """Liste des salles avec recherche"""
-    search_query = request.GET.get('search', '')
-
-    if search_query:
-        salles = salles.filter(
-            Q(nom__icontains=search_query) |
-            Q(niveau__icontains=search_query) |
-            Q(type_salle__icontains=search_query)
-
-        )
-    salles = salles.order_by('niveau')
-
-    context = { 'salles': salles, }
+    """Liste des salles avec filtres et recherche"""
+    context = filtered_list(request, Salle.objects.all())
+    context['salles'] = context['page']
     return render(request, 'patrimoine/list_salle.html', context)
 
 
@@ -386,8 +496,8 @@ def add_bureau(request):
 
 def list_bureau(request):
     """Liste"""
-    bureaux = Bureau.objects.all()
-    context = { 'bureaux': bureaux, }
+    page = paginate_keyset(request, Bureau.objects.all())
+    context = { 'bureaux': page, 'page': page, }
     return render(request, 'patrimoine/list_bureau.html', context)
 
 
@@ -439,8 +549,8 @@ def add_materiel(request):
 
 def list_materiel(request):
     """Liste"""
-    materiels = Materiel.objects.all()
-    context = { 'materiels': materiels, }
+    page = paginate_keyset(request, Materiel.objects.with_localisation())
+    context = { 'materiels': page, 'page': page, }
     return render(request, 'patrimoine/list_materiel.html', context)
 
 
@@ -3,6 +3,18 @@ ASGI config for patrimoine_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Sous ASGI, les pages en lecture (tableau de bord, listes, fiches) sont
+servies par les vues asynchrones de patrimoine/async_views.py
+(PATRIMOINE_ASYNC_VIEWS, activé ici sauf s'il est déjà défini). En local,
+avec un serveur ASGI comme uvicorn :
+
+    pip install uvicorn
+    python manage.py collectstatic --noinput   # hors DEBUG
+    uvicorn patrimoine_project.asgi:application --port 8000 --workers 2
+
+``manage.py bench_asgi`` compare le débit sous ASGI et sous WSGI avec
+plusieurs clients simultanés.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -12,5 +24,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'patrimoine_project.settings')
+os.environ.setdefault('PATRIMOINE_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,73 @@
+"""
+Configuration de la base de données d'après l'environnement.
+
+PATRIMOINE_DB_ENGINE choisit le profil :
+
+- ``sqlite`` (défaut) : fichier PATRIMOINE_DB_NAME (db.sqlite3 sinon),
+  transactions en mode IMMEDIATE (le verrou d'écriture est pris dès le
+  début de la transaction : un écrivain en attente patiente au lieu
+  d'échouer en « database is locked » au moment d'écrire). Les PRAGMA
+  (WAL, synchronous...) sont appliqués à chaque connexion par
+  patrimoine/db.py, d'après PATRIMOINE_SQLITE_PRAGMAS ;
+- ``postgresql`` : connexions persistantes (PATRIMOINE_DB_CONN_MAX_AGE
+  secondes, vérifiées avant réutilisation) ; les ``iterator()`` des
+  exports utilisent des curseurs côté serveur, sauf derrière un pooler en
+  mode transaction (PATRIMOINE_DB_DISABLE_SERVER_SIDE_CURSORS=1).
+"""
+import os
+
+DEFAULT_CONN_MAX_AGE = 600
+
+# PRAGMA appliqués à chaque connexion SQLite (voir patrimoine/db.py)
+SQLITE_PRAGMAS = {
+    # Les lecteurs ne bloquent plus l'écrivain (et inversement)
+    'journal_mode': 'WAL',
+    # Sûr en WAL : seul un arrêt brutal du système peut perdre la dernière transaction
+    'synchronous': 'NORMAL',
+    # Attente du verrou d'écriture (ms) avant « database is locked »
+    'busy_timeout': 5000,
+    # Lectures par mmap (256 Mo) et cache de pages (64 Mo, valeur négative en Kio)
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def _flag(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_settings(base_dir, environ=None):
+    """Retourne DATABASES pour le profil choisi par l'environnement"""
+    environ = os.environ if environ is None else environ
+    engine = environ.get('PATRIMOINE_DB_ENGINE', 'sqlite')
+
+    if engine == 'sqlite':
+        return {
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': environ.get('PATRIMOINE_DB_NAME', base_dir / 'db.sqlite3'),
+                'OPTIONS': {
+                    'transaction_mode': 'IMMEDIATE',
+                },
+            }
+        }
+
+    if engine == 'postgresql':
+        return {
+            'default': {
+                'ENGINE': 'django.db.backends.postgresql',
+                'NAME': environ.get('PATRIMOINE_DB_NAME', 'patrimoine'),
+                'USER': environ.get('PATRIMOINE_DB_USER', ''),
+                'PASSWORD': environ.get('PATRIMOINE_DB_PASSWORD', ''),
+                'HOST': environ.get('PATRIMOINE_DB_HOST', ''),
+                'PORT': environ.get('PATRIMOINE_DB_PORT', ''),
+                'CONN_MAX_AGE': int(environ.get('PATRIMOINE_DB_CONN_MAX_AGE', DEFAULT_CONN_MAX_AGE)),
+                'CONN_HEALTH_CHECKS': True,
+                'DISABLE_SERVER_SIDE_CURSORS': _flag(
+                    environ.get('PATRIMOINE_DB_DISABLE_SERVER_SIDE_CURSORS', '')
+                ),
+            }
+        }
+
+    raise ValueError(f"PATRIMOINE_DB_ENGINE inconnu : {engine} (sqlite ou postgresql)")
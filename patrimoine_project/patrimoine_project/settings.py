@@ -2,6 +2,8 @@
 from pathlib import Path
 import os
 
+from .database import SQLITE_PRAGMAS, database_settings
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -34,7 +36,11 @@ INSTALLED_APPS = [
     ]
 
 MIDDLEWARE = [
+    # En premier : mesure la requête entière (voir patrimoine/perf.py)
+    'patrimoine.perf.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Fichiers statiques précompressés, hors DEBUG (voir patrimoine/staticfiles.py)
+    'patrimoine.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -47,10 +53,18 @@ ROOT_URLCONF = 'patrimoine_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, avec le temps de rendu mesuré (voir patrimoine/perf.py)
+        'BACKEND': 'patrimoine.perf.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR), 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Gabarits compilés une fois par processus (rechargés par runserver
+            # quand ils changent)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -66,12 +80,12 @@ WSGI_APPLICATION = 'patrimoine_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# Profil choisi par PATRIMOINE_DB_ENGINE (sqlite par défaut, ou postgresql) :
+# voir patrimoine_project/database.py
+DATABASES = database_settings(BASE_DIR)
+
+# PRAGMA appliqués à chaque connexion SQLite (voir patrimoine/db.py)
+PATRIMOINE_SQLITE_PRAGMAS = SQLITE_PRAGMAS
 
 
 # Password validation
@@ -113,5 +127,103 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Durée de cache (s) des fichiers statiques sans empreinte dans le nom ;
+# ceux qui en ont une sont mis en cache un an
+PATRIMOINE_STATIC_MAX_AGE = 60
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# 'media' : champs fichier des modèles, nommés d'après leur contenu
+# (voir patrimoine/storage.py et la commande clean_media)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'patrimoine.staticfiles.CompressedManifestStaticFilesStorage'},
+    'media': {'BACKEND': 'patrimoine.storage.ContentAddressedStorage'},
+}
+
+
+# Pagination par curseur des listes (voir patrimoine/pagination.py)
+PATRIMOINE_PAGE_SIZE = 50
+PATRIMOINE_MAX_PAGE_SIZE = 500
+
+# Nombre de derniers objets modifiés affichés sur la page d'accueil
+PATRIMOINE_HOME_RECENT = 6
+
+# Cache des pages et fragments (voir patrimoine/cache.py).
+# Mémoire locale par défaut (un seul processus) ; PATRIMOINE_CACHE_BACKEND=file
+# pour partager le cache et ses invalidations entre plusieurs processus.
+if os.environ.get('PATRIMOINE_CACHE_BACKEND', 'locmem') == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('PATRIMOINE_CACHE_DIR', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'patrimoine',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+PATRIMOINE_CACHE_TIMEOUT = 300
+
+# Lignes lues par requête lors des exports CSV / XLSX (voir patrimoine/exports.py)
+PATRIMOINE_EXPORT_CHUNK_SIZE = 2000
+
+# Lignes par INSERT lors des imports en masse (voir patrimoine/imports.py)
+PATRIMOINE_IMPORT_BATCH_SIZE = 1000
+
+# Matériels par UPDATE lors des modifications en masse (voir patrimoine/bulk.py)
+PATRIMOINE_BULK_UPDATE_BATCH_SIZE = 1000
+
+# Taille des pages de l'API JSON (voir patrimoine/api.py)
+PATRIMOINE_API_PAGE_SIZE = 500
+PATRIMOINE_API_MAX_PAGE_SIZE = 5000
+
+# Délai (secondes) avant qu'une modification soit transmise par /sync/
+# (voir patrimoine/sync.py)
+PATRIMOINE_SYNC_LAG = 2
+
+# Vues asynchrones pour les pages en lecture (tableau de bord, listes,
+# fiches) ; activées par asgi.py (voir patrimoine/async_views.py)
+PATRIMOINE_ASYNC_VIEWS = os.environ.get('PATRIMOINE_ASYNC_VIEWS', '0') == '1'
+
+# Tâches de fond exécutées par manage.py run_workers (voir patrimoine/jobs.py) :
+# délai avant le premier nouvel essai (doublé ensuite), reprise d'une tâche
+# en cours sans nouvelle, conservation des tâches finies (jours)
+PATRIMOINE_JOB_RETRY_DELAY = 30
+PATRIMOINE_JOB_STALE_AFTER = 900
+PATRIMOINE_JOB_KEEP_DAYS = 30
+# Déclinaisons des photos de salle calculées en tâche de fond plutôt
+# qu'à l'enregistrement (nécessite run_workers)
+PATRIMOINE_BACKGROUND_RENDITIONS = os.environ.get('PATRIMOINE_BACKGROUND_RENDITIONS', '0') == '1'
+
+# Mesures de performance par requête (voir patrimoine/perf.py)
+PATRIMOINE_PERF_ENABLED = True
+PATRIMOINE_PERF_SERVER_TIMING = True
+# Part des requêtes conservées dans le tampon de /perf/, et taille du tampon
+PATRIMOINE_PERF_SAMPLE_RATE = float(os.environ.get('PATRIMOINE_PERF_SAMPLE_RATE', 1.0))
+PATRIMOINE_PERF_BUFFER_SIZE = 2000
+# Une même requête SQL répétée autant de fois signale un N+1
+PATRIMOINE_PERF_DUPLICATE_THRESHOLD = 3
+PATRIMOINE_PERF_SLOW_MS = 500
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Une ligne JSON par requête (INFO), WARNING si lente ou N+1
+        'patrimoine.perf': {
+            'handlers': ['console'],
+            'level': os.environ.get('PATRIMOINE_PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,48 @@
+// Suggestions de salle / bureau au fil de la saisie (voir patrimoine/locations.py)
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('.location-autocomplete').forEach(function (widget) {
+        var hidden = widget.querySelector('input[type=hidden]');
+        var input = widget.querySelector('input[type=text]');
+        var results = widget.querySelector('.location-results');
+        var timer = null;
+
+        function show(items) {
+            results.innerHTML = '';
+            items.forEach(function (item) {
+                var button = document.createElement('button');
+                button.type = 'button';
+                button.className = 'list-group-item list-group-item-action';
+                button.textContent = item.label;
+                button.addEventListener('click', function () {
+                    hidden.value = item.id;
+                    input.value = item.label;
+                    results.innerHTML = '';
+                });
+                results.appendChild(button);
+            });
+        }
+
+        function search() {
+            fetch(widget.dataset.url + '?q=' + encodeURIComponent(input.value))
+                .then(function (response) { return response.json(); })
+                .then(function (data) { show(data.results); });
+        }
+
+        input.addEventListener('input', function () {
+            // Saisie libre : la valeur n'est retenue qu'après un choix dans la liste
+            hidden.value = '';
+            clearTimeout(timer);
+            timer = setTimeout(search, 200);
+        });
+        input.addEventListener('focus', function () {
+            if (!input.value) {
+                search();
+            }
+        });
+        input.addEventListener('keydown', function (event) {
+            if (event.key === 'Escape') {
+                results.innerHTML = '';
+            }
+        });
+    });
+});